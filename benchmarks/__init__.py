@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks measuring commitai's own overhead against a fake chat model."""
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""A deterministic, dependency-free chat model for benchmarks.
+
+Registered under the ``fake-`` model prefix, it answers instantly (or after a
+fixed ``latency``) with a message derived from a hash of the prompt, so runs
+are reproducible and the timings contain no provider latency.
+"""
+
+import hashlib
+import time
+from typing import Any, Iterator, NamedTuple, Optional
+
+from commitai.providers import register_provider
+
+FAKE_PREFIX = "fake-"
+
+
+class FakeMessage(NamedTuple):
+    content: str
+
+
+class FakeChatModel:
+    def __init__(self, model: str, latency: float = 0.0) -> None:
+        self.model = model
+        self.latency = latency
+        self.calls = 0
+
+    def _answer(self, prompt: Any) -> str:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        digest = hashlib.sha256(str(prompt).encode()).hexdigest()[:12]
+        return f"chore: update synthetic files ({digest})\n\nGenerated by {self.model}."
+
+    def invoke(self, input: Any, **kwargs: Any) -> FakeMessage:
+        return FakeMessage(self._answer(input))
+
+    def stream(self, input: Any, **kwargs: Any) -> Iterator[FakeMessage]:
+        for word in self._answer(input).split(" "):
+            yield FakeMessage(word + " ")
+
+
+def install(latency: float = 0.0) -> None:
+    """Makes ``fake-*`` model names resolve to :class:`FakeChatModel`."""
+
+    def create(model: str, timeout: Optional[float] = None) -> Any:
+        return FakeChatModel(model, latency)
+
+    register_provider(FAKE_PREFIX, create)
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""Measures commitai's own overhead on synthetic repositories.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.run                   # run and compare to the baseline
+    python -m benchmarks.run --save-baseline   # record a new baseline
+    python -m benchmarks.run -s large -n 10 --latency 0.2
+
+Every scenario runs in a fresh interpreter so that peak RSS and import state
+are isolated. The chat model is the deterministic ``fake-`` provider from
+:mod:`benchmarks.fake_llm`, so the numbers exclude any provider latency unless
+``--latency`` adds a fixed one.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.synthetic import GIT_IDENTITY, SCENARIOS, create_repo, restage
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+DEFAULT_TOLERANCE = 0.25
+# Differences below this many seconds are treated as noise.
+NOISE_FLOOR_S = 0.005
+
+METRICS = ("import_s", "git_collect_s", "prompt_build_s", "generate_s", "peak_rss_mb")
+
+
+def _peak_rss_mb() -> float:
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _child(repo_path: str, repeat: int, latency: float, output: str) -> None:
+    """Runs inside the benchmark interpreter; writes its metrics to ``output``."""
+    start = time.perf_counter()
+    import commitai.cli as cli
+
+    import_s = time.perf_counter() - start
+
+    from benchmarks import fake_llm
+
+    fake_llm.install(latency)
+    os.chdir(repo_path)
+
+    timings: Dict[str, List[float]] = {
+        "git_collect_s": [],
+        "prompt_build_s": [],
+        "generate_s": [],
+    }
+    for _ in range(repeat):
+        start = time.perf_counter()
+        repo = cli.RepoContext()
+        _ = repo.metadata, repo.staged_diff
+        timings["git_collect_s"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        cli._prepare_context(repo)
+        cli._build_prompt(
+            "", cli._context_header(repo), repo.diff_files, None, repo.truncated_files
+        )
+        timings["prompt_build_s"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        cli.generate_message.main(
+            ["--commit", "--no-cache", "-m", "fake-benchmark"],
+            standalone_mode=False,
+        )
+        timings["generate_s"].append(time.perf_counter() - start)
+        restage(repo_path)
+
+    result: Dict[str, float] = {"import_s": import_s}
+    result.update({name: statistics.median(v) for name, v in timings.items()})
+    result["peak_rss_mb"] = _peak_rss_mb()
+    with open(output, "w") as f:
+        json.dump(result, f)
+
+
+def _run_scenario(repo_path: str, repeat: int, latency: float) -> Dict[str, float]:
+    env = dict(os.environ, **GIT_IDENTITY)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        output = f.name
+    try:
+        subprocess.run(
+            [
+                sys.executable,
+                "-m",
+                "benchmarks.run",
+                "--child",
+                repo_path,
+                "--repeat",
+                str(repeat),
+                "--latency",
+                str(latency),
+                "--child-output",
+                output,
+            ],
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        with open(output) as f:
+            return dict(json.load(f))
+    finally:
+        os.unlink(output)
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[str]:
+    """Returns a description of every metric that regressed past ``tolerance``."""
+    regressions = []
+    for scenario, metrics in results.items():
+        for metric, value in metrics.items():
+            previous = baseline.get(scenario, {}).get(metric)
+            if previous is None:
+                continue
+            if metric.endswith("_s") and value - previous < NOISE_FLOOR_S:
+                continue
+            if value > previous * (1 + tolerance):
+                regressions.append(
+                    f"{scenario}.{metric}: {value:.4f} vs baseline {previous:.4f} "
+                    f"(+{(value / previous - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def _format_table(results: Dict[str, Dict[str, float]]) -> str:
+    rows = [f"{'scenario':<10}" + "".join(f"{m:>16}" for m in METRICS)]
+    for scenario, metrics in results.items():
+        rows.append(
+            f"{scenario:<10}" + "".join(f"{metrics[m]:>16.4f}" for m in METRICS)
+        )
+    return "\n".join(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-s",
+        "--scenario",
+        action="append",
+        choices=[s.name for s in SCENARIOS],
+        help="Scenario to run (repeatable). Defaults to all of them.",
+    )
+    parser.add_argument("-n", "--repeat", type=int, default=5)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Seconds the fake model waits before answering.",
+    )
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--child-output", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        _child(args.child, args.repeat, args.latency, args.child_output)
+        return 0
+
+    selected = [s for s in SCENARIOS if not args.scenario or s.name in args.scenario]
+    results: Dict[str, Dict[str, float]] = {}
+    with tempfile.TemporaryDirectory(prefix="commitai-bench-") as tmp:
+        for scenario in selected:
+            repo_path = create_repo(os.path.join(tmp, scenario.name), scenario)
+            results[scenario.name] = _run_scenario(repo_path, args.repeat, args.latency)
+    print(_format_table(results))
+
+    if args.save_baseline:
+        baseline: Dict[str, Any] = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nSaved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline.")
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print("\nRegressions:\n  " + "\n  ".join(regressions))
+        return 1
+    print("\nNo regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""Generates throwaway git repositories with a staged diff of a given size."""
+
+import os
+import random
+import subprocess
+from typing import Dict, NamedTuple
+
+GIT_IDENTITY: Dict[str, str] = {
+    "GIT_AUTHOR_NAME": "Benchmark",
+    "GIT_AUTHOR_EMAIL": "benchmark@example.com",
+    "GIT_COMMITTER_NAME": "Benchmark",
+    "GIT_COMMITTER_EMAIL": "benchmark@example.com",
+}
+
+_WORDS = (
+    "alpha beta gamma delta epsilon zeta theta kappa lambda sigma "
+    "request response handler cache index buffer token parser config"
+).split()
+
+
+class Scenario(NamedTuple):
+    name: str
+    files: int
+    diff_bytes: int
+
+
+SCENARIOS = (
+    Scenario("small", files=5, diff_bytes=4_000),
+    Scenario("medium", files=50, diff_bytes=100_000),
+    Scenario("large", files=200, diff_bytes=1_000_000),
+)
+
+
+def _git(path: str, *args: str) -> None:
+    env = dict(os.environ, **GIT_IDENTITY)
+    subprocess.run(
+        ["git", "-c", "commit.gpgsign=false", *args],
+        cwd=path,
+        env=env,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def _lines(rng: random.Random, count: int) -> str:
+    return "".join(
+        " ".join(rng.choice(_WORDS) for _ in range(8)) + "\n" for _ in range(count)
+    )
+
+
+def create_repo(path: str, scenario: Scenario, seed: int = 0) -> str:
+    """Creates a repository at ``path`` with ``scenario``'s changes staged.
+
+    Every file is committed once and then rewritten, so the staged diff has
+    roughly ``scenario.diff_bytes`` bytes spread over ``scenario.files``
+    files (each changed line appears once removed and once added).
+    """
+    rng = random.Random(seed)
+    # A line of eight words is about 60 bytes and shows up twice in the diff.
+    lines_per_file = max(1, scenario.diff_bytes // (scenario.files * 120))
+    os.makedirs(path, exist_ok=True)
+    _git(path, "init", "-q")
+    for index in range(scenario.files):
+        file_path = os.path.join(path, "src", f"module_{index}.txt")
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "w") as f:
+            f.write(_lines(rng, lines_per_file))
+    _git(path, "add", "--all")
+    _git(path, "commit", "-q", "-m", "Initial commit")
+
+    for index in range(scenario.files):
+        file_path = os.path.join(path, "src", f"module_{index}.txt")
+        with open(file_path, "w") as f:
+            f.write(_lines(rng, lines_per_file))
+    _git(path, "add", "--all")
+    return path
+
+
+def restage(path: str) -> None:
+    """Undoes the benchmark's commit, leaving its changes staged again."""
+    _git(path, "reset", "-q", "--soft", "HEAD~1")
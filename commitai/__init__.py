@@ -1,5 +1,9 @@
 # File: commitai/__init__.py
 # -*- coding: utf-8 -*-
+import time as _time
+
+# Lets --profile account for the time spent importing commitai itself.
+IMPORT_STARTED = _time.perf_counter()
 
 # This __version__ string is read by hatchling during the build process
 # Make sure to update it for new releases.
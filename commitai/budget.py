@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""Fits prompts into the context window of the selected model.
+
+Token counts are estimated locally from the text length, which is fast enough
+to run on every hunk and errs on the side of overcounting. When the diff does
+not fit, every file keeps its header and the remaining budget is shared between
+files by relevance: small files are kept whole, and the hunks of larger ones
+are dropped from the end, so the prompt always fits in a single request.
+"""
+
+import posixpath
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from commitai.diff import DiffFile, DiffHunk
+from commitai.git import TruncatedFile
+
+# Context windows in tokens, matched by model name prefix. The first matching
+# prefix wins, so more specific prefixes come first.
+CONTEXT_WINDOWS: Tuple[Tuple[str, int], ...] = (
+    ("gpt-4.1", 1_047_576),
+    ("gpt-4o", 128_000),
+    ("gpt-4-turbo", 128_000),
+    ("gpt-4-32k", 32_768),
+    ("gpt-4", 8_192),
+    ("gpt-3.5", 16_385),
+    ("gpt-", 128_000),
+    ("claude-", 200_000),
+    ("gemini-1.0", 32_760),
+    ("gemini-pro", 32_760),
+    ("gemini-", 1_048_576),
+    ("llama2", 4_096),
+    ("llama3.1", 131_072),
+    ("llama3.2", 131_072),
+    ("llama3.3", 131_072),
+    ("llama", 8_192),
+)
+DEFAULT_CONTEXT_WINDOW = 8_192
+# Tokens left free for the generated message.
+RESERVED_OUTPUT_TOKENS = 1_024
+# Diffs are dense in punctuation and short identifiers, so they average fewer
+# characters per token than prose; a low ratio keeps the estimate on the safe
+# side for every supported tokenizer.
+CHARS_PER_TOKEN = 3
+# A trimmed hunk is only kept if at least this many tokens of it fit.
+MIN_HUNK_TOKENS = 32
+
+_DOC_EXTENSIONS = (".md", ".rst", ".txt", ".adoc")
+_TEST_DIRECTORIES = ("test", "tests", "__tests__", "spec", "specs")
+
+
+class FittedDiff(NamedTuple):
+    files: List[DiffFile]
+    truncated: List[TruncatedFile]
+
+
+def context_window(model: str) -> int:
+    """Returns the context window of ``model`` in tokens."""
+    # Routing prefixes such as ``ollama/`` are not part of the model's name.
+    model = model.rpartition("/")[2]
+    for prefix, tokens in CONTEXT_WINDOWS:
+        if model.startswith(prefix):
+            return tokens
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates how many tokens ``text`` costs, rounding up."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def prompt_budget(
+    model: str, fixed_prompt: str = "", window: Optional[int] = None
+) -> int:
+    """Returns how many tokens of diff fit next to ``fixed_prompt``.
+
+    ``window`` overrides the context window known for ``model``.
+    """
+    total = window or context_window(model)
+    return max(total - RESERVED_OUTPUT_TOKENS - estimate_tokens(fixed_prompt), 0)
+
+
+def relevance(diff_file: DiffFile, explanation: str = "") -> float:
+    """Scores how much ``diff_file`` tells about the change.
+
+    Source files outrank tests and documentation, deletions count for little,
+    and files named in the user's explanation are boosted.
+    """
+    path = diff_file.path.lower()
+    name = posixpath.basename(path)
+    score = 1.0
+    stem = posixpath.splitext(name)[0]
+    if len(stem) >= 3 and stem in explanation.lower():
+        score *= 2.0
+    if name.endswith(_DOC_EXTENSIONS):
+        score *= 0.5
+    if (
+        name.startswith("test_")
+        or stem.endswith(("_test", ".test", ".spec"))
+        or any(part in _TEST_DIRECTORIES for part in path.split("/")[:-1])
+    ):
+        score *= 0.7
+    if diff_file.status == "deleted":
+        score *= 0.5
+    return score
+
+
+def _allot(
+    needs: Dict[int, int], weights: Dict[int, float], budget: int
+) -> Dict[int, int]:
+    """Shares ``budget`` between ``needs`` in proportion to ``weights``.
+
+    No one gets more than it needs, and what the smaller needs leave over is
+    shared again between the rest.
+    """
+    allotted = {}
+    pending = dict(needs)
+    while pending and budget > 0:
+        total_weight = sum(weights[i] for i in pending)
+        shares = {i: budget * weights[i] / total_weight for i in pending}
+        satisfied = [i for i in pending if pending[i] <= shares[i]]
+        if not satisfied:
+            allotted.update({i: int(share) for i, share in shares.items()})
+            break
+        for i in satisfied:
+            allotted[i] = pending.pop(i)
+            budget -= allotted[i]
+    return allotted
+
+
+def _trim_hunks(hunks: Sequence[DiffHunk], tokens: int) -> List[DiffHunk]:
+    kept: List[DiffHunk] = []
+    for hunk in hunks:
+        cost = estimate_tokens(hunk.text)
+        if cost <= tokens:
+            kept.append(hunk)
+            tokens -= cost
+            continue
+        if tokens >= MIN_HUNK_TOKENS:
+            # Keep the beginning of the hunk, cut at a line boundary.
+            text = hunk.text[: tokens * CHARS_PER_TOKEN]
+            text = text[: text.rfind("\n") + 1]
+            if text.count("\n") > 1:
+                kept.append(DiffHunk(text))
+        break
+    return kept
+
+
+def _notice_cost(diff_file: DiffFile) -> int:
+    # Room for the file's entry in the truncation notice, should it be cut.
+    return estimate_tokens(f"{diff_file.path} ({diff_file.size} bytes), ")
+
+
+def fit_files(
+    files: Sequence[DiffFile], budget: int, explanation: str = ""
+) -> FittedDiff:
+    """Trims ``files`` so that their text costs at most ``budget`` tokens.
+
+    Files are returned in their original order. Every cut file is reported
+    with the number of bytes left out; files whose header alone no longer fits
+    are left out entirely, least relevant first.
+    """
+    costs = [estimate_tokens(diff_file.text) for diff_file in files]
+    if sum(costs) <= budget:
+        return FittedDiff(list(files), [])
+
+    weights = {i: relevance(f, explanation) for i, f in enumerate(files)}
+    kept = set(range(len(files)))
+    fixed = {
+        i: estimate_tokens(f.header) + _notice_cost(f) for i, f in enumerate(files)
+    }
+    remaining = budget - sum(fixed.values())
+    for i in sorted(kept, key=lambda i: (weights[i], -i)):
+        if remaining >= 0:
+            break
+        kept.discard(i)
+        remaining += fixed[i]
+
+    needs = {i: costs[i] - estimate_tokens(files[i].header) for i in kept}
+    allotted = _allot(needs, weights, max(remaining, 0))
+
+    fitted: List[DiffFile] = []
+    truncated: List[TruncatedFile] = []
+    for i, diff_file in enumerate(files):
+        if i not in kept:
+            truncated.append(
+                TruncatedFile(diff_file.path, len(diff_file.text.encode()))
+            )
+            continue
+        if allotted.get(i, 0) >= needs[i]:
+            fitted.append(diff_file)
+            continue
+        trimmed = diff_file.with_hunks(_trim_hunks(diff_file.hunks, allotted.get(i, 0)))
+        fitted.append(trimmed)
+        omitted = len(diff_file.text.encode()) - len(trimmed.text.encode())
+        truncated.append(TruncatedFile(diff_file.path, omitted))
+    return FittedDiff(fitted, truncated)
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Content-addressed on-disk cache of generated commit messages.
+
+Entries live under ``.git/commitai/cache`` and are keyed by a hash of every
+input that shapes the prompt, so re-running commitai on an unchanged staged
+diff (after a failed hook or a closed editor) skips the LLM round-trip. The
+cache is bounded in size and evicts the least recently used entries first.
+"""
+
+import hashlib
+import os
+import tempfile
+from typing import List, NamedTuple, Optional, Sequence
+
+from commitai.git import RepoContext
+
+DEFAULT_CACHE_MAX_BYTES = 8 * 1024 * 1024
+# Uses of the similarity cache of commitai.semantic: none, a hint shown to the
+# model, or a draft reused without calling the model.
+SEMANTIC_CACHE_MODES = ("off", "hint", "draft")
+
+_ENTRY_SUFFIX = ".txt"
+
+
+class CacheStats(NamedTuple):
+    directory: str
+    entries: int
+    total_bytes: int
+    max_bytes: int
+
+
+class MessageCache:
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def for_repo(
+        cls, repo: RepoContext, max_bytes: int = DEFAULT_CACHE_MAX_BYTES
+    ) -> "MessageCache":
+        return cls(os.path.join(repo.git_dir, "commitai", "cache"), max_bytes)
+
+    @staticmethod
+    def key(
+        model: str,
+        system_prompt: str,
+        template: Optional[str],
+        explanation: str,
+        diff: str,
+        extra: Sequence[str] = (),
+    ) -> str:
+        """Hashes the prompt inputs into a cache key.
+
+        ``extra`` holds any other setting that shapes the prompt, such as the
+        scopes or the style examples. Every field is length-prefixed so that
+        moving text from one field to another can never produce the same key.
+        """
+        digest = hashlib.sha256()
+        fields = (model, system_prompt, template or "", explanation, diff, *extra)
+        for field in fields:
+            data = field.encode()
+            digest.update(f"{len(data)}:".encode())
+            digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+    def _entries(self) -> List["os.DirEntry[str]"]:
+        try:
+            with os.scandir(self.directory) as it:
+                return [e for e in it if e.name.endswith(_ENTRY_SUFFIX)]
+        except FileNotFoundError:
+            return []
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                message = f.read()
+        except OSError:
+            return None
+        # Bump the modification time so eviction treats the entry as fresh.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return message
+
+    def put(self, key: str, message: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(message)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> int:
+        """Removes least recently used entries until the cache fits its bound."""
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self) -> CacheStats:
+        sizes = []
+        for entry in self._entries():
+            try:
+                sizes.append(entry.stat().st_size)
+            except FileNotFoundError:
+                continue
+        return CacheStats(self.directory, len(sizes), sum(sizes), self.max_bytes)
+
+    def clear(self) -> int:
+        removed = 0
+        for entry in self._entries():
+            try:
+                os.unlink(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Concurrent generation of several candidate commit messages.
+
+Every candidate is requested on its own thread, so asking three models costs
+the latency of the slowest one (or of the fastest, when only the first answer
+is wanted) instead of the sum of their latencies. The threads are daemons:
+requests abandoned once a first answer arrived never delay exit.
+
+Candidates beyond the first are shown commented out below it in the editor,
+so picking another one means uncommenting it.
+"""
+
+import queue
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+COMMENT_PREFIX = "#"
+
+
+class Candidate(NamedTuple):
+    model: str
+    message: str
+
+
+# A job is the model it asks and a callable returning that model's message.
+Job = Tuple[str, Callable[[], str]]
+
+
+def fan_out(
+    jobs: Sequence[Job],
+    first: bool = False,
+    on_error: Optional[Callable[[str, BaseException], None]] = None,
+) -> List[Candidate]:
+    """Runs every job concurrently and returns the candidates in job order.
+
+    With ``first``, returns as soon as one job succeeds. Failed jobs are
+    passed to ``on_error``; if every job fails, the first error is raised.
+    Identical messages are only returned once.
+    """
+    done: "queue.Queue[Tuple[int, Optional[str], Optional[BaseException]]]"
+    done = queue.Queue()
+
+    def run(index: int, job: Callable[[], str]) -> None:
+        try:
+            done.put((index, job(), None))
+        except BaseException as e:  # reported in the caller's thread
+            done.put((index, None, e))
+
+    for index, (_, job) in enumerate(jobs):
+        threading.Thread(target=run, args=(index, job), daemon=True).start()
+
+    messages: Dict[int, str] = {}
+    errors: List[BaseException] = []
+    for _ in jobs:
+        index, message, error = done.get()
+        if error is not None:
+            errors.append(error)
+            if on_error is not None:
+                on_error(jobs[index][0], error)
+            continue
+        assert message is not None
+        if first:
+            return [Candidate(jobs[index][0], message)]
+        messages[index] = message
+
+    if not messages:
+        raise errors[0]
+    candidates: List[Candidate] = []
+    seen = set()
+    for index in sorted(messages):
+        key = messages[index].strip()
+        if key not in seen:
+            seen.add(key)
+            candidates.append(Candidate(jobs[index][0], messages[index]))
+    return candidates
+
+
+def format_alternatives(candidates: Sequence[Candidate]) -> str:
+    """Renders ``candidates`` as comment lines to append below a message."""
+    lines = [
+        "",
+        f"{COMMENT_PREFIX} Other candidates: to use one, uncomment it and delete",
+        f"{COMMENT_PREFIX} the message above. Lines starting with "
+        f"'{COMMENT_PREFIX}' are ignored.",
+    ]
+    for number, candidate in enumerate(candidates, start=2):
+        lines.append(COMMENT_PREFIX)
+        lines.append(f"{COMMENT_PREFIX} --- Candidate {number} ({candidate.model}) ---")
+        lines.extend(
+            f"{COMMENT_PREFIX} {line}".rstrip()
+            for line in candidate.message.strip().splitlines()
+        )
+    return "\n".join(lines) + "\n"
+
+
+def strip_comments(text: str) -> str:
+    """Drops comment lines from an edited message, as ``git commit`` would."""
+    lines = text.splitlines()
+    return "\n".join(
+        line for line in lines if not line.startswith(COMMENT_PREFIX)
+    ).strip()
@@ -2,110 +2,297 @@
 # -*- coding: utf-8 -*-
 
 import os
-from typing import Optional, Tuple, cast
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 
 import click
-from langchain_anthropic import ChatAnthropic
-from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_ollama import ChatOllama
-from langchain_openai import ChatOpenAI
-
-# Keep SecretStr import in case it's needed elsewhere or for future refinement
-
-# Conditional import for Google Generative AI
-try:
-    from langchain_google_genai import ChatGoogleGenerativeAI
-except ImportError:
-    ChatGoogleGenerativeAI = None  # type: ignore
 
+from commitai import IMPORT_STARTED, __version__, hooks
+from commitai.budget import CHARS_PER_TOKEN, fit_files, prompt_budget
+from commitai.cache import SEMANTIC_CACHE_MODES, MessageCache
+from commitai.diff import DiffFile, parse_diff, render_diff
+from commitai.filters import FilteredFile
 from commitai.git import (
+    CommitInfo,
+    RepoContext,
+    TruncatedFile,
+    apply_to_index,
     create_commit,
     get_commit_template,
-    get_current_branch_name,
-    get_repository_name,
-    get_staged_changes_diff,
+    get_staged_tree_hash,
+    has_staged_changes,
+    list_commits,
+    list_merges,
+    list_staged_paths,
+    read_commit_diff,
+    read_staged_patch,
     run_pre_commit_hook,
     save_commit_template,
     stage_all_changes,
+    unstage_all,
+)
+from commitai.history import (
+    OUTPUT_FORMATS,
+    format_filter_repo_callback,
+    format_json,
+    format_rebase_todo,
+    history_dir,
+    progress_path,
+    reword_commits,
+    write_message_files,
+)
+from commitai.llm import (
+    DEFAULT_RETRIES,
+    ChatModel,
+    Prompt,
+    ResilientChatModel,
+    RetryPolicy,
+    TokenUsage,
+    UsageMeter,
+    generate_text,
+    metering,
+    rate_limiter_for,
+)
+from commitai.profiling import PROFILE_FORMATS, Profiler, activate, event, span
+from commitai.providers import (
+    DEFAULT_MODEL,
+    create_chat_model,
+    ollama_model,
+    provider_key,
+)
+from commitai.style import StyleIndex
+from commitai.summarize import (
+    DEFAULT_CHUNK_SIZE,
+    map_reduce_message,
 )
 from commitai.template import (
     adding_template,
+    build_similar_message_hint,
+    build_style_examples,
+    build_truncation_notice,
     build_user_message,
+    chunk_summary_instructions,
     default_system_message,
+    scope_summary_instructions,
 )
 
+if TYPE_CHECKING:
+    from commitai.candidates import Candidate
+    from commitai.compact import Compaction
+    from commitai.config import Config
+    from commitai.scopes import Scope
+    from commitai.semantic import SemanticCache
 
-def _get_google_api_key() -> Optional[str]:
-    """Gets the Google API key from environment variables in priority order."""
-    return (
-        os.getenv("GOOGLE_API_KEY")
-        or os.getenv("GEMINI_API_KEY")
-        or os.getenv("GOOGLE_GENERATIVE_AI_API_KEY")
-    )
+# Seconds `commitai-daemon start` waits for the background daemon to answer.
+DAEMON_START_TIMEOUT = 10.0
 
+_T = TypeVar("_T")
 
-def _initialize_llm(model: str) -> BaseChatModel:
-    """Initializes and returns the LangChain chat model based on the model name."""
-    google_api_key_str = _get_google_api_key()
 
-    try:
-        if model.startswith("gpt-"):
-            api_key = os.getenv("OPENAI_API_KEY")
-            if not api_key:
-                raise click.ClickException(
-                    "Error: OPENAI_API_KEY environment variable not set."
-                )
-            return ChatOpenAI(model=model, api_key=api_key, temperature=0.7)
+class _Configured:
+    """Option default taken from the configuration once the option is parsed.
 
-        elif model.startswith("claude-"):
-            api_key = os.getenv("ANTHROPIC_API_KEY")
-            if not api_key:
-                raise click.ClickException(
-                    "Error: ANTHROPIC_API_KEY environment variable not set."
-                )
-            return ChatAnthropic(model_name=model, api_key=api_key, temperature=0.7)
+    ``--help`` shows the built-in default instead, so printing the help never
+    reads the configuration files. With ``negate``, the default of a
+    ``--no-<setting>`` flag is the opposite of the setting.
+    """
 
-        elif model.startswith("gemini-"):
-            if ChatGoogleGenerativeAI is None:
-                raise click.ClickException(
-                    "Error: 'langchain-google-genai' is not installed. "
-                    "Run 'pip install commitai[test]' or "
-                    "'pip install langchain-google-genai'"
-                )
-            if not google_api_key_str:
-                raise click.ClickException(
-                    "Error: Google API Key not found. Set GOOGLE_API_KEY, "
-                    "GEMINI_API_KEY, or GOOGLE_GENERATIVE_AI_API_KEY."
-                )
-            return ChatGoogleGenerativeAI(
-                model=model,
-                google_api_key=google_api_key_str,
-                temperature=0.7,
-                convert_system_message_to_human=True,
-            )
-        elif model.startswith("llama"):
-            # Ollama models (e.g., llama2, llama3)
-            return cast(BaseChatModel, ChatOllama(model=model, temperature=0.7))
-        else:
-            raise click.ClickException(f"🚫 Unsupported model: {model}")
+    def __init__(self, name: str, negate: bool = False) -> None:
+        self.name = name
+        self.negate = negate
+
+    def __call__(self) -> Any:
+        value = getattr(_config(), self.name)
+        return not value if self.negate else value
+
+    def __str__(self) -> str:
+        # Imported here: see _config.
+        from commitai.config import Config
+
+        return str(getattr(Config(), self.name))
+
+
+def _config() -> "Config":
+    # Imported here: the configuration is only resolved by commands that use
+    # it, and its module only compiled for them.
+    from commitai.config import current_config
 
+    return current_config()
+
+
+def _create_model(model: str, timeout: Optional[float]) -> ChatModel:
+    try:
+        return create_chat_model(model, timeout)
+    except click.ClickException:
+        raise
     except Exception as e:
         raise click.ClickException(f"Error initializing AI model: {e}") from e
 
 
-def _prepare_context() -> str:
-    diff = get_staged_changes_diff()
+def _initialize_llm(
+    model: str,
+    fallbacks: Optional[List[str]] = None,
+    timeout: Optional[float] = None,
+    retries: int = DEFAULT_RETRIES,
+    use_daemon: bool = False,
+) -> ChatModel:
+    """Initializes and returns the LangChain chat model based on the model name.
+
+    The provider backend is imported lazily by its factory, so only the
+    selected LangChain integration is ever loaded. The primary model is
+    created eagerly so a missing API key fails fast; fallback models are
+    created only if the primary one fails. With ``use_daemon``, a running
+    ``commitai-daemon`` serves the model instead, when there is one.
+    """
+    if use_daemon:
+        served = _connect_daemon(model, fallbacks, timeout, retries)
+        if served is not None:
+            return served
+    with span("initialize_llm", model=model):
+        llm = _create_model(model, timeout)
+    return ResilientChatModel(
+        model,
+        llm,
+        fallbacks,
+        create=lambda name: _create_model(name, timeout),
+        policy=RetryPolicy(attempts=max(retries, 0) + 1),
+    )
+
+
+def _connect_daemon(
+    model: str, fallbacks: Optional[List[str]], timeout: Optional[float], retries: int
+) -> Optional[ChatModel]:
+    # Imported here: sockets are only needed once a model is about to be used.
+    from commitai import daemon
+
+    with span("connect_daemon"):
+        return daemon.connect(model, fallbacks, timeout, retries)
+
+
+def _parse_models(value: Optional[str]) -> List[str]:
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+def _context_header(repo: RepoContext) -> str:
+    return f"{repo.toplevel}/{repo.branch}"
+
+
+class _StagedChanges(NamedTuple):
+    """The staged changes, read from the repository context once.
+
+    Generation only works from this snapshot, so a speculative generation
+    never reads the context while the main thread refreshes it.
+    """
+
+    header: str
+    # The header and the diff, as used for the cache keys.
+    formatted_diff: str
+    files: List[DiffFile]
+    truncated: List[TruncatedFile]
+
+
+def _prepare_context(repo: RepoContext) -> _StagedChanges:
+    with span("collect_diff"):
+        diff = repo.staged_diff
     if not diff:
         raise click.ClickException("⚠️ Warning: No staged changes found. Exiting.")
+    _report_filtered_files(repo.filtered_files)
+    _report_compaction(repo.compaction)
 
-    repo_name = get_repository_name()
-    branch_name = get_current_branch_name()
-    return f"{repo_name}/{branch_name}\n\n{diff}"
+    header = _context_header(repo)
+    return _StagedChanges(
+        header,
+        f"{header}\n\n{diff}",
+        list(repo.diff_files),
+        list(repo.truncated_files),
+    )
 
 
-def _build_prompt(
-    explanation: str, formatted_diff: str, template: Optional[str]
-) -> str:
+def _report_filtered_files(filtered: List[FilteredFile]) -> None:
+    if not filtered:
+        return
+    saved = sum(f.omitted_bytes for f in filtered)
+    names = ", ".join(f.path for f in filtered[:3])
+    if len(filtered) > 3:
+        names += f" and {len(filtered) - 3} more"
+    click.secho(
+        f"🧹 Summarized {len(filtered)} noisy file(s) ({names}), saving "
+        f"{saved:,} bytes (~{saved // CHARS_PER_TOKEN:,} tokens).",
+        fg="blue",
+    )
+
+
+def _report_compaction(compaction: Optional["Compaction"]) -> None:
+    if compaction is None or compaction.saved_bytes <= 0:
+        return
+    details = []
+    if compaction.moves:
+        details.append(f"{compaction.moves} unchanged move(s)")
+    if compaction.whitespace_hunks:
+        details.append(f"{compaction.whitespace_hunks} whitespace-only hunk(s)")
+    if compaction.context_lines is not None:
+        details.append(f"{compaction.context_lines} line(s) of context")
+    saved = compaction.saved_bytes
+    click.secho(
+        f"🗜️  Compacted the diff to {compaction.ratio:.0%} of its size "
+        f"({', '.join(details)}), saving {saved:,} bytes "
+        f"(~{saved // CHARS_PER_TOKEN:,} tokens).",
+        fg="blue",
+    )
+
+
+def _report_prompt_cache(usage: TokenUsage) -> None:
+    event("prompt_cache", **usage._asdict())
+    if not usage.cache_read_tokens and not usage.cache_creation_tokens:
+        return
+    details = []
+    if usage.cache_read_tokens:
+        details.append(
+            f"{usage.cache_read_tokens:,} of {usage.input_tokens:,} input tokens "
+            "read from the provider's prompt cache"
+        )
+    if usage.cache_creation_tokens:
+        details.append(f"{usage.cache_creation_tokens:,} written to it")
+    click.secho(f"♻️  {', '.join(details)}.", fg="blue")
+
+
+def _diff_byte_budget(
+    max_diff_bytes: Optional[int], max_diff_tokens: Optional[int]
+) -> Optional[int]:
+    budget = max_diff_bytes or None
+    if max_diff_tokens:
+        token_bytes = max_diff_tokens * CHARS_PER_TOKEN
+        budget = token_bytes if budget is None else min(budget, token_bytes)
+    return budget
+
+
+def _assemble_prompt(
+    explanation: str,
+    formatted_diff: str,
+    template: Optional[str],
+    truncated: Optional[List[TruncatedFile]] = None,
+    hint: Optional[str] = None,
+    examples: Sequence[str] = (),
+) -> Prompt:
     system_message = default_system_message
     if template:
         system_message += adding_template
@@ -116,12 +303,515 @@ def _build_prompt(
     else:
         diff_message = formatted_diff
 
-    return f"{system_message}\n\n{diff_message}"
+    if examples:
+        diff_message += "\n\n" + build_style_examples(examples)
+
+    if hint:
+        diff_message += "\n\n" + build_similar_message_hint(hint)
+
+    if truncated:
+        diff_message += "\n\n" + build_truncation_notice(truncated)
+
+    return Prompt(system_message, diff_message)
+
+
+def _build_prompt(
+    explanation: str,
+    header: str,
+    files: Sequence[DiffFile],
+    template: Optional[str],
+    truncated: Optional[List[TruncatedFile]] = None,
+    hint: Optional[str] = None,
+    examples: Sequence[str] = (),
+) -> Prompt:
+    """Builds the prompt for the parsed changes ``files``."""
+    formatted_diff = f"{header}\n\n{render_diff(files)}"
+    return _assemble_prompt(
+        explanation, formatted_diff, template, truncated, hint, examples
+    )
+
+
+class _GenerationSettings(NamedTuple):
+    model: str
+    explanation: str
+    template: Optional[str]
+    map_reduce_threshold: Optional[int]
+    workers: int
+    cache: Optional[MessageCache]
+    context_window: Optional[int] = None
+    semantic_cache: Optional["SemanticCache"] = None
+    semantic_mode: str = "off"
+    # The message of a similar earlier diff, shown to the model as an example.
+    hint: Optional[str] = None
+    style_index: Optional[StyleIndex] = None
+    style_examples: int = 0
+    # Messages of earlier commits touching the same paths, shown for style.
+    examples: Tuple[str, ...] = ()
+    # Glob patterns of the scope roots of a monorepo, e.g. "packages/*".
+    scopes: Tuple[str, ...] = ()
+
+
+def _fit_to_context(
+    header: str,
+    files: Sequence[DiffFile],
+    truncated: List[TruncatedFile],
+    settings: _GenerationSettings,
+) -> Tuple[Sequence[DiffFile], List[TruncatedFile]]:
+    """Trims ``files`` by relevance until the prompt fits the model's window."""
+    fixed = _assemble_prompt(
+        settings.explanation,
+        f"{header}\n\n",
+        settings.template,
+        truncated,
+        settings.hint,
+        settings.examples,
+    )
+    budget = prompt_budget(settings.model, fixed.text, settings.context_window)
+    with span("fit_prompt", budget=budget):
+        fitted = fit_files(files, budget, settings.explanation)
+    return fitted.files, truncated + fitted.truncated
+
+
+def _generate_commit_message(
+    llm: ChatModel,
+    header: str,
+    files: Sequence[DiffFile],
+    truncated: List[TruncatedFile],
+    settings: _GenerationSettings,
+    on_token: Optional[Callable[[str], None]] = None,
+) -> str:
+    explanation, template = settings.explanation, settings.template
+
+    def reduce_prompt(summaries: str) -> Prompt:
+        formatted = f"{header}\n\n{summaries}"
+        return _assemble_prompt(
+            explanation,
+            formatted,
+            template,
+            truncated,
+            settings.hint,
+            settings.examples,
+        )
+
+    scopes: List["Scope"] = []
+    if settings.scopes:
+        # Imported here: only monorepos configure scopes.
+        from commitai.scopes import multi_scope_message, partition
+
+        scopes = partition(files, settings.scopes)
+    if len(scopes) > 1:
+        room = prompt_budget(
+            settings.model, scope_summary_instructions, settings.context_window
+        )
+        return multi_scope_message(
+            llm,
+            scopes,
+            reduce_prompt,
+            room,
+            explanation,
+            settings.workers,
+            on_token,
+        )
+
+    threshold = settings.map_reduce_threshold
+    if threshold and sum(diff_file.size for diff_file in files) > threshold:
+        # Every chunk must fit the window next to the summary instructions.
+        room = prompt_budget(
+            settings.model, chunk_summary_instructions, settings.context_window
+        )
+        return map_reduce_message(
+            llm,
+            files,
+            reduce_prompt,
+            chunk_size=max(min(DEFAULT_CHUNK_SIZE, room * CHARS_PER_TOKEN), 1),
+            workers=settings.workers,
+            on_token=on_token,
+        )
+
+    files, truncated = _fit_to_context(header, files, truncated, settings)
+    prompt = _build_prompt(
+        explanation,
+        header,
+        files,
+        template,
+        truncated,
+        settings.hint,
+        settings.examples,
+    )
+    return generate_text(llm, prompt, on_token)
+
+
+def _with_style_examples(
+    settings: _GenerationSettings,
+    repo: RepoContext,
+    files: Sequence[DiffFile],
+) -> _GenerationSettings:
+    """Fills in the messages of earlier commits touching ``files``."""
+    index = settings.style_index
+    if index is None or not settings.style_examples or repo.head_sha is None:
+        return settings
+    try:
+        with span("style_examples"):
+            index.update(repo.head_sha)
+            paths = [diff_file.path for diff_file in files if diff_file.path]
+            examples = index.examples(paths, settings.style_examples)
+    except (OSError, subprocess.CalledProcessError) as e:
+        click.secho(f"Could not read earlier commit messages: {e}", fg="yellow")
+        return settings
+    return settings._replace(examples=tuple(examples))
+
+
+def _prompt_settings(settings: _GenerationSettings) -> Tuple[str, ...]:
+    """Returns the settings besides the diff that shape the prompts, as text.
+
+    The similarity hint itself is left out: after the first run it is the
+    message of this very diff, so the exact cache would never hit. The
+    semantic mode stands in for it.
+    """
+    return (
+        ",".join(settings.scopes),
+        str(settings.context_window or ""),
+        str(settings.map_reduce_threshold or ""),
+        settings.semantic_mode if settings.semantic_cache is not None else "off",
+        *settings.examples,
+    )
+
+
+def _produce_message(
+    llm: ChatModel,
+    repo: RepoContext,
+    staged: _StagedChanges,
+    settings: _GenerationSettings,
+    stream: bool = False,
+    discarded: Optional[threading.Event] = None,
+) -> str:
+    """Returns a commit message from the cache or, on a miss, from the model.
+
+    Once ``discarded`` is set, the message is no longer wanted and is not
+    written to the caches.
+    """
+    cache = settings.cache
+    formatted_diff = staged.formatted_diff
+    settings = _with_style_examples(settings, repo, staged.files)
+    cache_key = MessageCache.key(
+        settings.model,
+        default_system_message,
+        settings.template,
+        settings.explanation,
+        formatted_diff,
+        _prompt_settings(settings),
+    )
+    with span("cache_lookup"):
+        cached_message = cache.get(cache_key) if cache else None
+    if cached_message is not None:
+        click.secho("⚡ Reusing cached message for these staged changes.", fg="blue")
+        return cached_message
+
+    semantic = settings.semantic_cache
+    if semantic is not None:
+        with span("semantic_lookup"):
+            match = semantic.find(formatted_diff)
+        if match is not None and settings.semantic_mode == "draft":
+            click.secho(
+                f"⚡ Reusing the message of a {match.similarity:.0%} similar diff.",
+                fg="blue",
+            )
+            return match.message
+        if match is not None:
+            settings = settings._replace(hint=match.message)
+
+    token_sink: ContextManager[Optional[Callable[[str], None]]] = (
+        _stream_to_terminal_and_file(repo) if stream else nullcontext()
+    )
+    try:
+        with span("llm", model=settings.model), token_sink as on_token:
+            commit_message = _generate_commit_message(
+                llm,
+                staged.header,
+                staged.files,
+                staged.truncated,
+                settings,
+                on_token,
+            )
+    except click.ClickException:
+        raise
+    except Exception as e:
+        raise click.ClickException(f"Error during AI generation: {e}") from e
+
+    if discarded is not None and discarded.is_set():
+        return commit_message
+    try:
+        if cache:
+            cache.put(cache_key, commit_message)
+        if semantic is not None:
+            semantic.add(formatted_diff, commit_message)
+    except OSError as e:
+        click.secho(f"Could not cache the message: {e}", fg="yellow")
+    return commit_message
+
+
+def _produce_candidates(
+    llms: Dict[str, ChatModel],
+    repo: RepoContext,
+    staged: _StagedChanges,
+    settings: _GenerationSettings,
+    count: int,
+    first: bool,
+) -> List["Candidate"]:
+    """Asks every model for ``count`` messages at once.
+
+    The caches are bypassed: candidates are meant to be fresh alternatives.
+    With ``first``, only the message that arrives first is returned.
+    """
+    settings = _with_style_examples(settings, repo, staged.files)
+    header, files, truncated = staged.header, staged.files, staged.truncated
+
+    def job(model: str, llm: ChatModel) -> Callable[[], str]:
+        def generate() -> str:
+            with span("llm", model=model):
+                return _generate_commit_message(
+                    llm, header, files, truncated, settings._replace(model=model)
+                )
+
+        return generate
+
+    def report(model: str, error: BaseException) -> None:
+        click.secho(f"⚠️ {model} did not produce a message: {error}", fg="yellow")
+
+    # Imported here: only runs asking for several messages need it.
+    from commitai.candidates import fan_out
+
+    jobs = [(model, job(model, llm)) for model, llm in llms.items()] * count
+    try:
+        with span("fan_out", requests=len(jobs)):
+            return fan_out(jobs, first, report)
+    except click.ClickException:
+        raise
+    except Exception as e:
+        raise click.ClickException(f"Error during AI generation: {e}") from e
+
+
+class _PlannedCommit(NamedTuple):
+    scope: "Scope"
+    # The staged paths of the scope, with the sources of their renames.
+    paths: List[str]
+    message: str
+
+
+def _plan_split(
+    llm: ChatModel, repo: RepoContext, settings: _GenerationSettings
+) -> List[_PlannedCommit]:
+    """Generates one message per scope of the staged changes, concurrently.
+
+    Returns an empty plan when the changes do not span several scopes.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from commitai.scopes import Scope, partition, partition_paths, scope_root
+
+    staged = partition_paths(list_staged_paths(), settings.scopes)
+    if len(staged) < 2:
+        return []
+    diff_scopes = {
+        scope.root: scope for scope in partition(repo.diff_files, settings.scopes)
+    }
+    scopes = [diff_scopes.get(root, Scope(root, [])) for root in staged]
+    scoped_settings = [
+        _with_style_examples(settings, repo, scope.files) for scope in scopes
+    ]
+    header = _context_header(repo)
+
+    def generate(scope: "Scope", scope_settings: _GenerationSettings) -> str:
+        truncated = [
+            truncated_file
+            for truncated_file in repo.truncated_files
+            if scope_root(truncated_file.path, settings.scopes) == scope.root
+        ]
+        with span("llm", model=settings.model, scope=scope.name):
+            return _generate_commit_message(
+                llm, f"{header} ({scope.name})", scope.files, truncated, scope_settings
+            )
+
+    workers = max(1, min(settings.workers, len(scopes)))
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            messages = list(pool.map(generate, scopes, scoped_settings))
+    except click.ClickException:
+        raise
+    except Exception as e:
+        raise click.ClickException(f"Error during AI generation: {e}") from e
+    return [
+        _PlannedCommit(scope, staged[scope.root], message)
+        for scope, message in zip(scopes, messages)
+    ]
+
+
+def _restage(patches: Sequence[bytes], patch_dir: str) -> None:
+    try:
+        for patch in patches:
+            apply_to_index(patch)
+    except subprocess.CalledProcessError:
+        click.secho(
+            "Could not stage the remaining changes again; their patches are "
+            f"in {patch_dir}.",
+            fg="red",
+        )
+    else:
+        if patches:
+            click.secho("The scopes not committed yet are staged again.", fg="yellow")
+
+
+def _commit_split(
+    plan: Sequence[_PlannedCommit], commit_flag: bool, repo: RepoContext
+) -> None:
+    """Commits ``plan`` one scope at a time by restaging each scope's changes.
 
+    The staged changes of every scope are saved as a patch under
+    ``.git/commitai/split`` before the index is reset. If a commit fails or
+    is aborted, the scopes not committed yet are staged again.
+    """
+    click.secho(
+        f"✂️  Splitting the staged changes into {len(plan)} commits:\n",
+        fg="blue",
+        bold=True,
+    )
+    for number, planned in enumerate(plan, 1):
+        subject = (planned.message.strip().splitlines() or [""])[0]
+        click.secho(f"  {number}. [{planned.scope.name}] {subject}", fg="blue")
+
+    patch_dir = os.path.join(repo.git_dir, "commitai", "split")
+    shutil.rmtree(patch_dir, ignore_errors=True)
+    try:
+        os.makedirs(patch_dir)
+        patches = []
+        for number, planned in enumerate(plan, 1):
+            patch = read_staged_patch(planned.paths)
+            name = f"{number:02d}-{planned.scope.name}.patch"
+            with open(os.path.join(patch_dir, name), "wb") as f:
+                f.write(patch)
+            patches.append(patch)
+        unstage_all(repo.head_sha)
+    except (OSError, subprocess.CalledProcessError) as e:
+        raise click.ClickException(f"Could not split the staged changes: {e}") from e
 
-def _handle_commit(commit_message: str, commit_flag: bool) -> None:
-    repo_path = get_repository_name()
-    git_dir = os.path.join(repo_path, ".git")
+    applied = 0
+    try:
+        for planned, patch in zip(plan, patches):
+            apply_to_index(patch)
+            applied += 1
+            _handle_commit(planned.message, commit_flag, repo)
+            if has_staged_changes():
+                raise click.ClickException(
+                    f"The commit for the {planned.scope.name} scope failed."
+                )
+    except subprocess.CalledProcessError as e:
+        _restage(patches[applied:], patch_dir)
+        raise click.ClickException(f"Could not stage a scope: {e}") from e
+    except BaseException:
+        _restage(patches[applied:], patch_dir)
+        raise
+    shutil.rmtree(patch_dir, ignore_errors=True)
+
+
+class _Speculation(Generic[_T]):
+    """Generates a message on a background thread while the hook runs.
+
+    The thread is a daemon so a discarded speculation never delays exit.
+    """
+
+    def __init__(self, target: Callable[[], _T]) -> None:
+        self._target = target
+        self._result: Optional[_T] = None
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            self._result = self._target()
+        except BaseException as e:  # re-raised in the caller's thread
+            self._error = e
+
+    def result(self) -> _T:
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        assert self._result is not None
+        return self._result
+
+
+def _run_hook_speculatively(
+    repo: RepoContext,
+    produce: Callable[[_StagedChanges, bool, Optional[threading.Event]], _T],
+    stream: bool,
+    show: Optional[Callable[[_T], None]] = None,
+) -> _T:
+    """Runs the pre-commit hook while messages are generated for the index.
+
+    ``produce`` receives a snapshot of the staged changes, whether to stream
+    and an event set once its result is discarded. The staged tree is hashed
+    before and after the hook; if the hook changed the index, the speculative
+    result is discarded, without being cached, and produced again for the
+    updated diff. The speculation never streams, since the hook writes to the
+    terminal at the same time; with ``stream``, a kept result is passed to
+    ``show`` instead.
+    """
+    tree_before = get_staged_tree_hash()
+    staged = _prepare_context(repo)
+    discarded = threading.Event()
+    speculation = _Speculation(lambda: produce(staged, False, discarded))
+
+    if not run_pre_commit_hook(repo):
+        raise click.ClickException("🚫 Pre-commit hook failed. Aborting commit.")
+
+    if get_staged_tree_hash() == tree_before:
+        result = speculation.result()
+        if stream and show is not None:
+            show(result)
+        return result
+
+    click.secho(
+        "↻ The pre-commit hook modified the staged changes; regenerating.",
+        fg="yellow",
+    )
+    discarded.set()
+    repo.invalidate_staged_diff()
+    return produce(_prepare_context(repo), stream, None)
+
+
+@contextmanager
+def _stream_to_terminal_and_file(
+    repo: RepoContext,
+) -> Iterator[Callable[[str], None]]:
+    """Yields a token callback echoing to the terminal and COMMIT_EDITMSG.
+
+    The file is flushed after every token, so an editor or a second terminal
+    can follow the message while it is still being generated.
+    """
+    commit_msg_path = os.path.join(repo.git_dir, "COMMIT_EDITMSG")
+    try:
+        os.makedirs(repo.git_dir, exist_ok=True)
+        commit_msg_file = open(commit_msg_path, "w")
+    except OSError as e:
+        raise click.ClickException(f"Error writing commit message file: {e}") from e
+
+    def on_token(text: str) -> None:
+        click.echo(text, nl=False)
+        commit_msg_file.write(text)
+        commit_msg_file.flush()
+
+    with commit_msg_file:
+        yield on_token
+    click.echo()
+
+
+def _handle_commit(
+    commit_message: str,
+    commit_flag: bool,
+    repo: RepoContext,
+    alternatives: Sequence["Candidate"] = (),
+) -> None:
+    git_dir = repo.git_dir
     try:
         os.makedirs(git_dir, exist_ok=True)
     except OSError as e:
@@ -132,15 +822,24 @@ def _handle_commit(commit_message: str, commit_flag: bool) -> None:
     try:
         with open(commit_msg_path, "w") as f:
             f.write(commit_message)
+            if alternatives:
+                from commitai.candidates import format_alternatives
+
+                f.write("\n" + format_alternatives(alternatives))
     except IOError as e:
         raise click.ClickException(f"Error writing commit message file: {e}") from e
 
     final_commit_message = commit_message
     if not commit_flag:
         try:
-            click.edit(filename=commit_msg_path)
+            with span("editor"):
+                click.edit(filename=commit_msg_path)
             with open(commit_msg_path, "r") as f:
                 final_commit_message = f.read().strip()
+            if alternatives:
+                from commitai.candidates import strip_comments
+
+                final_commit_message = strip_comments(final_commit_message)
         except click.UsageError as e:
             click.secho(f"Could not open editor: {e}", fg="yellow")
             click.secho(f"Using generated message:\n\n{commit_message}\n", fg="yellow")
@@ -152,7 +851,8 @@ def _handle_commit(commit_message: str, commit_flag: bool) -> None:
     if not final_commit_message:
         raise click.ClickException("Aborting commit due to empty commit message.")
 
-    create_commit(final_commit_message)
+    with span("git_commit"):
+        create_commit(final_commit_message)
     click.secho(
         f"\n\n✅ Committed message:\n\n{final_commit_message}\n\n",
         fg="green",
@@ -160,11 +860,262 @@ def _handle_commit(commit_message: str, commit_flag: bool) -> None:
     )
 
 
+def _provider_options(func: Callable[..., Any]) -> Callable[..., Any]:
+    func = click.option(
+        "--retries",
+        type=int,
+        default=_Configured("retries"),
+        show_default=True,
+        help="Retry transient provider errors (429, 5xx, timeouts) this many times.",
+    )(func)
+    func = click.option(
+        "--timeout",
+        type=float,
+        default=_Configured("timeout"),
+        help="Per-request timeout in seconds for the model provider.",
+    )(func)
+    func = click.option(
+        "--fallback-models",
+        default=_Configured("fallback_models"),
+        help=(
+            "Comma-separated models to try, in order, when the main model "
+            "keeps failing (e.g. 'claude-3-5-haiku-latest,gpt-4o-mini')."
+        ),
+    )(func)
+    func = click.option(
+        "--no-daemon",
+        is_flag=True,
+        default=_Configured("daemon", negate=True),
+        help="Call the model from this process even if a daemon is running.",
+    )(func)
+    return func
+
+
+def _generation_options(func: Callable[..., Any]) -> Callable[..., Any]:
+    func = click.option(
+        "--profile-format",
+        type=click.Choice(PROFILE_FORMATS),
+        default="jsonl",
+        show_default=True,
+        help=(
+            "Format of --profile-output: JSON lines (appended, one span per "
+            "line) or a Chrome trace event file."
+        ),
+    )(func)
+    func = click.option(
+        "--profile-output",
+        type=click.Path(dir_okay=False),
+        default=None,
+        help="Write the timing of every phase of this run to this file.",
+    )(func)
+    func = click.option(
+        "--profile",
+        is_flag=True,
+        help="Print how long each phase of the run took.",
+    )(func)
+    func = _provider_options(func)
+    func = click.option(
+        "--split",
+        is_flag=True,
+        help=(
+            "With --scopes, create one commit per scope instead of one "
+            "commit, restaging each scope's changes in turn."
+        ),
+    )(func)
+    func = click.option(
+        "--scopes",
+        default=None,
+        help=(
+            "Comma-separated glob patterns of the scope roots of a monorepo "
+            "(e.g. 'packages/*,services/*'). Changes spanning several scopes "
+            "are summarized per scope, concurrently."
+        ),
+    )(func)
+    func = click.option(
+        "--first",
+        is_flag=True,
+        help=(
+            "With --candidates or --models, use whichever message arrives "
+            "first instead of waiting for all of them."
+        ),
+    )(func)
+    func = click.option(
+        "--models",
+        default=None,
+        help=(
+            "Comma-separated models to ask concurrently instead of --model "
+            "(e.g. 'gpt-4o,claude-3-5-sonnet-latest'); their messages are "
+            "offered in the editor."
+        ),
+    )(func)
+    func = click.option(
+        "--candidates",
+        type=click.IntRange(min=1),
+        default=1,
+        show_default=True,
+        help=(
+            "Number of messages to generate concurrently per model. The first "
+            "one is used; the others are shown commented out in the editor."
+        ),
+    )(func)
+    func = click.option(
+        "--speculative",
+        is_flag=True,
+        help=(
+            "Start generating while the pre-commit hook runs; the message is "
+            "regenerated only if the hook changes the staged files."
+        ),
+    )(func)
+    func = click.option(
+        "--stream",
+        is_flag=True,
+        default=_Configured("stream"),
+        help=(
+            "Print the message as it is generated and write it to "
+            "COMMIT_EDITMSG token by token."
+        ),
+    )(func)
+    func = click.option(
+        "--no-compact",
+        is_flag=True,
+        default=_Configured("compact", negate=True),
+        help=(
+            "Send the diff with git's full context, and unchanged renames and "
+            "whitespace-only changes in full."
+        ),
+    )(func)
+    func = click.option(
+        "--no-filter",
+        is_flag=True,
+        default=_Configured("filter_noise", negate=True),
+        help=(
+            "Send lockfiles, minified, generated and binary files to the model "
+            "instead of a one-line summary of them."
+        ),
+    )(func)
+    func = click.option(
+        "--semantic-threshold",
+        type=float,
+        default=_Configured("semantic_threshold"),
+        help="Cosine similarity (0-1) from which an earlier diff counts as "
+        "similar (default: 0.9).",
+    )(func)
+    func = click.option(
+        "--semantic-cache",
+        type=click.Choice(SEMANTIC_CACHE_MODES),
+        default=_Configured("semantic_cache"),
+        show_default=True,
+        help=(
+            "Look up the message of the most similar earlier diff: 'draft' "
+            "reuses it without calling the model, 'hint' shows it to the model "
+            "as an example."
+        ),
+    )(func)
+    func = click.option(
+        "--style-examples",
+        type=click.IntRange(min=0),
+        default=_Configured("style_examples"),
+        show_default=True,
+        help=(
+            "Show the model this many messages of earlier commits that touched "
+            "the same files, so it follows the repository's style. Use 0 to "
+            "disable."
+        ),
+    )(func)
+    func = click.option(
+        "--no-cache",
+        is_flag=True,
+        help="Always query the model instead of reusing a cached message.",
+    )(func)
+    func = click.option(
+        "--workers",
+        type=int,
+        default=_Configured("workers"),
+        show_default=True,
+        help="Number of concurrent requests used to summarize large diffs.",
+    )(func)
+    func = click.option(
+        "--map-reduce-threshold",
+        type=int,
+        default=_Configured("map_reduce_threshold"),
+        show_default=True,
+        help=(
+            "Summarize diffs longer than this many characters chunk by chunk "
+            "before writing the message. Use 0 to always send a single prompt."
+        ),
+    )(func)
+    func = click.option(
+        "--context-window",
+        type=int,
+        default=_Configured("context_window"),
+        help=(
+            "Context window of the model in tokens, for models CommitAi does "
+            "not know. The diff is trimmed by relevance to fit it."
+        ),
+    )(func)
+    func = click.option(
+        "--max-diff-tokens",
+        type=int,
+        default=_Configured("max_diff_tokens"),
+        help="Cap the staged diff sent to the model at roughly this many tokens.",
+    )(func)
+    func = click.option(
+        "--max-diff-bytes",
+        type=int,
+        default=_Configured("max_diff_bytes"),
+        show_default=True,
+        help=(
+            "Cap the staged diff read from git at this many bytes; files past "
+            "the budget are reported as truncated. Use 0 to disable."
+        ),
+    )(func)
+    return func
+
+
 @click.group(context_settings={"help_option_names": ["-h", "--help"]})
 def cli() -> None:
     pass
 
 
+@contextmanager
+def _profiling(
+    profile: bool, profile_output: Optional[str], profile_format: str, **attrs: Any
+) -> Iterator[None]:
+    """Records the phases of the enclosed run and reports them at the end.
+
+    The report is produced even when the run fails, to show where it stopped.
+    """
+    if not profile and not profile_output:
+        yield
+        return
+
+    attrs.update(run_id=os.urandom(8).hex(), version=__version__)
+    profiler = Profiler(attrs, origin=IMPORT_STARTED)
+    profiler.record("startup", IMPORT_STARTED, time.perf_counter())
+    try:
+        with activate(profiler), profiler.span("generate"):
+            yield
+    finally:
+        if profile:
+            click.echo("\n" + profiler.format_breakdown(), err=True)
+        if profile_output:
+            try:
+                profiler.write(profile_output, profile_format)
+            except OSError as e:
+                click.secho(f"Could not write the profile: {e}", fg="yellow")
+
+
+def _semantic_cache(
+    repo: RepoContext, mode: str, threshold: Optional[float]
+) -> Optional["SemanticCache"]:
+    if mode == "off":
+        return None
+    # Imported here: NumPy takes longer to import than the rest of commitai.
+    from commitai.semantic import SemanticCache
+
+    return SemanticCache.for_repo(repo.git_dir, threshold)
+
+
 @cli.command(name="generate")
 @click.argument("description", nargs=-1, type=click.UNPROCESSED)
 @click.option(
@@ -190,7 +1141,7 @@ def cli() -> None:
 @click.option(
     "--model",
     "-m",
-    default="gemini-2.5-pro-preview-03-25",
+    default=_Configured("model"),
     help=(
         "Set the engine model (e.g., 'gpt-4', 'claude-3-opus-20240229', "
         "'gemini-2.5-pro-preview-03-25'). Ensure API key env var is set "
@@ -198,57 +1149,152 @@ def cli() -> None:
         "GOOGLE_API_KEY/GEMINI_API_KEY/GOOGLE_GENERATIVE_AI_API_KEY)."
     ),
 )
+@_generation_options
 def generate_message(
     description: Tuple[str, ...],
     commit: bool,
     template: Optional[str],
     add: bool,
     model: str,
+    max_diff_bytes: Optional[int],
+    max_diff_tokens: Optional[int],
+    map_reduce_threshold: Optional[int],
+    workers: int,
+    no_cache: bool,
+    stream: bool,
+    speculative: bool,
+    fallback_models: Optional[str],
+    timeout: Optional[float],
+    retries: int,
+    profile: bool,
+    profile_output: Optional[str],
+    profile_format: str,
+    no_filter: bool,
+    no_compact: bool,
+    context_window: Optional[int],
+    no_daemon: bool,
+    semantic_cache: str,
+    semantic_threshold: Optional[float],
+    candidates: int,
+    models: Optional[str],
+    first: bool,
+    style_examples: int,
+    scopes: Optional[str],
+    split: bool,
 ) -> None:
-    explanation = " ".join(description)
+    models_list = _parse_models(models) or [model]
+    fan_out_requests = len(models_list) > 1 or candidates > 1
+    if stream and fan_out_requests:
+        raise click.UsageError(
+            "--stream cannot be combined with --candidates or --models."
+        )
+    scope_patterns: Tuple[str, ...] = ()
+    if scopes:
+        from commitai.scopes import parse_scope_patterns
 
-    llm = _initialize_llm(model)
+        scope_patterns = parse_scope_patterns(scopes)
+    if split and not scope_patterns:
+        raise click.UsageError("--split needs --scopes.")
+    if split and (fan_out_requests or stream or speculative):
+        raise click.UsageError(
+            "--split cannot be combined with --candidates, --models, --stream "
+            "or --speculative."
+        )
 
-    if add:
-        stage_all_changes()
+    profiling = _profiling(profile, profile_output, profile_format, model=model)
+    meter = UsageMeter()
+    with profiling, metering(meter):
+        explanation = " ".join(description)
+        repo = RepoContext(
+            _diff_byte_budget(max_diff_bytes, max_diff_tokens),
+            filter_noise=not no_filter,
+            compact=not no_compact,
+        )
 
-    click.secho(
-        "\n🔍 Looking for a native pre-commit hook and running it\n",
-        fg="blue",
-        bold=True,
-    )
-    if not run_pre_commit_hook():
-        raise click.ClickException("🚫 Pre-commit hook failed. Aborting commit.")
+        llms = {
+            name: _initialize_llm(
+                name, _parse_models(fallback_models), timeout, retries, not no_daemon
+            )
+            for name in models_list
+        }
 
-    formatted_diff = _prepare_context()
+        if add:
+            with span("stage_all"):
+                stage_all_changes()
 
-    if template:
-        click.secho(
-            "⚠️ Warning: The --template/-t option is deprecated. Use environment "
-            "variable TEMPLATE_COMMIT or `commitai-create-template` command.",
-            fg="yellow",
+        if template:
+            click.secho(
+                "⚠️ Warning: The --template/-t option is deprecated. Use environment "
+                "variable TEMPLATE_COMMIT or `commitai-create-template` command.",
+                fg="yellow",
+            )
+        settings = _GenerationSettings(
+            model=models_list[0],
+            explanation=explanation,
+            template=template or get_commit_template(repo),
+            map_reduce_threshold=map_reduce_threshold,
+            workers=workers,
+            cache=(
+                None
+                if no_cache
+                else MessageCache.for_repo(repo, _config().cache_max_bytes)
+            ),
+            context_window=context_window,
+            semantic_cache=_semantic_cache(repo, semantic_cache, semantic_threshold),
+            semantic_mode=semantic_cache,
+            style_index=StyleIndex.for_repo(repo.git_dir),
+            style_examples=style_examples,
+            scopes=scope_patterns,
         )
-    final_template = template or get_commit_template()
 
-    input_message = _build_prompt(explanation, formatted_diff, final_template)
+        def produce(
+            staged: _StagedChanges,
+            stream: bool,
+            discarded: Optional[threading.Event] = None,
+        ) -> List["Candidate"]:
+            from commitai.candidates import Candidate
 
-    click.clear()
-    click.secho(
-        "\n\n🧠 Analyzing the changes and generating a commit message...\n\n",
-        fg="blue",
-        bold=True,
-    )
-    try:
-        assert llm is not None
-        ai_message = llm.invoke(input=input_message)
-        commit_message = ai_message.content
-        if not isinstance(commit_message, str):
-            commit_message = str(commit_message)
+            if fan_out_requests:
+                return _produce_candidates(
+                    llms, repo, staged, settings, candidates, first
+                )
+            llm = llms[settings.model]
+            message = _produce_message(llm, repo, staged, settings, stream, discarded)
+            return [Candidate(settings.model, message)]
 
-    except Exception as e:
-        raise click.ClickException(f"Error during AI generation: {e}") from e
+        click.secho(
+            "\n🔍 Looking for a native pre-commit hook and running it\n",
+            fg="blue",
+            bold=True,
+        )
+        if speculative:
+            produced = _run_hook_speculatively(
+                repo, produce, stream, lambda kept: click.echo(kept[0].message)
+            )
+        else:
+            if not run_pre_commit_hook(repo):
+                raise click.ClickException(
+                    "🚫 Pre-commit hook failed. Aborting commit."
+                )
+
+            staged = _prepare_context(repo)
+
+            click.clear()
+            click.secho(
+                "\n\n🧠 Analyzing the changes and generating a commit message...\n\n",
+                fg="blue",
+                bold=True,
+            )
+            plan = _plan_split(llms[settings.model], repo, settings) if split else []
+            if plan:
+                _report_prompt_cache(meter.total)
+                _commit_split(plan, commit, repo)
+                return
+            produced = produce(staged, stream)
 
-    _handle_commit(commit_message, commit)
+        _report_prompt_cache(meter.total)
+        chosen, *alternatives = produced
+        _handle_commit(chosen.message, commit, repo, alternatives)
 
 
 @cli.command(name="create-template")
@@ -257,12 +1303,500 @@ def create_template_command(template_content: Tuple[str, ...]) -> None:
     """Saves a repository-specific commit template."""
     content = " ".join(template_content)
     if content:
-        save_commit_template(content)
+        save_commit_template(content, RepoContext())
         click.secho("📝 Template saved successfully.", fg="green")
     else:
         click.secho("❗ Please provide the template content.", fg="red")
 
 
+@cli.group(name="cache")
+def cache_group() -> None:
+    """Inspects or clears the cache of generated messages."""
+
+
+@cache_group.command(name="stats")
+def cache_stats_command() -> None:
+    """Shows the size of the message cache for this repository."""
+    stats = MessageCache.for_repo(RepoContext(), _config().cache_max_bytes).stats()
+    click.echo(f"Directory: {stats.directory}")
+    click.echo(f"Entries:   {stats.entries}")
+    click.echo(f"Size:      {stats.total_bytes} / {stats.max_bytes} bytes")
+
+
+@cache_group.command(name="clear")
+def cache_clear_command() -> None:
+    """Removes every cached message for this repository."""
+    from commitai.semantic import SemanticCache
+
+    repo = RepoContext()
+    removed = MessageCache.for_repo(repo).clear()
+    removed += SemanticCache.for_repo(repo.git_dir).clear()
+    click.secho(f"🧹 Removed {removed} cached message(s).", fg="green")
+
+
+@cli.command(name="history")
+@click.argument("rev_range")
+@click.option(
+    "--model",
+    "-m",
+    default=_Configured("model"),
+    help="Set the engine model to be used.",
+)
+@click.option(
+    "--concurrency",
+    "-j",
+    type=int,
+    default=_Configured("concurrency"),
+    show_default=True,
+    help="Number of commits processed concurrently.",
+)
+@click.option(
+    "--requests-per-minute",
+    "--rpm",
+    type=float,
+    default=None,
+    help="Limit the requests per minute sent to the model's provider.",
+)
+@click.option(
+    "--format",
+    "output_format",
+    type=click.Choice(OUTPUT_FORMATS),
+    default="json",
+    show_default=True,
+    help=(
+        "Emit a sha-to-message JSON mapping, a 'git rebase -i' todo list or a "
+        "'git filter-repo --commit-callback' body."
+    ),
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Write the result to this file instead of standard output.",
+)
+@click.option(
+    "--restart",
+    is_flag=True,
+    help="Discard the progress saved by an interrupted run of the same range.",
+)
+@click.option(
+    "--max-diff-bytes",
+    type=int,
+    default=_Configured("max_diff_bytes"),
+    show_default=True,
+    help="Cap each commit's diff at this many bytes. Use 0 to disable.",
+)
+@_provider_options
+def history_command(
+    rev_range: str,
+    model: str,
+    concurrency: int,
+    requests_per_minute: Optional[float],
+    output_format: str,
+    output: Optional[str],
+    restart: bool,
+    max_diff_bytes: int,
+    fallback_models: Optional[str],
+    timeout: Optional[float],
+    retries: int,
+    no_daemon: bool,
+) -> None:
+    """Generates new messages for every commit in REV_RANGE (e.g. main..HEAD).
+
+    Progress is saved after every commit, so re-running the same command
+    resumes an interrupted run.
+    """
+    repo = RepoContext()
+    try:
+        merges = list_merges(rev_range)
+        commits = list_commits(rev_range)
+    except subprocess.CalledProcessError as e:
+        raise click.ClickException(f"Invalid revision range: {rev_range}") from e
+    if merges:
+        # Rewriting the messages replays the range as a linear history, which
+        # would drop the merges and the changes made while resolving them.
+        raise click.ClickException(
+            f"{rev_range} contains {len(merges)} merge commit(s), starting with "
+            f"{merges[0][:12]}; reword a range without merges."
+        )
+    if not commits:
+        raise click.ClickException(f"No commits found in {rev_range}.")
+
+    llm = _initialize_llm(
+        model, _parse_models(fallback_models), timeout, retries, not no_daemon
+    )
+    config = _config()
+    settings = _GenerationSettings(
+        model=model,
+        explanation="",
+        template=get_commit_template(repo),
+        map_reduce_threshold=config.map_reduce_threshold,
+        workers=config.workers,
+        cache=None,
+        context_window=config.context_window,
+    )
+
+    progress_file = progress_path(repo.git_dir, rev_range, model)
+    if restart and os.path.exists(progress_file):
+        os.remove(progress_file)
+    rate_limiter = (
+        rate_limiter_for(provider_key(model), requests_per_minute)
+        if requests_per_minute
+        else None
+    )
+
+    def generate(commit: CommitInfo) -> str:
+        diff = read_commit_diff(commit.sha, max_diff_bytes or None)
+        return _generate_commit_message(
+            llm,
+            f"{repo.toplevel}@{commit.sha[:12]}",
+            parse_diff(diff.text),
+            diff.truncated,
+            settings._replace(explanation=commit.message),
+        )
+
+    def report(commit: CommitInfo, message: str) -> None:
+        subject = message.strip().splitlines()[0] if message.strip() else ""
+        click.secho(f"✅ {commit.sha[:12]} {subject}", fg="green", err=True)
+
+    try:
+        messages = reword_commits(
+            commits, generate, progress_file, concurrency, rate_limiter, report
+        )
+    except Exception as e:
+        raise click.ClickException(
+            f"Error during AI generation: {e}. Progress was saved; run the same "
+            "command again to resume."
+        ) from e
+
+    if output_format == "rebase-todo":
+        message_dir = os.path.join(history_dir(repo.git_dir), "messages")
+        result = format_rebase_todo(commits, write_message_files(messages, message_dir))
+    elif output_format == "filter-repo":
+        mapping_path = os.path.splitext(progress_file)[0] + ".json"
+        with open(mapping_path, "w", encoding="utf-8") as f:
+            f.write(format_json(messages))
+        result = format_filter_repo_callback(mapping_path)
+    else:
+        result = format_json(messages)
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(result)
+        click.secho(f"📝 Wrote {len(messages)} message(s) to {output}", fg="green")
+    else:
+        click.echo(result, nl=False)
+
+
+@cli.group(name="daemon")
+def daemon_group() -> None:
+    """Runs a background process that keeps model clients warm.
+
+    While it runs, every commitai invocation forwards its model calls to it
+    instead of importing and connecting to the provider itself.
+    """
+
+
+def _serve_daemon(models: Sequence[str], idle_timeout: float) -> None:
+    from commitai import daemon
+
+    try:
+        server = daemon.DaemonServer(
+            daemon.socket_path(), _initialize_llm, idle_timeout
+        )
+    except (OSError, daemon.DaemonError) as e:
+        raise click.ClickException(f"Could not start the daemon: {e}") from e
+    for model in models:
+        try:
+            server.model_for(model, [], None, DEFAULT_RETRIES)
+        except click.ClickException as e:
+            click.secho(f"Could not load {model}: {e.message}", fg="yellow", err=True)
+    click.secho(f"🟢 Daemon listening on {server.path}", fg="green", err=True)
+    server.serve()
+
+
+@daemon_group.command(name="start")
+@click.option(
+    "--model",
+    "-m",
+    "models",
+    multiple=True,
+    default=lambda: (_config().model,),
+    show_default=DEFAULT_MODEL,
+    help="Load this model at startup (repeatable). Others load on first use.",
+)
+@click.option(
+    "--idle-timeout",
+    type=float,
+    default=None,
+    help="Exit after this many seconds without requests (default: 3600). "
+    "Use 0 to run until stopped.",
+)
+@click.option(
+    "--foreground",
+    is_flag=True,
+    help="Serve from this process instead of starting a background one.",
+)
+def daemon_start_command(
+    models: Tuple[str, ...], idle_timeout: Optional[float], foreground: bool
+) -> None:
+    """Starts the daemon."""
+    from commitai import daemon
+
+    if idle_timeout is None:
+        idle_timeout = daemon.DEFAULT_IDLE_TIMEOUT
+    if not daemon.SUPPORTED:
+        raise click.ClickException("The daemon needs Unix domain sockets.")
+    if foreground:
+        _serve_daemon(models, idle_timeout)
+        return
+
+    running = daemon.status()
+    if running is not None:
+        click.secho(f"The daemon is already running (pid {running.pid}).", fg="blue")
+        return
+    args = [sys.executable, "-m", "commitai.cli", "daemon", "start", "--foreground"]
+    args += ["--idle-timeout", str(idle_timeout)]
+    for model in models:
+        args += ["--model", model]
+    subprocess.Popen(
+        args,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + DAEMON_START_TIMEOUT
+    while time.monotonic() < deadline:
+        running = daemon.status()
+        if running is not None:
+            click.secho(f"🟢 Daemon started (pid {running.pid}).", fg="green")
+            return
+        time.sleep(0.05)
+    raise click.ClickException(
+        "The daemon did not start; run 'commitai-daemon start --foreground' "
+        "to see why."
+    )
+
+
+@daemon_group.command(name="stop")
+def daemon_stop_command() -> None:
+    """Stops the daemon."""
+    from commitai import daemon
+
+    if daemon.stop():
+        click.secho("🛑 Daemon stopped.", fg="green")
+    else:
+        click.secho("No daemon is running.", fg="yellow")
+
+
+@daemon_group.command(name="status")
+def daemon_status_command() -> None:
+    """Shows whether the daemon is running and what it has loaded."""
+    from commitai import daemon
+
+    running = daemon.status()
+    if running is None:
+        click.secho("No daemon is running.", fg="yellow")
+        return
+    click.echo(f"Socket:   {daemon.socket_path()}")
+    click.echo(f"PID:      {running.pid}")
+    click.echo(f"Version:  {running.version}")
+    click.echo(f"Uptime:   {running.uptime:.0f}s")
+    click.echo(f"Requests: {running.requests}")
+    click.echo(f"Models:   {', '.join(running.models) or '-'}")
+
+
+@cli.group(name="ollama")
+def ollama_group() -> None:
+    """Manages local models served by Ollama."""
+
+
+@ollama_group.command(name="warm")
+@click.option(
+    "--model",
+    "-m",
+    required=True,
+    help=(
+        "Ollama model or model alias to load, e.g. 'llama3' or "
+        "'ollama/qwen2.5-coder'."
+    ),
+)
+@click.option(
+    "--keep-alive",
+    default=None,
+    help=(
+        "How long Ollama keeps the model loaded, e.g. '2h', or -1 for as long "
+        "as Ollama runs (default: the ollama_keep_alive setting, 30m)."
+    ),
+)
+def ollama_warm_command(model: str, keep_alive: Optional[str]) -> None:
+    """Loads a model into memory so the next commit does not wait for it.
+
+    The model is loaded with the context size its requests ask for: the
+    ollama_num_ctx setting, or 8192 tokens.
+    """
+    from commitai import local
+
+    name, base_url = ollama_model(model)
+    try:
+        seconds = local.warm_up(name, keep_alive, base_url)
+    except local.OllamaError as e:
+        raise click.ClickException(str(e)) from e
+    duration = local.keep_alive(keep_alive)
+    if isinstance(duration, int):
+        duration = "as long as Ollama runs" if duration < 0 else f"{duration}s"
+    click.secho(
+        f"🔥 {local.model_name(name)} is loaded (took {seconds:.1f}s) and "
+        f"stays loaded for {duration}.",
+        fg="green",
+    )
+
+
+@cli.group(name="hook")
+def hook_group() -> None:
+    """Generates messages from a plain 'git commit' through Git hooks."""
+
+
+def _hook_message(repo: RepoContext, model: str) -> str:
+    """Generates the message for the staged changes without any prompt.
+
+    Git has already run the pre-commit hook, and the editor is Git's, so only
+    the generation itself (and its cache) is shared with 'generate'.
+    """
+    config = _config()
+    staged = _prepare_context(repo)
+    llm = _initialize_llm(
+        model,
+        _parse_models(config.fallback_models),
+        config.timeout,
+        config.retries,
+        use_daemon=config.daemon,
+    )
+    settings = _GenerationSettings(
+        model=model,
+        explanation="",
+        template=get_commit_template(repo),
+        map_reduce_threshold=config.map_reduce_threshold,
+        workers=config.workers,
+        cache=MessageCache.for_repo(repo, config.cache_max_bytes),
+        context_window=config.context_window,
+        semantic_cache=_semantic_cache(
+            repo, config.semantic_cache, config.semantic_threshold
+        ),
+        semantic_mode=config.semantic_cache,
+        style_index=StyleIndex.for_repo(repo.git_dir),
+        style_examples=config.style_examples,
+    )
+    return _produce_message(llm, repo, staged, settings)
+
+
+def _hook_repo() -> RepoContext:
+    config = _config()
+    return RepoContext(
+        _diff_byte_budget(config.max_diff_bytes, config.max_diff_tokens),
+        filter_noise=config.filter_noise,
+        compact=config.compact,
+    )
+
+
+@hook_group.command(name="install")
+@click.option(
+    "--model",
+    "-m",
+    default=_Configured("model"),
+    help="Set the engine model used by the hooks.",
+)
+@click.option(
+    "--prewarm",
+    is_flag=True,
+    help=(
+        "Also start generating in the background whenever files are staged "
+        "(post-index-change hook, Git 2.22+)."
+    ),
+)
+@click.option(
+    "--force",
+    is_flag=True,
+    help="Replace existing hooks that were not installed by commitai.",
+)
+def hook_install_command(model: str, prewarm: bool, force: bool) -> None:
+    """Installs the prepare-commit-msg hook in this repository."""
+    directory = hooks.hooks_dir()
+    names = [hooks.PREPARE_COMMIT_MSG]
+    if prewarm:
+        names.append(hooks.POST_INDEX_CHANGE)
+    for name in names:
+        try:
+            path = hooks.install_hook(directory, name, ["--model", model], force)
+        except FileExistsError as e:
+            raise click.ClickException(
+                f"{e.filename} already exists; pass --force to replace it."
+            ) from e
+        click.secho(f"🪝 Installed {path}", fg="green")
+
+
+@hook_group.command(name="uninstall")
+def hook_uninstall_command() -> None:
+    """Removes the hooks installed by commitai from this repository."""
+    removed = hooks.uninstall_hooks(hooks.hooks_dir())
+    for path in removed:
+        click.secho(f"🧹 Removed {path}", fg="green")
+    if not removed:
+        click.secho("No commitai hooks are installed.", fg="yellow")
+
+
+@hook_group.command(name=hooks.PREPARE_COMMIT_MSG, hidden=True)
+@click.argument("message_file")
+@click.argument("source", required=False, default="")
+@click.argument("sha", required=False, default="")
+@click.option("--model", "-m", default=_Configured("model"))
+def hook_prepare_commit_msg_command(
+    message_file: str, source: str, sha: str, model: str
+) -> None:
+    """Runs as Git's prepare-commit-msg hook."""
+    # -m, -F, merges, squashes and amends already come with a message.
+    if source not in ("", "template"):
+        return
+    try:
+        repo = _hook_repo()
+        # A prewarm for this index is about to put the message in the cache.
+        hooks.wait_for_unlock(hooks.prewarm_lock_path(repo.git_dir))
+        message = _hook_message(repo, model)
+        hooks.insert_message(message_file, message)
+    except Exception as e:
+        # A failing hook would abort the commit; fall back to Git's editor.
+        click.secho(f"commitai: no message generated: {e}", fg="yellow", err=True)
+
+
+@hook_group.command(name="prewarm", hidden=True)
+@click.option("--model", "-m", default=_Configured("model"))
+def hook_prewarm_command(model: str) -> None:
+    """Generates and caches the message for the index, in the background."""
+    git_dir = RepoContext().git_dir
+    lock = hooks.prewarm_lock_path(git_dir)
+    # A running prewarm checks the index again before exiting.
+    if not hooks.try_lock(lock):
+        return
+    try:
+        time.sleep(hooks.PREWARM_DELAY)
+        while True:
+            try:
+                tree = get_staged_tree_hash()
+            except subprocess.CalledProcessError:
+                return  # Unmerged paths; nothing can be committed yet.
+            if tree == hooks.read_prewarmed_tree(git_dir):
+                return
+            try:
+                _hook_message(_hook_repo(), model)
+            except click.ClickException:
+                pass  # Nothing staged, or the model failed; try on next change.
+            hooks.write_prewarmed_tree(git_dir, tree)
+    finally:
+        hooks.unlock(lock)
+
+
 # --- Alias Commands ---
 
 
@@ -286,21 +1820,14 @@ def create_template_command(template_content: Tuple[str, ...]) -> None:
 @click.option(
     "--model",
     "-m",
-    default="gemini-2.5-pro-preview-03-25",
+    default=_Configured("model"),
     help="Set the engine model to be used.",
 )
+@_generation_options
 @click.pass_context
-def commitai_alias(
-    ctx: click.Context,
-    description: Tuple[str, ...],
-    add: bool,
-    commit: bool,
-    model: str,
-) -> None:
+def commitai_alias(ctx: click.Context, **kwargs: Any) -> None:
     """Alias for the 'generate' command."""
-    ctx.forward(
-        generate_message, description=description, add=add, commit=commit, model=model
-    )
+    ctx.forward(generate_message, **kwargs)
 
 
 @click.command(name="commitai-create-template")
@@ -313,8 +1840,50 @@ def commitai_create_template_alias(
     ctx.forward(create_template_command, template_content=template_content)
 
 
+@click.group(name="commitai-cache")
+def commitai_cache_alias() -> None:
+    """Alias for the 'cache' command group."""
+
+
+commitai_cache_alias.add_command(cache_stats_command)
+commitai_cache_alias.add_command(cache_clear_command)
+
+
+@click.group(name="commitai-daemon")
+def commitai_daemon_alias() -> None:
+    """Alias for the 'daemon' command group."""
+
+
+commitai_daemon_alias.add_command(daemon_start_command)
+commitai_daemon_alias.add_command(daemon_stop_command)
+commitai_daemon_alias.add_command(daemon_status_command)
+
+
+@click.group(name="commitai-ollama")
+def commitai_ollama_alias() -> None:
+    """Alias for the 'ollama' command group."""
+
+
+commitai_ollama_alias.add_command(ollama_warm_command)
+
+
+@click.group(name="commitai-hook")
+def commitai_hook_alias() -> None:
+    """Alias for the 'hook' command group."""
+
+
+commitai_hook_alias.add_command(hook_install_command)
+commitai_hook_alias.add_command(hook_uninstall_command)
+commitai_hook_alias.add_command(hook_prepare_commit_msg_command)
+commitai_hook_alias.add_command(hook_prewarm_command)
+
+
 cli.add_command(commitai_alias)
 cli.add_command(commitai_create_template_alias)
+cli.add_command(commitai_cache_alias)
+cli.add_command(commitai_daemon_alias)
+cli.add_command(commitai_ollama_alias)
+cli.add_command(commitai_hook_alias)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""Compaction of the staged diff before it is sent to the model.
+
+Refactors spend most of a prompt on text that says little: files moved or
+copied without changes, hunks that only reindent or rewrap lines, and the
+context lines around every change. The staged diff is read with rename and
+copy detection, then:
+
+* unchanged renames and copies between the same two directories are merged
+  into one summary line;
+* whitespace-only hunks are replaced by a one-line summary;
+* context lines are trimmed as the diff grows, splitting hunks whose changes
+  end up more than twice the context apart, as ``git diff -U<n>`` would.
+"""
+
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from commitai.diff import DiffFile, DiffHunk
+
+# Context lines kept around changes, by the size in bytes the diff stays
+# under. Larger diffs keep no context at all.
+CONTEXT_LINES: Tuple[Tuple[int, int], ...] = ((16_000, 3), (48_000, 2), (128_000, 1))
+# Moved files named in a summary line before the rest are only counted.
+MAX_LISTED_MOVES = 5
+
+_MOVES = ("renamed", "copied")
+
+
+class Compaction(NamedTuple):
+    original_bytes: int
+    compacted_bytes: int
+    # Unchanged renames and copies merged into summary lines.
+    moves: int
+    whitespace_hunks: int
+    # The context lines kept around changes, or None if left as git wrote it.
+    context_lines: Optional[int]
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.original_bytes - self.compacted_bytes
+
+    @property
+    def ratio(self) -> float:
+        """The compacted size as a fraction of the original size."""
+        return self.compacted_bytes / self.original_bytes if self.original_bytes else 1
+
+
+def context_lines_for(size: int) -> Optional[int]:
+    """Returns how many context lines to keep in a diff of ``size`` bytes.
+
+    Returns None when the diff is small enough to keep git's default context.
+    """
+    for limit, lines in CONTEXT_LINES:
+        if size < limit:
+            return None if lines == CONTEXT_LINES[0][1] else lines
+    return 0
+
+
+def _is_unchanged_move(diff_file: DiffFile) -> bool:
+    return (
+        diff_file.status in _MOVES
+        and not diff_file.hunks
+        and diff_file.old_mode == diff_file.new_mode
+    )
+
+
+def _move_summary(moves: Sequence[DiffFile]) -> DiffFile:
+    """Merges unchanged moves between the same directories into one file."""
+    first = moves[0]
+    status = first.status
+    if len(moves) == 1:
+        line = f"[commitai] {status} {first.old_path} -> {first.path} (unchanged)\n"
+    else:
+        source = os.path.dirname(first.old_path) or "."
+        target = os.path.dirname(first.path) or "."
+        names = []
+        for move in moves[:MAX_LISTED_MOVES]:
+            old_name = os.path.basename(move.old_path)
+            name = os.path.basename(move.path)
+            names.append(name if old_name == name else f"{old_name} -> {name}")
+        listed = ", ".join(names)
+        if len(moves) > MAX_LISTED_MOVES:
+            listed += f" and {len(moves) - MAX_LISTED_MOVES} more"
+        line = (
+            f"[commitai] {status} {len(moves)} unchanged files from {source}/ "
+            f"to {target}/: {listed}\n"
+        )
+    summary = DiffFile(first.path, line)
+    summary.old_path = first.old_path
+    summary.status = status
+    return summary
+
+
+def collapse_moves(files: Sequence[DiffFile]) -> Tuple[List[DiffFile], int]:
+    """Merges unchanged renames and copies into summary lines.
+
+    Moves between the same two directories share one line, placed where the
+    first of them was. Returns the files and how many moves were merged.
+    """
+    groups: Dict[Tuple[str, str, str], List[DiffFile]] = {}
+    for diff_file in files:
+        if _is_unchanged_move(diff_file):
+            key = (
+                diff_file.status,
+                os.path.dirname(diff_file.old_path),
+                os.path.dirname(diff_file.path),
+            )
+            groups.setdefault(key, []).append(diff_file)
+
+    first_moves = {id(moves[0]): moves for moves in groups.values()}
+    collapsed = []
+    for diff_file in files:
+        if id(diff_file) in first_moves:
+            collapsed.append(_move_summary(first_moves[id(diff_file)]))
+        elif not _is_unchanged_move(diff_file):
+            collapsed.append(diff_file)
+    return collapsed, sum(len(moves) for moves in groups.values())
+
+
+def is_whitespace_only(hunk: DiffHunk) -> bool:
+    """Tells whether ``hunk`` only changes whitespace, line breaks included."""
+    removed: List[str] = []
+    added: List[str] = []
+    for line in hunk.text.split("\n")[1:]:
+        if line.startswith("-"):
+            removed.append("".join(line[1:].split()))
+        elif line.startswith("+"):
+            added.append("".join(line[1:].split()))
+    return bool(removed or added) and "".join(removed) == "".join(added)
+
+
+def _whitespace_summary(hunk: DiffHunk) -> DiffHunk:
+    return DiffHunk(
+        f"{hunk.header}\n[commitai] whitespace-only change "
+        f"(+{hunk.added} -{hunk.removed} lines)\n"
+    )
+
+
+def _hunk_range(start: int, count: int) -> str:
+    if count == 0:
+        # An empty range names the line before it, as git does.
+        return f"{start - 1},0"
+    return str(start) if count == 1 else f"{start},{count}"
+
+
+def trim_context(hunk: DiffHunk, context: int) -> List[DiffHunk]:
+    """Keeps at most ``context`` lines around the changes of ``hunk``.
+
+    Changes separated by more than twice ``context`` unchanged lines end up in
+    separate hunks, with their line ranges recomputed.
+    """
+    header, _, body = hunk.text.partition("\n")
+    lines = body.splitlines(keepends=True)
+    changes = [index for index, line in enumerate(lines) if line[:1] in ("+", "-")]
+    if not changes or not any(line[:1] == " " for line in lines):
+        return [hunk]
+
+    keep = [False] * len(lines)
+    for index in changes:
+        for near in range(
+            max(0, index - context), min(len(lines), index + context + 1)
+        ):
+            keep[near] = True
+    for index, line in enumerate(lines):
+        # "\ No newline at end of file" belongs to the line before it.
+        if line.startswith("\\") and index:
+            keep[index] = keep[index - 1]
+    if all(keep):
+        return [hunk]
+
+    # The text after the second "@@", usually the enclosing function.
+    section = header[header.find("@@", 2) + 2 :]
+    trimmed: List[DiffHunk] = []
+    old_line, new_line = hunk.old_start, hunk.new_start
+    start = None
+    run: List[str] = []
+    old_count = new_count = 0
+    for line, kept in zip(lines + [""], keep + [False]):
+        if kept:
+            if start is None:
+                start, run, old_count, new_count = (old_line, new_line), [], 0, 0
+            run.append(line)
+        elif start is not None:
+            ranges = (
+                f"-{_hunk_range(start[0], old_count)} "
+                f"+{_hunk_range(start[1], new_count)}"
+            )
+            text = f"@@ {ranges} @@{section if not trimmed else ''}\n"
+            trimmed.append(DiffHunk(text + "".join(run)))
+            start = None
+        tag = line[:1]
+        if tag in (" ", "-"):
+            old_line += 1
+            old_count += kept
+        if tag in (" ", "+"):
+            new_line += 1
+            new_count += kept
+    return trimmed
+
+
+def compact_files(files: Sequence[DiffFile]) -> Tuple[List[DiffFile], Compaction]:
+    """Compacts a parsed diff and reports how much smaller it became."""
+    original_bytes = sum(diff_file.size for diff_file in files)
+    compacted, moves = collapse_moves(files)
+
+    whitespace_hunks = 0
+    for index, diff_file in enumerate(compacted):
+        if diff_file.hunks and any(map(is_whitespace_only, diff_file.hunks)):
+            hunks = []
+            for hunk in diff_file.hunks:
+                if is_whitespace_only(hunk):
+                    whitespace_hunks += 1
+                    hunk = _whitespace_summary(hunk)
+                hunks.append(hunk)
+            compacted[index] = diff_file.with_hunks(hunks)
+
+    context = context_lines_for(sum(diff_file.size for diff_file in compacted))
+    if context is not None:
+        compacted = [
+            diff_file.with_hunks(
+                [
+                    trimmed
+                    for hunk in diff_file.hunks
+                    for trimmed in (
+                        [hunk]
+                        if hunk.added + hunk.removed == 0
+                        else trim_context(hunk, context)
+                    )
+                ]
+            )
+            if diff_file.hunks
+            else diff_file
+            for diff_file in compacted
+        ]
+
+    compacted_bytes = sum(diff_file.size for diff_file in compacted)
+    return compacted, Compaction(
+        original_bytes, compacted_bytes, moves, whitespace_hunks, context
+    )
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""User configuration, layered from TOML files and the environment.
+
+Settings are resolved once per process into an immutable :class:`Config`,
+from the lowest precedence to the highest:
+
+1. the built-in defaults;
+2. the global file: ``$COMMITAI_CONFIG`` when set, and otherwise
+   ``config.toml`` in ``$XDG_CONFIG_HOME/commitai`` (``~/.config/commitai``);
+3. ``.commitai.toml`` in the repository, found by walking up from the working
+   directory to the top of the repository;
+4. ``COMMITAI_<SETTING>`` environment variables, e.g. ``COMMITAI_WORKERS=8``;
+5. command line options, applied by the CLI.
+
+A missing file is an empty layer. Parsed and validated files are kept in a
+compiled cache under ``$XDG_CACHE_HOME/commitai`` keyed by their modification
+time and size, so TOML is only parsed again after a file changed.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import typing
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+import click
+
+from commitai.cache import DEFAULT_CACHE_MAX_BYTES, SEMANTIC_CACHE_MODES
+from commitai.git import DEFAULT_DIFF_BYTE_BUDGET
+from commitai.history import DEFAULT_CONCURRENCY
+from commitai.llm import DEFAULT_RETRIES
+from commitai.local import DEFAULT_KEEP_ALIVE
+from commitai.providers import DEFAULT_MODEL
+from commitai.style import DEFAULT_STYLE_EXAMPLES
+from commitai.summarize import DEFAULT_MAP_REDUCE_THRESHOLD, DEFAULT_WORKERS
+
+CONFIG_ENV = "COMMITAI_CONFIG"
+CONFIG_FILE_NAME = "config.toml"
+REPO_CONFIG_FILE_NAME = ".commitai.toml"
+ENV_PREFIX = "COMMITAI_"
+# Environment variables read before COMMITAI_<SETTING> existed.
+LEGACY_ENV = {"template": "TEMPLATE_COMMIT"}
+
+# Compiled files kept in the cache, across all repositories.
+_MAX_COMPILED_FILES = 64
+_COMPILED_VERSION = 1
+_TRUE = ("1", "true", "yes", "on")
+_FALSE = ("0", "false", "no", "off")
+_KIND_NAMES = {str: "a string", int: "an integer", float: "a number", bool: "a boolean"}
+# Settings that only take one of a few values.
+_CHOICES: Dict[str, Tuple[str, ...]] = {"semantic_cache": SEMANTIC_CACHE_MODES}
+
+
+class ConfigError(click.ClickException):
+    """The configuration file cannot be read or is invalid."""
+
+
+class Config(NamedTuple):
+    model: str = DEFAULT_MODEL
+    # Comma-separated, as given to --fallback-models.
+    fallback_models: Optional[str] = None
+    template: Optional[str] = None
+    timeout: Optional[float] = None
+    retries: int = DEFAULT_RETRIES
+    max_diff_bytes: int = DEFAULT_DIFF_BYTE_BUDGET
+    max_diff_tokens: Optional[int] = None
+    context_window: Optional[int] = None
+    map_reduce_threshold: int = DEFAULT_MAP_REDUCE_THRESHOLD
+    workers: int = DEFAULT_WORKERS
+    # Commits processed concurrently by `commitai-history`.
+    concurrency: int = DEFAULT_CONCURRENCY
+    cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES
+    style_examples: int = DEFAULT_STYLE_EXAMPLES
+    semantic_cache: str = "off"
+    semantic_threshold: Optional[float] = None
+    stream: bool = False
+    compact: bool = True
+    filter_noise: bool = True
+    daemon: bool = True
+    # Sent to Ollama with every request; see commitai.local.
+    ollama_keep_alive: str = DEFAULT_KEEP_ALIVE
+    # Replace the context and answer sizes derived from each prompt.
+    ollama_num_ctx: Optional[int] = None
+    ollama_num_predict: Optional[int] = None
+    # The [models] table of the global file; see commitai.providers.
+    models: Mapping[str, Any] = MappingProxyType({})
+
+
+def _setting_types() -> Dict[str, type]:
+    types = {}
+    for name, hint in typing.get_type_hints(Config).items():
+        if name != "models":
+            args = [arg for arg in typing.get_args(hint) if arg is not type(None)]
+            types[name] = args[0] if args else hint
+    return types
+
+
+SETTINGS: Dict[str, type] = _setting_types()
+
+
+def config_path() -> str:
+    path = os.getenv(CONFIG_ENV)
+    if path:
+        return os.path.expanduser(path)
+    config_home = os.getenv("XDG_CONFIG_HOME") or os.path.join(
+        os.path.expanduser("~"), ".config"
+    )
+    return os.path.join(config_home, "commitai", CONFIG_FILE_NAME)
+
+
+def repo_config_path(start: Optional[str] = None) -> Optional[str]:
+    """Returns the ``.commitai.toml`` of the repository containing ``start``.
+
+    Directories are searched from ``start`` (the working directory) up to the
+    top of the repository; None is returned if none of them has the file.
+    """
+    directory = os.path.abspath(start or os.getcwd())
+    while True:
+        path = os.path.join(directory, REPO_CONFIG_FILE_NAME)
+        if os.path.isfile(path):
+            return path
+        git = os.path.join(directory, ".git")
+        parent = os.path.dirname(directory)
+        if os.path.isdir(git) or os.path.isfile(git) or parent == directory:
+            return None
+        directory = parent
+
+
+def compiled_cache_path() -> str:
+    cache_home = os.getenv("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "commitai", "config.json")
+
+
+def load_config(path: Optional[str] = None) -> Dict[str, Any]:
+    """Parses the configuration file at ``path``, or an empty one if missing."""
+    path = path or config_path()
+    if not os.path.isfile(path):
+        return {}
+    # Imported here: tomllib is only needed when there is a file to parse.
+    if sys.version_info >= (3, 11):
+        import tomllib
+    else:
+        import tomli as tomllib
+
+    try:
+        with open(path, "rb") as f:
+            config: Dict[str, Any] = tomllib.load(f)
+            return config
+    except OSError as e:
+        raise ConfigError(f"Could not read {path}: {e}") from e
+    except (tomllib.TOMLDecodeError, UnicodeDecodeError) as e:
+        raise ConfigError(f"Invalid configuration in {path}: {e}") from e
+
+
+def _checked_choice(name: str, value: Any, source: str) -> Any:
+    choices = _CHOICES.get(name)
+    if choices is not None and value not in choices:
+        raise ConfigError(
+            f"{source}: {name} must be one of {', '.join(choices)}, not {value!r}"
+        )
+    return value
+
+
+def _file_value(name: str, value: Any, source: str) -> Any:
+    kind = SETTINGS[name]
+    if name == "fallback_models" and isinstance(value, list):
+        if all(isinstance(model, str) for model in value):
+            return ",".join(value)
+    elif kind is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    elif isinstance(value, kind) and (kind is bool or not isinstance(value, bool)):
+        return _checked_choice(name, value, source)
+    raise ConfigError(f"{source}: {name} must be {_KIND_NAMES[kind]}, not {value!r}")
+
+
+def compile_layer(path: str, allow_models: bool) -> Dict[str, Any]:
+    """Parses and validates the file at ``path`` into a configuration layer.
+
+    The ``[models]`` table is only read when ``allow_models`` is set: an alias
+    decides where API keys are sent, so a cloned repository may not define
+    one.
+    """
+    data = load_config(path)
+    layer: Dict[str, Any] = {}
+    for name, value in data.items():
+        if name == "models" and allow_models:
+            if not isinstance(value, dict):
+                raise ConfigError(f"{path}: [models] must be a table")
+            layer[name] = value
+        elif name == "models":
+            raise ConfigError(
+                f"{path}: [models] is only read from the global configuration "
+                f"file, {config_path()}"
+            )
+        elif name in SETTINGS:
+            layer[name] = _file_value(name, value, path)
+        else:
+            raise ConfigError(f"{path}: unknown setting {name!r}")
+    return layer
+
+
+def _stamp(path: str) -> Optional[List[int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _read_compiled(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r") as f:
+            compiled = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(compiled, dict) or compiled.get("version") != _COMPILED_VERSION:
+        return {}
+    files = compiled.get("files")
+    return files if isinstance(files, dict) else {}
+
+
+def _write_compiled(path: str, files: Dict[str, Any]) -> None:
+    """Replaces the compiled cache atomically; failing to write it is ignored."""
+    # The most recently compiled files are kept, in insertion order.
+    kept = dict(list(files.items())[-_MAX_COMPILED_FILES:])
+    try:
+        data = json.dumps({"version": _COMPILED_VERSION, "files": kept})
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    except (OSError, TypeError, ValueError):
+        # Dates in the [models] table cannot be written as JSON; such files
+        # are simply parsed every time.
+        pass
+
+
+def _file_layers(paths: List[str], models_path: str) -> List[Dict[str, Any]]:
+    """Returns the layers of the existing files in ``paths``, compiled once.
+
+    A layer is taken from the compiled cache while its file keeps the same
+    modification time and size.
+    """
+    stamps = [(path, _stamp(path)) for path in paths]
+    stamps = [(path, stamp) for path, stamp in stamps if stamp is not None]
+    if not stamps:
+        return []
+
+    cache_path = compiled_cache_path()
+    compiled = _read_compiled(cache_path)
+    layers = []
+    changed = False
+    for path, stamp in stamps:
+        entry = compiled.get(path)
+        if isinstance(entry, dict) and entry.get("stamp") == stamp:
+            layer = entry.get("layer")
+            if isinstance(layer, dict):
+                layers.append(layer)
+                continue
+        layer = compile_layer(path, allow_models=path == models_path)
+        compiled.pop(path, None)
+        compiled[path] = {"stamp": stamp, "layer": layer}
+        layers.append(layer)
+        changed = True
+    if changed:
+        _write_compiled(cache_path, compiled)
+    return layers
+
+
+def _env_value(name: str, var: str, text: str) -> Any:
+    kind = SETTINGS[name]
+    if kind is str:
+        return _checked_choice(name, text, f"${var}")
+    if kind is bool:
+        if text.lower() in _TRUE:
+            return True
+        if text.lower() in _FALSE:
+            return False
+    else:
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    raise ConfigError(f"${var} must be {_KIND_NAMES[kind]}, not {text!r}")
+
+
+def env_layer() -> Dict[str, Any]:
+    """Returns the settings set by ``COMMITAI_<SETTING>`` environment variables."""
+    layer = {}
+    for name in SETTINGS:
+        for var in (ENV_PREFIX + name.upper(), LEGACY_ENV.get(name)):
+            text = os.getenv(var) if var else None
+            if text:
+                layer[name] = _env_value(name, var, text)
+                break
+    return layer
+
+
+def resolve_config(cwd: Optional[str] = None) -> Config:
+    """Merges the configuration layers for a process started in ``cwd``."""
+    global_path = config_path()
+    paths = [global_path]
+    repo_path = repo_config_path(cwd)
+    if repo_path is not None and repo_path != global_path:
+        paths.append(repo_path)
+
+    settings: Dict[str, Any] = {}
+    for layer in _file_layers(paths, global_path) + [env_layer()]:
+        settings.update(layer)
+    if "models" in settings:
+        settings["models"] = MappingProxyType(settings["models"])
+    return Config(**settings)
+
+
+_CONFIG: Optional[Config] = None
+_CONFIG_LOCK = threading.Lock()
+
+
+def current_config() -> Config:
+    """Returns the configuration of this process, resolved on first use."""
+    global _CONFIG
+    with _CONFIG_LOCK:
+        if _CONFIG is None:
+            _CONFIG = resolve_config()
+        return _CONFIG
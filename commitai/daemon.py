@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""Local daemon that keeps chat model clients warm between runs.
+
+``commitai-daemon start`` serves model requests on a Unix domain socket. Every
+run first tries to connect to it: the run still reads the diff, runs the hook
+and builds the prompt itself, but the model call is forwarded to the daemon,
+which has already imported the provider's LangChain backend and keeps its
+connection pool open. When no daemon answers, the run creates its clients
+in-process as before.
+
+The protocol is one JSON object per line. The client sends a single request
+and the daemon answers with zero or more ``token`` lines followed by one
+``message`` or ``error`` line. The ``message`` line carries the token usage
+reported by the provider, prompt cache hits included.
+"""
+
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from commitai import __version__
+from commitai.llm import ChatModel, UsageMeter, invoke_text, stream_text
+
+SOCKET_ENV = "COMMITAI_SOCKET"
+SOCKET_NAME = "commitai.sock"
+# Seconds without requests after which the daemon exits; 0 never exits.
+DEFAULT_IDLE_TIMEOUT = 3600.0
+# Connecting to a live daemon takes well under a millisecond, so a short
+# timeout keeps runs fast when a stale socket is left behind.
+CONNECT_TIMEOUT = 0.5
+_POLL_INTERVAL = 0.5
+
+# Unix domain sockets are unavailable on Windows, where runs stay in-process.
+SUPPORTED = hasattr(socket, "AF_UNIX")
+_UnixServer: Any = (
+    socketserver.UnixStreamServer if SUPPORTED else socketserver.TCPServer
+)
+
+# Receives the model, fallback models, request timeout and retry count.
+ModelFactory = Callable[[str, List[str], Optional[float], int], ChatModel]
+
+
+class DaemonError(Exception):
+    """The daemon failed to answer a request."""
+
+
+class DaemonStatus(NamedTuple):
+    pid: int
+    version: str
+    uptime: float
+    requests: int
+    models: List[str]
+
+
+class _Reply(NamedTuple):
+    # Quacks like a LangChain message, which is all ``response_text`` and
+    # ``token_usage`` need.
+    content: str
+    usage_metadata: Optional[Dict[str, Any]] = None
+
+
+def socket_path() -> str:
+    """Returns the daemon's socket path.
+
+    ``$COMMITAI_SOCKET`` takes precedence, then ``$XDG_RUNTIME_DIR``, then a
+    private directory in the user's home.
+    """
+    configured = os.getenv(SOCKET_ENV)
+    if configured:
+        return configured
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, SOCKET_NAME)
+    return os.path.join(os.path.expanduser("~"), ".commitai", SOCKET_NAME)
+
+
+def _exchange(
+    path: str, request: Dict[str, Any], timeout: Optional[float] = None
+) -> Iterator[Dict[str, Any]]:
+    """Sends ``request`` to the daemon at ``path`` and yields its replies."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(CONNECT_TIMEOUT)
+        sock.connect(path)
+        # Generation takes as long as the provider needs; the provider
+        # timeout is enforced by the daemon.
+        sock.settimeout(timeout)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile("rb") as replies:
+            for line in replies:
+                reply = json.loads(line)
+                if "error" in reply:
+                    raise DaemonError(reply["error"])
+                yield reply
+
+
+def status(path: Optional[str] = None) -> Optional[DaemonStatus]:
+    """Returns the status of the running daemon, or None if there is none."""
+    if not SUPPORTED:
+        return None
+    try:
+        reply = next(_exchange(path or socket_path(), {"op": "ping"}, CONNECT_TIMEOUT))
+    except (OSError, ValueError, StopIteration, DaemonError):
+        return None
+    return DaemonStatus(
+        reply["pid"],
+        reply["version"],
+        reply["uptime"],
+        reply["requests"],
+        reply["models"],
+    )
+
+
+def stop(path: Optional[str] = None) -> bool:
+    """Asks the running daemon to exit; returns False if there is none."""
+    if not SUPPORTED:
+        return False
+    try:
+        list(_exchange(path or socket_path(), {"op": "stop"}, CONNECT_TIMEOUT))
+    except (OSError, ValueError, DaemonError):
+        return False
+    return True
+
+
+class DaemonChatModel:
+    """A chat model whose requests are served by the daemon."""
+
+    def __init__(
+        self,
+        path: str,
+        model: str,
+        fallbacks: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+        retries: int = 0,
+    ) -> None:
+        self.path = path
+        self.model = model
+        self.fallbacks = fallbacks or []
+        self.timeout = timeout
+        self.retries = retries
+
+    def _generate(self, prompt: Any, stream: bool) -> Iterator[Dict[str, Any]]:
+        request = {
+            "op": "generate",
+            "model": self.model,
+            "fallbacks": self.fallbacks,
+            "timeout": self.timeout,
+            "retries": self.retries,
+            "prompt": prompt,
+            "stream": stream,
+        }
+        try:
+            yield from _exchange(self.path, request)
+        except OSError as e:
+            raise DaemonError(f"Lost the connection to the daemon: {e}") from e
+
+    def invoke(self, input: Any, **kwargs: Any) -> Any:
+        for reply in self._generate(input, stream=False):
+            if "message" in reply:
+                return _Reply(reply["message"], reply.get("usage"))
+        raise DaemonError("The daemon closed the connection without answering.")
+
+    def stream(self, input: Any, **kwargs: Any) -> Iterator[Any]:
+        for reply in self._generate(input, stream=True):
+            if "message" in reply:
+                if reply.get("usage"):
+                    yield _Reply("", reply["usage"])
+                return
+            yield _Reply(reply["token"])
+        raise DaemonError("The daemon closed the connection without answering.")
+
+
+def connect(
+    model: str,
+    fallbacks: Optional[List[str]] = None,
+    timeout: Optional[float] = None,
+    retries: int = 0,
+    path: Optional[str] = None,
+) -> Optional[DaemonChatModel]:
+    """Returns a model served by the running daemon, if one is compatible.
+
+    A daemon started by another version of commitai is ignored, so that an
+    upgrade never talks to a stale process.
+    """
+    path = path or socket_path()
+    running = status(path)
+    if running is None or running.version != __version__:
+        return None
+    return DaemonChatModel(path, model, fallbacks, timeout, retries)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    server: "DaemonServer"
+
+    def _send(self, reply: Dict[str, Any]) -> None:
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        try:
+            request = json.loads(self.rfile.readline())
+            op = request["op"]
+        except (ValueError, KeyError, TypeError):
+            self._send({"error": "Malformed request."})
+            return
+        if op == "ping":
+            self._send(self.server.describe())
+        elif op == "stop":
+            self.server.stopping.set()
+            self._send({"stopped": True})
+        elif op == "generate":
+            self._generate(request)
+        else:
+            self._send({"error": f"Unknown request: {op}"})
+
+    def _generate(self, request: Dict[str, Any]) -> None:
+        self.server.count_request()
+        meter = UsageMeter()
+        try:
+            llm = self.server.model_for(
+                request["model"],
+                request.get("fallbacks") or [],
+                request.get("timeout"),
+                request.get("retries", 0),
+            )
+            if request.get("stream"):
+                message = stream_text(
+                    llm,
+                    request["prompt"],
+                    lambda token: self._send({"token": token}),
+                    meter,
+                )
+            else:
+                message = invoke_text(llm, request["prompt"], meter)
+        except Exception as e:
+            self._send({"error": str(e) or type(e).__name__})
+            return
+        reply: Dict[str, Any] = {"message": message}
+        if any(meter.total):
+            reply["usage"] = meter.total.as_metadata()
+        self._send(reply)
+
+
+class DaemonServer(socketserver.ThreadingMixIn, _UnixServer):
+    """Serves model requests, one thread per connection.
+
+    Models are created once per combination of model, fallbacks, timeout and
+    retries and then shared by every request.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        path: str,
+        create_model: ModelFactory,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+    ) -> None:
+        self.path = path
+        self.create_model = create_model
+        self.idle_timeout = idle_timeout
+        self.stopping = threading.Event()
+        self.started = time.monotonic()
+        self.requests = 0
+        self._active = 0
+        self._last_activity = self.started
+        self._lock = threading.Lock()
+        self._models: Dict[Tuple[str, Tuple[str, ...], Optional[float], int], ChatModel]
+        self._models = {}
+        _prepare_socket_path(path)
+        super().__init__(path, _Handler)
+        os.chmod(path, 0o600)
+
+    def model_for(
+        self, model: str, fallbacks: List[str], timeout: Optional[float], retries: int
+    ) -> ChatModel:
+        key = (model, tuple(fallbacks), timeout, retries)
+        with self._lock:
+            llm = self._models.get(key)
+        if llm is None:
+            llm = self.create_model(model, fallbacks, timeout, retries)
+            with self._lock:
+                llm = self._models.setdefault(key, llm)
+        return llm
+
+    def count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            models = sorted({key[0] for key in self._models})
+        return {
+            "pid": os.getpid(),
+            "version": __version__,
+            "uptime": time.monotonic() - self.started,
+            "requests": self.requests,
+            "models": models,
+        }
+
+    def process_request(self, request: Any, client_address: Any) -> None:
+        with self._lock:
+            self._active += 1
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request: Any) -> None:
+        # Called once a handler thread is done with its connection.
+        super().shutdown_request(request)
+        with self._lock:
+            self._active -= 1
+            self._last_activity = time.monotonic()
+
+    def _idle(self) -> bool:
+        if not self.idle_timeout:
+            return False
+        with self._lock:
+            idle_for = time.monotonic() - self._last_activity
+            return self._active == 0 and idle_for > self.idle_timeout
+
+    def serve(self) -> None:
+        """Serves until stopped or idle for ``idle_timeout`` seconds."""
+        self.timeout = _POLL_INTERVAL
+        try:
+            while not self.stopping.is_set() and not self._idle():
+                self.handle_request()
+        finally:
+            self.server_close()
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def _prepare_socket_path(path: str) -> None:
+    """Creates the socket's directory and removes a stale socket.
+
+    Raises :class:`DaemonError` if another daemon is already listening.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not os.path.exists(path):
+        return
+    running = status(path)
+    if running is not None:
+        raise DaemonError(f"A daemon is already running (pid {running.pid}).")
+    os.unlink(path)
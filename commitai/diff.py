@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""Parsed representation of unified diffs and prompt-sized chunking.
+
+A diff is parsed in a single pass into :class:`DiffFile` objects, each
+holding its header lines, rename/mode/binary metadata and a list of
+:class:`DiffHunk` objects. Both classes use ``__slots__`` and keep every hunk
+as a single string, so a parsed diff costs little more memory than its text.
+"""
+
+import re
+from typing import Iterable, List, Optional, Sequence
+
+_FILE_HEADER = "diff --git "
+_HUNK_RANGES = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+_HUNK_HEADER = "@@"
+
+
+def _diff_path(header_line: str) -> str:
+    header = header_line[len(_FILE_HEADER) :].rstrip("\n")
+    _, sep, new_path = header.rpartition(" b/")
+    return new_path if sep else header
+
+
+class DiffHunk:
+    """One ``@@`` hunk: its line ranges and its text, header line included."""
+
+    __slots__ = (
+        "old_start",
+        "old_count",
+        "new_start",
+        "new_count",
+        "text",
+        "added",
+        "removed",
+    )
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        match = _HUNK_RANGES.match(text)
+        if match:
+            old_start, old_count, new_start, new_count = match.groups()
+            self.old_start = int(old_start)
+            self.old_count = 1 if old_count is None else int(old_count)
+            self.new_start = int(new_start)
+            self.new_count = 1 if new_count is None else int(new_count)
+        else:
+            self.old_start = self.old_count = self.new_start = self.new_count = 0
+        # Every changed line follows a newline, since the text starts with
+        # the hunk header.
+        self.added = text.count("\n+")
+        self.removed = text.count("\n-")
+
+    @property
+    def header(self) -> str:
+        return self.text.split("\n", 1)[0]
+
+    def __repr__(self) -> str:
+        return (
+            f"DiffHunk(-{self.old_start},{self.old_count} "
+            f"+{self.new_start},{self.new_count})"
+        )
+
+
+class DiffFile:
+    """The changes to one file.
+
+    ``status`` is one of ``added``, ``deleted``, ``renamed``, ``copied`` or
+    ``modified``. Text outside of a ``diff --git`` block (such as a context
+    header) is kept as a file with an empty ``path``.
+    """
+
+    __slots__ = (
+        "path",
+        "old_path",
+        "header",
+        "hunks",
+        "status",
+        "old_mode",
+        "new_mode",
+        "similarity",
+        "binary",
+    )
+
+    def __init__(self, path: str, header: str = "") -> None:
+        self.path = path
+        self.old_path = path
+        self.header = header
+        self.hunks: List[DiffHunk] = []
+        self.status = "modified"
+        self.old_mode: Optional[str] = None
+        self.new_mode: Optional[str] = None
+        self.similarity: Optional[int] = None
+        self.binary = False
+
+    @property
+    def text(self) -> str:
+        return self.header + "".join(hunk.text for hunk in self.hunks)
+
+    @property
+    def size(self) -> int:
+        return len(self.header) + sum(len(hunk.text) for hunk in self.hunks)
+
+    @property
+    def added(self) -> int:
+        return sum(hunk.added for hunk in self.hunks)
+
+    @property
+    def removed(self) -> int:
+        return sum(hunk.removed for hunk in self.hunks)
+
+    def with_hunks(self, hunks: List[DiffHunk]) -> "DiffFile":
+        """Returns a copy of this file holding only ``hunks``."""
+        copy = DiffFile(self.path, self.header)
+        for name in self.__slots__:
+            setattr(copy, name, getattr(self, name))
+        copy.hunks = hunks
+        return copy
+
+    def _read_header_line(self, line: str) -> None:
+        key, _, value = line.rstrip("\n").partition(" ")
+        if line.startswith("new file mode "):
+            self.status, self.new_mode = "added", line.split()[-1]
+        elif line.startswith("deleted file mode "):
+            self.status, self.old_mode = "deleted", line.split()[-1]
+        elif key == "old" and value.startswith("mode "):
+            self.old_mode = value[5:]
+        elif key == "new" and value.startswith("mode "):
+            self.new_mode = value[5:]
+        elif line.startswith(("rename from ", "copy from ")):
+            self.status = "renamed" if key == "rename" else "copied"
+            self.old_path = value.partition(" ")[2]
+        elif line.startswith(("rename to ", "copy to ")):
+            self.path = value.partition(" ")[2]
+        elif key in ("similarity", "dissimilarity") and value.startswith("index "):
+            self.similarity = int(value[6:].rstrip("%"))
+        elif line.startswith(("Binary files ", "GIT binary patch")):
+            self.binary = True
+
+    def __repr__(self) -> str:
+        return f"DiffFile({self.path!r}, {self.status}, hunks={len(self.hunks)})"
+
+
+def _split_before(text: str, marker: str) -> List[str]:
+    """Splits ``text`` before every line that starts with ``marker``.
+
+    The first piece holds the text before the first such line, and is empty
+    when ``text`` starts with ``marker``.
+    """
+    pieces = []
+    start = 0
+    needle = "\n" + marker
+    index = text.find(needle)
+    while index != -1:
+        pieces.append(text[start : index + 1])
+        start = index + 1
+        index = text.find(needle, start)
+    pieces.append(text[start:])
+    if text.startswith(marker):
+        pieces.insert(0, "")
+    return pieces
+
+
+def _parse_file(block: str) -> DiffFile:
+    header, *hunks = _split_before(block, _HUNK_HEADER)
+    if not block.startswith(_FILE_HEADER):
+        # Text before the first file, kept as a pathless preamble.
+        return DiffFile("", block)
+    diff_file = DiffFile(_diff_path(header.split("\n", 1)[0]), header)
+    for line in header.splitlines()[1:]:
+        diff_file._read_header_line(line)
+    diff_file.hunks = [DiffHunk(hunk) for hunk in hunks]
+    return diff_file
+
+
+def parse_diff(diff: str) -> List[DiffFile]:
+    """Parses a unified diff into files and hunks in a single pass.
+
+    Files and hunks are located with substring searches rather than line by
+    line, so parsing costs about as much as copying the text once.
+    """
+    return [_parse_file(block) for block in _split_before(diff, _FILE_HEADER) if block]
+
+
+def render_diff(files: Iterable[DiffFile]) -> str:
+    return "".join(diff_file.text for diff_file in files)
+
+
+def _split_lines(text: str, max_bytes: int) -> List[str]:
+    pieces: List[str] = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > max_bytes:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:max_bytes])
+            line = line[max_bytes:]
+        if current and len(current) + len(line) > max_bytes:
+            pieces.append(current)
+            current = ""
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _split_file(diff_file: DiffFile, max_bytes: int) -> List[str]:
+    header = diff_file.header
+    room = max(max_bytes - len(header), 1)
+    pieces: List[str] = []
+    current = ""
+    for hunk in diff_file.hunks:
+        text = hunk.text
+        for part in _split_lines(text, room) if len(text) > room else [text]:
+            if current and len(current) + len(part) > room:
+                pieces.append(header + current)
+                current = ""
+            current += part
+    if current or not pieces:
+        pieces.append(header + current)
+    return pieces
+
+
+def chunk_files(files: Sequence[DiffFile], max_bytes: int) -> List[str]:
+    """Packs parsed files into chunks of at most ``max_bytes`` characters.
+
+    Whole files are grouped together while they fit. A file larger than a
+    chunk is split at hunk boundaries, repeating its header in every piece,
+    and a single oversized hunk is split by lines as a last resort.
+    """
+    chunks: List[str] = []
+    current = ""
+    for diff_file in files:
+        pieces = (
+            _split_file(diff_file, max_bytes)
+            if diff_file.size > max_bytes
+            else [diff_file.text]
+        )
+        for piece in pieces:
+            if current and len(current) + len(piece) > max_bytes:
+                chunks.append(current)
+                current = ""
+            current += piece
+    if current:
+        chunks.append(current)
+    return chunks
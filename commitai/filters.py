@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Rules that keep noisy files out of the prompt.
+
+Lockfiles, minified bundles, snapshots, binaries and base64 blobs cost most of
+a diff's tokens while telling the model almost nothing. While the staged diff
+is streamed, every file is matched against built-in path rules, the
+repository's ``.commitaiignore`` and gitattributes ``linguist-generated``, and
+its lines are checked for binary or machine-generated content. Matching files
+are replaced with a one-line summary of their changes.
+"""
+
+import fnmatch
+import os
+import re
+import subprocess
+from typing import FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+IGNORE_FILE = ".commitaiignore"
+
+DEFAULT_RULES: Tuple[Tuple[str, str], ...] = tuple(
+    [
+        (name, "lockfile")
+        for name in (
+            "package-lock.json",
+            "npm-shrinkwrap.json",
+            "yarn.lock",
+            "pnpm-lock.yaml",
+            "bun.lockb",
+            "poetry.lock",
+            "Pipfile.lock",
+            "uv.lock",
+            "pdm.lock",
+            "Cargo.lock",
+            "Gemfile.lock",
+            "composer.lock",
+            "go.sum",
+            "mix.lock",
+            "pubspec.lock",
+            "Podfile.lock",
+            "flake.lock",
+        )
+    ]
+    + [(pattern, "minified") for pattern in ("*.min.js", "*.min.css", "*.min.mjs")]
+    + [(pattern, "source map") for pattern in ("*.map",)]
+    + [(pattern, "snapshot") for pattern in ("*.snap", "__snapshots__/")]
+)
+
+# Changed lines longer than this are taken for minified or generated output,
+# in the formats that get minified. Prose, data and fixtures legitimately have
+# long lines, such as an unwrapped paragraph or a JSON record, so their files
+# are kept.
+MAX_LINE_LENGTH = 1000
+MINIFIED_EXTENSIONS = (".js", ".mjs", ".cjs", ".css", ".html", ".htm", ".svg")
+# Changed lines at least this long made only of base64 characters are blobs.
+MIN_BASE64_LENGTH = 200
+# Lines inside hunks shorter than this are never inspected.
+MIN_SUSPICIOUS_LINE_LENGTH = min(MAX_LINE_LENGTH, MIN_BASE64_LENGTH)
+
+_BASE64_LINE = re.compile(rb"[+-][A-Za-z0-9+/=]+\r?\n?")
+_BINARY_MARKERS = (b"Binary files ", b"GIT binary patch")
+
+
+class FilteredFile(NamedTuple):
+    path: str
+    reason: str
+    added: int
+    removed: int
+    omitted_bytes: int
+
+
+def summary_line(filtered: FilteredFile) -> str:
+    return (
+        f"[commitai] {filtered.path}: {filtered.reason} omitted "
+        f"(+{filtered.added} -{filtered.removed} lines, "
+        f"{filtered.omitted_bytes} bytes)\n"
+    )
+
+
+def _matches(pattern: str, path: str) -> bool:
+    """Matches ``path`` against a gitignore-style ``pattern``."""
+    if pattern.endswith("/"):
+        directory = pattern.rstrip("/")
+        parts = path.split("/")[:-1]
+        if "/" in directory:
+            prefix = directory.lstrip("/")
+            return path.startswith(prefix + "/")
+        return any(fnmatch.fnmatchcase(part, directory) for part in parts)
+    if "/" in pattern.rstrip("/"):
+        return fnmatch.fnmatchcase(path, pattern.lstrip("/"))
+    return fnmatch.fnmatchcase(path.rsplit("/", 1)[-1], pattern)
+
+
+def parse_ignore_file(text: str) -> List[str]:
+    """Returns the patterns of a ``.commitaiignore`` file.
+
+    The syntax follows ``.gitignore``: one pattern per line, ``#`` comments,
+    ``!`` to re-include a path and a trailing ``/`` to match directories.
+    """
+    patterns = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            patterns.append(line)
+    return patterns
+
+
+class NoiseFilter:
+    def __init__(
+        self,
+        rules: Sequence[Tuple[str, str]] = DEFAULT_RULES,
+        ignore_patterns: Sequence[str] = (),
+        generated: Iterable[str] = (),
+    ) -> None:
+        self.rules = rules
+        self.ignore_patterns = ignore_patterns
+        self.generated: FrozenSet[str] = frozenset(generated)
+
+    @classmethod
+    def for_repo(cls, toplevel: str, git_dir: str) -> "NoiseFilter":
+        """Builds the filter for the staged changes of a repository."""
+        try:
+            with open(os.path.join(toplevel, IGNORE_FILE), encoding="utf-8") as f:
+                ignore_patterns = parse_ignore_file(f.read())
+        except OSError:
+            ignore_patterns = []
+        return cls(
+            ignore_patterns=ignore_patterns,
+            generated=staged_generated_paths(toplevel, git_dir),
+        )
+
+    def match_path(self, path: str) -> Optional[str]:
+        """Returns why ``path`` should be omitted, or None to keep it.
+
+        As in ``.gitignore`` the last matching ``.commitaiignore`` pattern
+        wins, and a negated pattern also overrides the built-in rules.
+        """
+        ignored: Optional[bool] = None
+        for pattern in self.ignore_patterns:
+            negated = pattern.startswith("!")
+            if _matches(pattern[1:] if negated else pattern, path):
+                ignored = not negated
+        if ignored is not None:
+            return IGNORE_FILE if ignored else None
+        if path in self.generated:
+            return "generated file"
+        for pattern, reason in self.rules:
+            if _matches(pattern, path):
+                return reason
+        return None
+
+    def match_line(
+        self, line: bytes, in_hunk: bool, minifiable: bool = True
+    ) -> Optional[str]:
+        """Returns why a file containing ``line`` should be omitted, if so.
+
+        Long lines only count as minified content when ``minifiable``, see
+        :func:`is_minifiable`.
+        """
+        if not in_hunk:
+            return "binary file" if line.startswith(_BINARY_MARKERS) else None
+        if line[:1] not in (b"+", b"-"):
+            return None
+        if len(line) >= MIN_BASE64_LENGTH and _BASE64_LINE.fullmatch(line):
+            return "base64 data"
+        if minifiable and len(line) > MAX_LINE_LENGTH:
+            return "minified or generated content"
+        return None
+
+
+def is_minifiable(path: str) -> bool:
+    """Tells whether long lines in ``path`` point to minified output."""
+    return path.lower().endswith(MINIFIED_EXTENSIONS)
+
+
+def staged_generated_paths(toplevel: str, git_dir: str) -> List[str]:
+    """Lists staged paths marked ``linguist-generated`` in gitattributes.
+
+    Only consulted when the repository defines attributes at its top level or
+    in ``$GIT_DIR/info/attributes``, to avoid two extra ``git`` calls per run
+    in the common case.
+    """
+    attribute_files = (
+        os.path.join(toplevel, ".gitattributes"),
+        os.path.join(git_dir, "info", "attributes"),
+    )
+    if not any(os.path.exists(path) for path in attribute_files):
+        return []
+    try:
+        names = subprocess.run(
+            ["git", "diff", "--staged", "--name-only", "-z"],
+            capture_output=True,
+            check=True,
+        ).stdout
+        output = subprocess.run(
+            ["git", "check-attr", "-z", "--stdin", "linguist-generated"],
+            input=names,
+            capture_output=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return []
+    fields = output.decode(errors="replace").split("\0")
+    return [
+        path
+        for path, _, value in zip(fields[0::3], fields[1::3], fields[2::3])
+        if value in ("set", "true")
+    ]
@@ -1,7 +1,26 @@
 # -*- coding: utf-8 -*-
 import os
 import subprocess
-from typing import Optional
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional
+
+from commitai.diff import DiffFile, parse_diff, render_diff
+from commitai.filters import (
+    MIN_SUSPICIOUS_LINE_LENGTH,
+    FilteredFile,
+    NoiseFilter,
+    is_minifiable,
+    summary_line,
+)
+from commitai.profiling import span
+
+if TYPE_CHECKING:
+    from commitai.compact import Compaction
+
+# Default cap on the staged diff kept in memory and sent to the model.
+DEFAULT_DIFF_BYTE_BUDGET = 400_000
+
+_READ_CHUNK_SIZE = 64 * 1024
+_DIFF_HEADER = b"diff --git "
 
 
 def get_repository_name() -> str:
@@ -12,16 +31,239 @@ def get_repository_name() -> str:
     )
 
 
-def get_current_branch_name() -> str:
-    return (
-        subprocess.check_output(["git", "rev-parse", "--abbrev-ref", "HEAD"])
-        .strip()
-        .decode()
+class TruncatedFile(NamedTuple):
+    path: str
+    omitted_bytes: int
+
+
+class BudgetedDiff(NamedTuple):
+    text: str
+    total_bytes: int
+    truncated: List[TruncatedFile]
+    filtered: List[FilteredFile] = []
+
+
+def _diff_header_path(line: bytes) -> str:
+    header = line[len(_DIFF_HEADER) :].rstrip(b"\n").decode(errors="replace")
+    _, sep, new_path = header.rpartition(" b/")
+    return new_path if sep else header
+
+
+class _DiffAccumulator:
+    """Keeps the pieces of a streamed diff that fit the budget.
+
+    Files rejected by the noise filter are dropped, without counting against
+    the budget, and replaced by their header and a one-line summary.
+    """
+
+    def __init__(
+        self, max_bytes: Optional[int], noise_filter: Optional[NoiseFilter]
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.noise_filter = noise_filter
+        self.kept: List[bytes] = []
+        self.used = 0
+        self.total = 0
+        self.omitted: Dict[str, int] = {}
+        self.filtered: List[FilteredFile] = []
+        self._path = ""
+        self._header = b""
+        self._file_start = (0, 0)
+        self._reason: Optional[str] = None
+        self._in_hunk = False
+        self._minifiable = False
+        self._added = self._removed = self._file_bytes = 0
+
+    def start_file(self, header: bytes) -> None:
+        self._finish_file()
+        self._path = _diff_header_path(header)
+        self._header = header
+        self._file_start = (len(self.kept), self.used)
+        self._in_hunk = False
+        self._minifiable = is_minifiable(self._path)
+        self._added = self._removed = self._file_bytes = 0
+        self._reason = (
+            self.noise_filter.match_path(self._path) if self.noise_filter else None
+        )
+
+    def add(self, piece: bytes, at_line_start: bool) -> None:
+        size = len(piece)
+        self.total += size
+        self._file_bytes += size
+        if self._reason is not None:
+            if at_line_start:
+                self._count_line(piece)
+            return
+        if (
+            self.noise_filter is not None
+            and at_line_start
+            and (not self._in_hunk or size >= MIN_SUSPICIOUS_LINE_LENGTH)
+        ):
+            self._inspect_line(piece)
+            if self._reason is not None:
+                return
+
+        if self.max_bytes is None or self.used + size <= self.max_bytes:
+            self.kept.append(piece)
+            self.used += size
+        else:
+            # Stop at the budget for good, even if a later piece would fit.
+            self.max_bytes = self.used
+            self.omitted[self._path] = self.omitted.get(self._path, 0) + size
+
+    def _count_line(self, line: bytes) -> None:
+        if line.startswith(b"@@"):
+            self._in_hunk = True
+        elif self._in_hunk and line.startswith(b"+"):
+            self._added += 1
+        elif self._in_hunk and line.startswith(b"-"):
+            self._removed += 1
+
+    def _inspect_line(self, line: bytes) -> None:
+        assert self.noise_filter is not None
+        if line.startswith(b"@@"):
+            self._in_hunk = True
+        self._reason = self.noise_filter.match_line(
+            line, self._in_hunk, self._minifiable
+        )
+        if self._reason is None:
+            return
+        # Forget what was kept of this file, including any bytes reported as
+        # truncated, and count the changed lines seen so far.
+        index, used = self._file_start
+        dropped = b"".join(self.kept[index:]).splitlines(keepends=True)
+        del self.kept[index:]
+        self.used = used
+        self.omitted.pop(self._path, None)
+        self._in_hunk = False
+        for dropped_line in dropped + [line]:
+            self._count_line(dropped_line)
+
+    def _finish_file(self) -> None:
+        if self._reason is None:
+            return
+        filtered = FilteredFile(
+            self._path, self._reason, self._added, self._removed, self._file_bytes
+        )
+        self.filtered.append(filtered)
+        # The replacement is tiny, so it is kept even past the budget.
+        replacement = self._header + summary_line(filtered).encode()
+        self.kept.append(replacement)
+        self.used += len(replacement)
+        self._reason = None
+
+    def result(self) -> BudgetedDiff:
+        self._finish_file()
+        text = b"".join(self.kept).decode(errors="replace")
+        truncated = [TruncatedFile(path, size) for path, size in self.omitted.items()]
+        return BudgetedDiff(text, self.total, truncated, self.filtered)
+
+
+def _read_diff(
+    args: List[str],
+    max_bytes: Optional[int],
+    noise_filter: Optional[NoiseFilter] = None,
+) -> BudgetedDiff:
+    """Streams the diff printed by ``args`` keeping at most ``max_bytes`` of it.
+
+    The output is consumed in bounded chunks, so memory stays flat no matter
+    how large the diff is. Once the budget is exhausted the remaining output
+    is drained only to account, per file, for how many bytes were dropped.
+    Files matched by ``noise_filter`` are summarized instead of kept.
+    """
+    process = subprocess.Popen(args, stdout=subprocess.PIPE)
+    assert process.stdout is not None
+
+    diff = _DiffAccumulator(max_bytes, noise_filter)
+    at_line_start = True
+    with process.stdout:
+        while True:
+            piece = process.stdout.readline(_READ_CHUNK_SIZE)
+            if not piece:
+                break
+            if at_line_start and piece.startswith(_DIFF_HEADER):
+                diff.start_file(piece)
+            diff.add(piece, at_line_start)
+            at_line_start = piece.endswith(b"\n")
+
+    returncode = process.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, process.args)
+
+    return diff.result()
+
+
+def read_staged_diff(
+    max_bytes: Optional[int] = DEFAULT_DIFF_BYTE_BUDGET,
+    noise_filter: Optional[NoiseFilter] = None,
+    find_moves: bool = False,
+) -> BudgetedDiff:
+    """Streams ``git diff --staged`` within ``max_bytes``.
+
+    With ``find_moves``, renames and copies are detected whatever the
+    repository's ``diff.renames`` setting says.
+    """
+    args = ["git", "diff", "--staged"]
+    if find_moves:
+        args += ["--find-renames", "--find-copies"]
+    return _read_diff(args, max_bytes, noise_filter)
+
+
+def read_commit_diff(
+    sha: str, max_bytes: Optional[int] = DEFAULT_DIFF_BYTE_BUDGET
+) -> BudgetedDiff:
+    """Streams the changes introduced by commit ``sha`` within ``max_bytes``.
+
+    Merge commits are diffed against their first parent.
+    """
+    return _read_diff(
+        [
+            "git",
+            "diff-tree",
+            "-p",
+            "--root",
+            "-m",
+            "--first-parent",
+            "--no-commit-id",
+            sha,
+        ],
+        max_bytes,
     )
 
 
-def get_staged_changes_diff() -> str:
-    return subprocess.check_output(["git", "diff", "--staged"]).decode()
+class CommitInfo(NamedTuple):
+    sha: str
+    message: str
+
+
+def list_commits(rev_range: str) -> List[CommitInfo]:
+    """Lists the commits in ``rev_range``, oldest first, with their messages.
+
+    Merge commits are left out; see :func:`list_merges`.
+    """
+    output = subprocess.check_output(
+        ["git", "log", "--no-merges", "--reverse", "-z", "--format=%H%n%B", rev_range]
+    ).decode()
+    commits = []
+    for record in output.split("\0"):
+        if not record.strip():
+            continue
+        sha, _, message = record.lstrip("\n").partition("\n")
+        commits.append(CommitInfo(sha, message.strip()))
+    return commits
+
+
+def list_merges(rev_range: str) -> List[str]:
+    """Lists the hashes of the merge commits in ``rev_range``, oldest first."""
+    output = subprocess.check_output(
+        ["git", "rev-list", "--merges", "--reverse", rev_range]
+    ).decode()
+    return output.split()
+
+
+def get_staged_tree_hash() -> str:
+    """Returns the hash of the tree currently recorded in the index."""
+    return subprocess.check_output(["git", "write-tree"]).strip().decode()
 
 
 def stage_all_changes() -> None:
@@ -32,29 +274,250 @@ def create_commit(message: str) -> None:
     subprocess.run(["git", "commit", "-m", message])
 
 
-def run_pre_commit_hook() -> bool:
-    repo_path = get_repository_name()
-    pre_commit_path = os.path.join(repo_path, ".git", "hooks", "pre-commit")
+class StagedPath(NamedTuple):
+    path: str
+    # The source of a rename or copy; the path itself otherwise.
+    old_path: str
+
+
+def list_staged_paths() -> List[StagedPath]:
+    """Lists every staged path, even those past the diff byte budget."""
+    output = subprocess.check_output(
+        ["git", "diff", "--cached", "--name-status", "-M", "-z"]
+    ).decode("utf-8", "surrogateescape")
+    fields = output.split("\0")
+    paths = []
+    index = 0
+    while index + 1 < len(fields):
+        status = fields[index]
+        if status[:1] in ("R", "C"):
+            old_path, path = fields[index + 1], fields[index + 2]
+            index += 3
+        else:
+            old_path = path = fields[index + 1]
+            index += 2
+        paths.append(StagedPath(path, old_path))
+    return paths
+
+
+def read_staged_patch(paths: List[str]) -> bytes:
+    """Returns the staged changes to ``paths`` as a patch ``git apply`` takes."""
+    return subprocess.check_output(
+        [
+            "git",
+            "diff",
+            "--cached",
+            "--binary",
+            "-M",
+            "--no-color",
+            "--no-ext-diff",
+            "--src-prefix=a/",
+            "--dst-prefix=b/",
+            "--",
+            *paths,
+        ]
+    )
+
+
+def unstage_all(head_sha: Optional[str]) -> None:
+    """Resets the index to HEAD, keeping the working tree as it is."""
+    if head_sha is None:
+        subprocess.run(["git", "read-tree", "--empty"], check=True)
+    else:
+        subprocess.run(["git", "reset", "-q"], check=True)
+
+
+def apply_to_index(patch: bytes) -> None:
+    if patch.strip():
+        subprocess.run(
+            ["git", "apply", "--cached", "--whitespace=nowarn"],
+            input=patch,
+            check=True,
+        )
+
+
+def has_staged_changes() -> bool:
+    return subprocess.run(["git", "diff", "--cached", "--quiet"]).returncode != 0
+
+
+class RepoMetadata(NamedTuple):
+    toplevel: str
+    git_dir: str
+    branch: str
+    head_sha: Optional[str]
+
+
+class RepoContext:
+    """Repository state collected once and memoized for a single command.
+
+    All metadata comes from one ``git rev-parse`` invocation (falling back to
+    two calls on an unborn branch) and the staged diff is streamed at most
+    once within ``max_diff_bytes``, so helpers that receive the same context
+    never spawn ``git`` again. With ``compact``, the staged diff is compacted
+    (see :mod:`commitai.compact`) before anything reads it.
+    """
+
+    def __init__(
+        self,
+        max_diff_bytes: Optional[int] = DEFAULT_DIFF_BYTE_BUDGET,
+        filter_noise: bool = False,
+        compact: bool = False,
+    ):
+        self.max_diff_bytes = max_diff_bytes
+        self.filter_noise = filter_noise
+        self.compact = compact
+        self._metadata: Optional[RepoMetadata] = None
+        self._staged_diff: Optional[BudgetedDiff] = None
+        self._diff_files: Optional[List[DiffFile]] = None
+        self._compaction: Optional["Compaction"] = None
+
+    @property
+    def metadata(self) -> RepoMetadata:
+        if self._metadata is None:
+            self._metadata = _read_repo_metadata()
+        return self._metadata
+
+    @property
+    def toplevel(self) -> str:
+        return self.metadata.toplevel
+
+    @property
+    def git_dir(self) -> str:
+        return self.metadata.git_dir
+
+    @property
+    def branch(self) -> str:
+        return self.metadata.branch
+
+    @property
+    def head_sha(self) -> Optional[str]:
+        return self.metadata.head_sha
+
+    def _read_staged(self) -> BudgetedDiff:
+        if self._staged_diff is None:
+            noise_filter = (
+                NoiseFilter.for_repo(self.toplevel, self.git_dir)
+                if self.filter_noise
+                else None
+            )
+            staged = read_staged_diff(
+                self.max_diff_bytes, noise_filter, find_moves=self.compact
+            )
+            if self.compact:
+                # Imported here: the CLI imports this module before parsing options.
+                from commitai.compact import compact_files
+
+                # The summaries compaction writes are not diff syntax, so the
+                # compacted files are kept rather than parsed from the text.
+                self._diff_files, self._compaction = compact_files(
+                    parse_diff(staged.text)
+                )
+                staged = staged._replace(text=render_diff(self._diff_files))
+            self._staged_diff = staged
+        return self._staged_diff
+
+    @property
+    def staged_diff(self) -> str:
+        return self._read_staged().text
+
+    @property
+    def truncated_files(self) -> List[TruncatedFile]:
+        """Files whose staged changes were cut to respect the byte budget."""
+        return self._read_staged().truncated
+
+    @property
+    def diff_files(self) -> List[DiffFile]:
+        """The staged diff parsed into files and hunks."""
+        diff = self.staged_diff
+        if self._diff_files is None:
+            self._diff_files = parse_diff(diff)
+        return self._diff_files
+
+    @property
+    def compaction(self) -> Optional["Compaction"]:
+        """How much compaction shrank the staged diff, if it was compacted."""
+        self._read_staged()
+        return self._compaction
+
+    @property
+    def filtered_files(self) -> List[FilteredFile]:
+        """Files summarized instead of sent because they are noise."""
+        return self._read_staged().filtered
+
+    def invalidate_staged_diff(self) -> None:
+        """Forgets the memoized diff, e.g. after the index was modified."""
+        self._staged_diff = None
+        self._diff_files = None
+        self._compaction = None
+
+
+def _read_repo_metadata() -> RepoMetadata:
+    try:
+        output = subprocess.check_output(
+            [
+                "git",
+                "rev-parse",
+                "--show-toplevel",
+                "--absolute-git-dir",
+                "HEAD",
+                "--abbrev-ref",
+                "HEAD",
+            ],
+            stderr=subprocess.DEVNULL,
+        )
+    except subprocess.CalledProcessError:
+        # HEAD does not resolve yet (no commits), so ask for the paths and
+        # the symbolic branch name separately.
+        toplevel, git_dir = (
+            subprocess.check_output(
+                ["git", "rev-parse", "--show-toplevel", "--absolute-git-dir"]
+            )
+            .decode()
+            .splitlines()
+        )
+        branch = (
+            subprocess.check_output(["git", "symbolic-ref", "--short", "HEAD"])
+            .strip()
+            .decode()
+        )
+        return RepoMetadata(toplevel, git_dir, branch, None)
+
+    toplevel, git_dir, head_sha, branch = output.decode().splitlines()
+    return RepoMetadata(toplevel, git_dir, branch, head_sha)
+
+
+def _git_dir(repo: Optional[RepoContext]) -> str:
+    if repo is not None:
+        return repo.git_dir
+    return os.path.join(get_repository_name(), ".git")
+
+
+def run_pre_commit_hook(repo: Optional[RepoContext] = None) -> bool:
+    pre_commit_path = os.path.join(_git_dir(repo), "hooks", "pre-commit")
     if os.path.exists(pre_commit_path) and os.access(pre_commit_path, os.X_OK):
         try:
-            subprocess.check_call(pre_commit_path)
+            with span("pre_commit_hook"):
+                subprocess.check_call(pre_commit_path)
             return True
         except subprocess.CalledProcessError:
             return False
     return True
 
 
-def get_commit_template() -> Optional[str]:
-    repo_path = get_repository_name()
-    template_path = os.path.join(repo_path, ".git", "commit_template.txt")
+def get_commit_template(repo: Optional[RepoContext] = None) -> Optional[str]:
+    """Returns the template saved by create-template, or the configured one."""
+    # Imported here: commitai.config reads the defaults of this module.
+    from commitai.config import current_config
+
+    template_path = os.path.join(_git_dir(repo), "commit_template.txt")
     if os.path.exists(template_path):
         with open(template_path, "r") as f:
             return f.read()
-    return os.getenv("TEMPLATE_COMMIT")
+    return current_config().template
 
 
-def save_commit_template(template: str) -> None:
-    repo_path = get_repository_name()
-    template_path = os.path.join(repo_path, ".git", "commit_template.txt")
+def save_commit_template(template: str, repo: Optional[RepoContext] = None) -> None:
+    """Saves the template :func:`get_commit_template` reads for ``repo``."""
+    template_path = os.path.join(_git_dir(repo), "commit_template.txt")
     with open(template_path, "w") as f:
         f.write(template)
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""Batch generation of new messages for an existing range of commits.
+
+Messages are generated concurrently and every finished commit is appended to
+a progress file under ``.git/commitai/history``, so an interrupted run picks
+up where it stopped. The result can be emitted as a JSON mapping, as a
+``git rebase -i`` todo list or as a ``git filter-repo`` commit callback.
+"""
+
+import hashlib
+import json
+import os
+import shlex
+from typing import Callable, Dict, List, Optional
+
+from commitai.git import CommitInfo
+from commitai.llm import RateLimiter
+
+DEFAULT_CONCURRENCY = 4
+
+OUTPUT_FORMATS = ("json", "rebase-todo", "filter-repo")
+
+
+def history_dir(git_dir: str) -> str:
+    return os.path.join(git_dir, "commitai", "history")
+
+
+def progress_path(git_dir: str, rev_range: str, model: str) -> str:
+    """Returns the progress file for rewording ``rev_range`` with ``model``."""
+    digest = hashlib.sha256(f"{rev_range}\0{model}".encode()).hexdigest()[:16]
+    return os.path.join(history_dir(git_dir), f"{digest}.jsonl")
+
+
+def load_progress(path: str) -> Dict[str, str]:
+    """Reads the messages already generated by a previous, interrupted run."""
+    messages: Dict[str, str] = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A run killed mid-write can leave a partial last line.
+                    continue
+                messages[entry["sha"]] = entry["message"]
+    except FileNotFoundError:
+        pass
+    return messages
+
+
+def reword_commits(
+    commits: List[CommitInfo],
+    generate: Callable[[CommitInfo], str],
+    progress_file: str,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    rate_limiter: Optional[RateLimiter] = None,
+    on_done: Optional[Callable[[CommitInfo, str], None]] = None,
+) -> Dict[str, str]:
+    """Generates a message for every commit not already in ``progress_file``.
+
+    ``generate`` is called from up to ``concurrency`` worker threads, each
+    call gated by ``rate_limiter``. Results are appended to the progress file
+    as soon as they complete. Returns the messages for all ``commits``.
+    """
+    # Imported here: concurrent.futures imports logging, which slows down
+    # every start of the CLI.
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    messages = load_progress(progress_file)
+    pending = [commit for commit in commits if commit.sha not in messages]
+    os.makedirs(os.path.dirname(progress_file), exist_ok=True)
+
+    def run(commit: CommitInfo) -> str:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return generate(commit)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        with open(progress_file, "a", encoding="utf-8") as f:
+            futures = {pool.submit(run, commit): commit for commit in pending}
+            for future in as_completed(futures):
+                commit = futures[future]
+                message = future.result()
+                f.write(json.dumps({"sha": commit.sha, "message": message}) + "\n")
+                f.flush()
+                messages[commit.sha] = message
+                if on_done is not None:
+                    on_done(commit, message)
+    finally:
+        # On failure or interruption, drop queued commits; they are picked up
+        # again on the next run.
+        pool.shutdown(wait=True, cancel_futures=True)
+
+    return {commit.sha: messages[commit.sha] for commit in commits}
+
+
+def format_json(messages: Dict[str, str]) -> str:
+    return json.dumps(messages, indent=2) + "\n"
+
+
+def write_message_files(messages: Dict[str, str], directory: str) -> Dict[str, str]:
+    """Writes every message to ``<directory>/<sha>.txt`` and returns the paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for sha, message in messages.items():
+        path = os.path.join(directory, f"{sha}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(message)
+        paths[sha] = path
+    return paths
+
+
+def format_rebase_todo(commits: List[CommitInfo], message_paths: Dict[str, str]) -> str:
+    """Builds a ``git rebase -i`` todo that amends each commit's message.
+
+    The todo replays ``commits`` as a linear history, so they must not
+    include merges.
+    """
+    lines = []
+    for commit in commits:
+        subject = commit.message.splitlines()[0] if commit.message else ""
+        lines.append(f"pick {commit.sha} {subject}")
+        path = shlex.quote(message_paths[commit.sha])
+        lines.append(
+            f"exec git commit --amend --only --quiet --no-verify --file {path}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def format_filter_repo_callback(mapping_path: str) -> str:
+    """Builds a ``git filter-repo --commit-callback`` body using the mapping.
+
+    The mapping is loaded once and kept in the callback's globals.
+    """
+    return (
+        "import json\n"
+        "messages = globals().setdefault('_commitai_messages', {})\n"
+        "if not messages:\n"
+        f"    with open({mapping_path!r}) as f:\n"
+        "        messages.update(json.load(f))\n"
+        "message = messages.get(commit.original_id.decode())\n"
+        "if message:\n"
+        "    commit.message = message.encode() + b'\\n'\n"
+    )
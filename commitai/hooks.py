@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""Git hooks that run commitai from a plain ``git commit``.
+
+``prepare-commit-msg`` writes a generated message at the top of the message
+file before Git opens the editor. The optional ``post-index-change`` hook
+starts a background "prewarm" as soon as files are staged: it generates the
+message for the new index and stores it in the message cache, so that
+``prepare-commit-msg`` usually finds it there when the developer commits.
+
+Only one prewarm runs per repository at a time, guarded by a lock file
+holding its PID. A prewarm keeps going until the index it last generated for
+is the current one, so changes staged while it runs are not missed.
+"""
+
+import errno
+import os
+import shlex
+import subprocess
+import sys
+import time
+from typing import List, Optional, Sequence
+
+PREPARE_COMMIT_MSG = "prepare-commit-msg"
+POST_INDEX_CHANGE = "post-index-change"
+HOOK_NAMES = (PREPARE_COMMIT_MSG, POST_INDEX_CHANGE)
+HOOK_MARKER = "# Installed by commitai."
+
+# Seconds a prewarm waits before reading the index, so a burst of `git add`
+# calls results in one generation.
+PREWARM_DELAY = 1.0
+# Seconds prepare-commit-msg waits for a running prewarm to finish.
+PREWARM_WAIT = 60.0
+# A lock older than this is stale even if its PID was reused.
+STALE_LOCK_AGE = 600.0
+_POLL_INTERVAL = 0.1
+
+
+def hooks_dir() -> str:
+    """Returns the hooks directory of the current repository.
+
+    Honors ``core.hooksPath`` and linked worktrees.
+    """
+    path = subprocess.check_output(["git", "rev-parse", "--git-path", "hooks"])
+    return os.path.abspath(path.strip().decode())
+
+
+def render_hook(name: str, args: Sequence[str] = ()) -> str:
+    """Returns the script of hook ``name``, which runs ``commitai hook``."""
+    command = [sys.executable, "-m", "commitai.cli", "hook"]
+    if name == POST_INDEX_CHANGE:
+        # Git waits for the hook, so the prewarm runs in the background.
+        invocation = " ".join(shlex.quote(a) for a in [*command, "prewarm", *args])
+        invocation += " </dev/null >/dev/null 2>&1 &"
+    else:
+        invocation = " ".join(shlex.quote(a) for a in [*command, name, *args])
+        invocation += ' "$@"'
+    return (
+        "#!/bin/sh\n"
+        f"{HOOK_MARKER} Remove with: commitai-hook uninstall\n"
+        f"{invocation}\n"
+    )
+
+
+def is_commitai_hook(path: str) -> bool:
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            return HOOK_MARKER in f.read()
+    except OSError:
+        return False
+
+
+def install_hook(
+    directory: str, name: str, args: Sequence[str] = (), force: bool = False
+) -> str:
+    """Writes hook ``name`` into ``directory`` and returns its path.
+
+    Raises :class:`FileExistsError` if a hook not installed by commitai is
+    already there, unless ``force`` is set.
+    """
+    path = os.path.join(directory, name)
+    if os.path.exists(path) and not force and not is_commitai_hook(path):
+        raise FileExistsError(errno.EEXIST, "A different hook is installed", path)
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(render_hook(name, args))
+    os.chmod(path, 0o755)
+    return path
+
+
+def uninstall_hooks(directory: str) -> List[str]:
+    """Removes the hooks installed by commitai and returns their paths."""
+    removed = []
+    for name in HOOK_NAMES:
+        path = os.path.join(directory, name)
+        if is_commitai_hook(path):
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+
+def insert_message(path: str, message: str) -> None:
+    """Puts ``message`` above the content Git prepared in the message file."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            prepared = f.read()
+    except FileNotFoundError:
+        prepared = ""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(message.rstrip("\n") + "\n" + prepared)
+
+
+def prewarm_lock_path(git_dir: str) -> str:
+    return os.path.join(git_dir, "commitai", "prewarm.lock")
+
+
+def prewarm_state_path(git_dir: str) -> str:
+    """The file holding the tree hash of the index prewarmed last."""
+    return os.path.join(git_dir, "commitai", "prewarm.tree")
+
+
+def _pid_alive(pid: int) -> bool:
+    if os.name == "nt":
+        # os.kill() would terminate the process on Windows; assume it runs.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def lock_holder(path: str) -> Optional[int]:
+    """Returns the PID holding the lock at ``path``, if it is still running."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            pid = int(f.read().strip() or 0)
+        age = time.time() - os.path.getmtime(path)
+    except (OSError, ValueError):
+        return None
+    if not pid or age > STALE_LOCK_AGE:
+        return None
+    return pid if _pid_alive(pid) else None
+
+
+def try_lock(path: str) -> bool:
+    """Takes the lock at ``path`` for this process, replacing a stale one."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            if lock_holder(path) is not None:
+                return False
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+    return False
+
+
+def unlock(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def wait_for_unlock(path: str, timeout: float = PREWARM_WAIT) -> bool:
+    """Waits until nobody holds the lock at ``path``; False on timeout."""
+    deadline = time.monotonic() + timeout
+    while lock_holder(path) is not None:
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(_POLL_INTERVAL)
+    return True
+
+
+def read_prewarmed_tree(git_dir: str) -> Optional[str]:
+    try:
+        with open(prewarm_state_path(git_dir), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def write_prewarmed_tree(git_dir: str, tree: str) -> None:
+    path = prewarm_state_path(git_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(tree)
@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+"""Thin helpers around LangChain chat models shared by the generation paths."""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Tuple,
+    Union,
+)
+
+from commitai.budget import estimate_tokens
+
+
+class ChatModel(Protocol):
+    """The subset of the LangChain chat model interface commitai relies on."""
+
+    def invoke(self, input: Any, **kwargs: Any) -> Any: ...
+
+    def stream(self, input: Any, **kwargs: Any) -> Iterator[Any]: ...
+
+
+class Prompt(NamedTuple):
+    """A prompt split into its stable instructions and its per-commit part.
+
+    The system instructions (the default ones plus the template) are the same
+    for every commit of a repository, so they are sent first, in a message of
+    their own, where the providers' prompt caches can reuse them.
+    """
+
+    system: str
+    user: str
+
+    @property
+    def text(self) -> str:
+        """The prompt as a single string, e.g. to measure it."""
+        return f"{self.system}\n\n{self.user}"
+
+    def messages(self) -> List[Dict[str, Any]]:
+        """The prompt as chat messages; JSON-friendly, so the daemon can relay it."""
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user},
+        ]
+
+
+PromptInput = Union[str, Prompt]
+
+
+def model_input(prompt: PromptInput) -> Any:
+    """Returns what to pass to a chat model's ``invoke`` for ``prompt``."""
+    return prompt.messages() if isinstance(prompt, Prompt) else prompt
+
+
+class TokenUsage(NamedTuple):
+    input_tokens: int = 0
+    # Input tokens the provider read from, or wrote to, its prompt cache.
+    cache_read_tokens: int = 0
+    cache_creation_tokens: int = 0
+
+    def plus(self, other: "TokenUsage") -> "TokenUsage":
+        return TokenUsage(*(a + b for a, b in zip(self, other)))
+
+    def as_metadata(self) -> Dict[str, Any]:
+        """Returns the usage in LangChain's ``usage_metadata`` layout."""
+        return {
+            "input_tokens": self.input_tokens,
+            "input_token_details": {
+                "cache_read": self.cache_read_tokens,
+                "cache_creation": self.cache_creation_tokens,
+            },
+        }
+
+
+def token_usage(message: Any) -> Optional[TokenUsage]:
+    """Returns the input token usage reported with a response, if any.
+
+    Streamed responses report it in pieces, spread over their chunks.
+    """
+    usage = getattr(message, "usage_metadata", None)
+    if not isinstance(usage, dict):
+        return None
+    details = usage.get("input_token_details") or {}
+    return TokenUsage(
+        usage.get("input_tokens") or 0,
+        details.get("cache_read") or 0,
+        details.get("cache_creation") or 0,
+    )
+
+
+class UsageMeter:
+    """Adds up the token usage of the responses received during a run.
+
+    Safe to share between threads, such as those summarizing chunks.
+    """
+
+    def __init__(self) -> None:
+        self.total = TokenUsage()
+        self._lock = threading.Lock()
+
+    def add(self, message: Any) -> None:
+        usage = token_usage(message)
+        if usage is not None:
+            with self._lock:
+                self.total = self.total.plus(usage)
+
+
+_ACTIVE_METER: Optional[UsageMeter] = None
+
+
+@contextmanager
+def metering(meter: Optional[UsageMeter]) -> Iterator[Optional[UsageMeter]]:
+    """Makes ``meter`` receive the usage of the responses in this process."""
+    global _ACTIVE_METER
+    previous, _ACTIVE_METER = _ACTIVE_METER, meter
+    try:
+        yield meter
+    finally:
+        _ACTIVE_METER = previous
+
+
+def response_text(message: Any) -> str:
+    """Returns the text content of a chat model response."""
+    content = message.content
+    if not isinstance(content, str):
+        content = str(content)
+    return content
+
+
+def invoke_text(
+    llm: ChatModel, prompt: PromptInput, meter: Optional[UsageMeter] = None
+) -> str:
+    """Sends ``prompt`` to ``llm`` and returns the response text.
+
+    The token usage goes to ``meter``, by default the one of :func:`metering`.
+    """
+    response = llm.invoke(input=model_input(prompt))
+    meter = meter or _ACTIVE_METER
+    if meter is not None:
+        meter.add(response)
+    return response_text(response)
+
+
+def stream_text(
+    llm: ChatModel,
+    prompt: PromptInput,
+    on_token: Callable[[str], None],
+    meter: Optional[UsageMeter] = None,
+) -> str:
+    """Streams the response to ``prompt``, passing every chunk to ``on_token``.
+
+    Returns the full response text once the stream is exhausted.
+    """
+    meter = meter or _ACTIVE_METER
+    parts = []
+    for chunk in llm.stream(input=model_input(prompt)):
+        if meter is not None:
+            meter.add(chunk)
+        text = response_text(chunk)
+        if text:
+            on_token(text)
+            parts.append(text)
+    return "".join(parts)
+
+
+def generate_text(
+    llm: ChatModel,
+    prompt: PromptInput,
+    on_token: Optional[Callable[[str], None]] = None,
+) -> str:
+    """Invokes ``llm``, streaming through ``on_token`` when one is given."""
+    if on_token is None:
+        return invoke_text(llm, prompt)
+    return stream_text(llm, prompt, on_token)
+
+
+class RateLimiter:
+    """Spaces out requests so that at most ``per_minute`` start each minute.
+
+    Safe to share between threads; callers block in :meth:`acquire` until
+    their slot comes up.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self.interval = 60.0 / per_minute
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+_RATE_LIMITERS: Dict[str, RateLimiter] = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+def rate_limiter_for(provider: str, per_minute: float) -> RateLimiter:
+    """Returns the process-wide rate limiter shared by ``provider``'s models."""
+    with _RATE_LIMITERS_LOCK:
+        limiter = _RATE_LIMITERS.get(provider)
+        if limiter is None or limiter.interval != 60.0 / per_minute:
+            limiter = _RATE_LIMITERS[provider] = RateLimiter(per_minute)
+        return limiter
+
+
+class ConcurrencyLimitedChatModel:
+    """Chat model wrapper allowing at most ``limit`` requests in flight.
+
+    Streams hold their slot until the last chunk, so a small local server is
+    never asked for more than it can serve at once.
+    """
+
+    def __init__(self, llm: ChatModel, limit: int) -> None:
+        self.llm = llm
+        self._slots = threading.BoundedSemaphore(limit)
+
+    def invoke(self, input: Any, **kwargs: Any) -> Any:
+        with self._slots:
+            return self.llm.invoke(input, **kwargs)
+
+    def stream(self, input: Any, **kwargs: Any) -> Iterator[Any]:
+        with self._slots:
+            yield from self.llm.stream(input, **kwargs)
+
+
+def _is_system_text(message: Any) -> bool:
+    return (
+        isinstance(message, dict)
+        and message.get("role") == "system"
+        and isinstance(message.get("content"), str)
+    )
+
+
+def with_cache_breakpoint(input: Any, min_tokens: int = 0) -> Any:
+    """Marks the end of the system messages of ``input`` for prompt caching.
+
+    Anthropic only caches a prompt prefix that ends at a ``cache_control``
+    block, and only if the prefix is at least ``min_tokens`` long. Shorter
+    prefixes and other inputs are returned unchanged.
+    """
+    if not isinstance(input, list):
+        return input
+    system = "".join(m["content"] for m in input if _is_system_text(m))
+    if not system or estimate_tokens(system) < min_tokens:
+        return input
+    marked = []
+    for message in input:
+        if _is_system_text(message):
+            block = {
+                "type": "text",
+                "text": message["content"],
+                "cache_control": {"type": "ephemeral"},
+            }
+            message = dict(message, content=[block])
+        marked.append(message)
+    return marked
+
+
+class CacheBreakpointChatModel:
+    """Chat model wrapper asking the provider to cache the system prompt.
+
+    Providers that cache prompt prefixes on their own (OpenAI, Gemini) do not
+    need it; Anthropic only caches up to an explicit breakpoint. The default
+    instructions alone are far below the minimum ``min_tokens`` the provider
+    caches, so only long templates get a breakpoint; a breakpoint on a
+    shorter prefix would never be read back.
+    """
+
+    def __init__(self, llm: ChatModel, min_tokens: int = 0) -> None:
+        self.llm = llm
+        self.min_tokens = min_tokens
+
+    def invoke(self, input: Any, **kwargs: Any) -> Any:
+        marked = with_cache_breakpoint(input, self.min_tokens)
+        return self.llm.invoke(input=marked, **kwargs)
+
+    def stream(self, input: Any, **kwargs: Any) -> Iterator[Any]:
+        marked = with_cache_breakpoint(input, self.min_tokens)
+        return self.llm.stream(input=marked, **kwargs)
+
+
+class RetryPolicy(NamedTuple):
+    attempts: int = 3
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+
+
+DEFAULT_RETRIES = RetryPolicy().attempts - 1
+
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and 5xx.
+_TRANSIENT_STATUSES = {408, 409, 425, 429}
+# Exception class names used by the provider SDKs for transient failures.
+_TRANSIENT_ERROR_NAMES = (
+    "Timeout",
+    "Connection",
+    "RateLimit",
+    "ServiceUnavailable",
+    "InternalServer",
+    "Overloaded",
+    "ResourceExhausted",
+    "DeadlineExceeded",
+)
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Tells whether ``error`` is likely to go away if the request is retried."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in _TRANSIENT_STATUSES or status >= 500
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return any(
+        name in cls.__name__
+        for cls in type(error).__mro__
+        for name in _TRANSIENT_ERROR_NAMES
+    )
+
+
+def backoff_delay(attempt: int, policy: RetryPolicy) -> float:
+    """Full-jitter exponential backoff for the given zero-based retry attempt."""
+    return random.uniform(0, min(policy.max_delay, policy.base_delay * 2**attempt))
+
+
+class ResilientChatModel:
+    """Chat model wrapper adding retries with backoff and a fallback chain.
+
+    Transient errors (429, 5xx, timeouts, dropped connections) are retried
+    with jittered exponential backoff. When a model keeps failing, the next
+    model in the chain is tried; fallback models are only created, and their
+    provider imported, when they are first needed. Instances are safe to
+    share between threads.
+    """
+
+    def __init__(
+        self,
+        model: str,
+        llm: ChatModel,
+        fallbacks: Optional[List[str]] = None,
+        create: Optional[Callable[[str], ChatModel]] = None,
+        policy: Optional[RetryPolicy] = None,
+    ) -> None:
+        self.model = model
+        self.policy = policy or RetryPolicy()
+        self._chain: List[Tuple[str, Optional[ChatModel]]] = [(model, llm)]
+        self._chain += [(name, None) for name in fallbacks or []]
+        self._create = create
+        self._lock = threading.Lock()
+
+    @property
+    def llm(self) -> ChatModel:
+        """The primary model of the chain."""
+        llm = self._chain[0][1]
+        assert llm is not None
+        return llm
+
+    def _model_at(self, index: int) -> ChatModel:
+        with self._lock:
+            name, llm = self._chain[index]
+            if llm is None:
+                if self._create is None:
+                    raise ValueError(f"No factory to create fallback model {name}")
+                llm = self._create(name)
+                self._chain[index] = (name, llm)
+            return llm
+
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        return is_transient_error(error) and attempt + 1 < self.policy.attempts
+
+    def _is_last(self, index: int) -> bool:
+        return index + 1 == len(self._chain)
+
+    def invoke(self, input: Any, **kwargs: Any) -> Any:
+        for index in range(len(self._chain)):
+            for attempt in range(max(1, self.policy.attempts)):
+                try:
+                    return self._model_at(index).invoke(input=input, **kwargs)
+                except Exception as e:
+                    if self._should_retry(e, attempt):
+                        time.sleep(backoff_delay(attempt, self.policy))
+                        continue
+                    if self._is_last(index):
+                        raise
+                    break
+        raise AssertionError("unreachable")
+
+    async def ainvoke(self, input: Any, **kwargs: Any) -> Any:
+        # Imported here: asyncio alone would double the CLI's startup time.
+        import asyncio
+
+        for index in range(len(self._chain)):
+            for attempt in range(max(1, self.policy.attempts)):
+                try:
+                    llm = self._model_at(index)
+                    ainvoke = getattr(llm, "ainvoke", None)
+                    if ainvoke is None:
+                        return await asyncio.to_thread(llm.invoke, input, **kwargs)
+                    return await ainvoke(input=input, **kwargs)
+                except Exception as e:
+                    if self._should_retry(e, attempt):
+                        await asyncio.sleep(backoff_delay(attempt, self.policy))
+                        continue
+                    if self._is_last(index):
+                        raise
+                    break
+        raise AssertionError("unreachable")
+
+    def stream(self, input: Any, **kwargs: Any) -> Iterator[Any]:
+        """Streams from the first model that answers.
+
+        Retries and fallbacks only apply until the first chunk arrives; once
+        tokens were shown, a failure is raised to the caller.
+        """
+        for index in range(len(self._chain)):
+            for attempt in range(max(1, self.policy.attempts)):
+                started = False
+                try:
+                    for chunk in self._model_at(index).stream(input=input, **kwargs):
+                        started = True
+                        yield chunk
+                    return
+                except Exception as e:
+                    if started:
+                        raise
+                    if self._should_retry(e, attempt):
+                        time.sleep(backoff_delay(attempt, self.policy))
+                        continue
+                    if self._is_last(index):
+                        raise
+                    break
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""Local models served by Ollama.
+
+Any model Ollama serves can be selected as ``ollama/<name>``; names starting
+with ``llama`` work without the prefix. Every request asks Ollama to keep the
+model loaded for the ``ollama_keep_alive`` setting (default: 30 minutes), so only
+the first run after a long idle pays the load time, and ``commitai-ollama
+warm`` pays it ahead of time.
+
+Requests are sized to their prompt. ``num_ctx`` is the smallest power of two
+fitting the prompt and the answer, and never below the context the model is
+warmed with: Ollama reloads a model whenever ``num_ctx`` changes, so most runs
+must ask for the same one. ``num_predict`` caps the answer in proportion to
+the prompt, which stops small models from rambling on. The
+``ollama_num_ctx`` and ``ollama_num_predict`` settings replace both.
+"""
+
+import json
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Union
+
+from commitai.budget import RESERVED_OUTPUT_TOKENS, estimate_tokens
+
+if TYPE_CHECKING:
+    from langchain_ollama import ChatOllama
+
+MODEL_PREFIX = "ollama/"
+DEFAULT_HOST = "http://127.0.0.1:11434"
+DEFAULT_KEEP_ALIVE = "30m"
+DEFAULT_NUM_CTX = 8192
+MIN_NUM_PREDICT = 256
+MAX_NUM_PREDICT = RESERVED_OUTPUT_TOKENS
+# Loading a large model from a cold disk can take minutes.
+WARM_UP_TIMEOUT = 300.0
+
+KeepAlive = Union[int, str]
+
+
+class OllamaError(Exception):
+    pass
+
+
+def model_name(model: str) -> str:
+    """Returns the name Ollama knows ``model`` by."""
+    return model[len(MODEL_PREFIX) :] if model.startswith(MODEL_PREFIX) else model
+
+
+def host() -> str:
+    """Returns the base URL of the Ollama server, from ``OLLAMA_HOST``."""
+    value = os.getenv("OLLAMA_HOST") or DEFAULT_HOST
+    if "://" not in value:
+        value = "http://" + value
+    return value.rstrip("/")
+
+
+def keep_alive(value: Optional[str] = None) -> KeepAlive:
+    """Parses a keep-alive setting: a duration such as ``30m``, or seconds.
+
+    Defaults to the ``ollama_keep_alive`` setting. A negative number keeps the
+    model loaded until Ollama stops.
+    """
+    if not value:
+        # Imported here: commitai.config imports this module.
+        from commitai.config import current_config
+
+        value = current_config().ollama_keep_alive
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def num_predict_for(prompt_tokens: int) -> int:
+    return min(MAX_NUM_PREDICT, max(MIN_NUM_PREDICT, prompt_tokens // 8))
+
+
+def num_ctx_for(prompt_tokens: int, num_predict: int) -> int:
+    num_ctx = DEFAULT_NUM_CTX
+    while num_ctx < prompt_tokens + num_predict:
+        num_ctx *= 2
+    return num_ctx
+
+
+def _prompt_tokens(prompt: Any) -> int:
+    if isinstance(prompt, str):
+        return estimate_tokens(prompt)
+    return sum(
+        estimate_tokens(
+            str(
+                message.get("content")
+                if isinstance(message, dict)
+                else getattr(message, "content", message)
+            )
+        )
+        for message in prompt
+    )
+
+
+class SizedChatOllama:
+    """A ``ChatOllama`` whose context and answer length follow each prompt.
+
+    ``num_ctx`` and ``num_predict`` replace the derived values when set.
+    Per-request options replace all of the client's, so the temperature is
+    sent along with them.
+    """
+
+    def __init__(
+        self,
+        llm: "ChatOllama",
+        temperature: float,
+        num_ctx: Optional[int] = None,
+        num_predict: Optional[int] = None,
+    ) -> None:
+        self.llm = llm
+        self.temperature = temperature
+        self.num_ctx = num_ctx
+        self.num_predict = num_predict
+
+    def options(self, prompt: Any) -> Dict[str, Any]:
+        tokens = _prompt_tokens(prompt)
+        num_predict = self.num_predict or num_predict_for(tokens)
+        return {
+            "temperature": self.temperature,
+            "num_ctx": self.num_ctx or num_ctx_for(tokens, num_predict),
+            "num_predict": num_predict,
+        }
+
+    def invoke(self, input: Any, **kwargs: Any) -> Any:
+        kwargs.setdefault("options", self.options(input))
+        return self.llm.invoke(input, **kwargs)
+
+    def stream(self, input: Any, **kwargs: Any) -> Iterator[Any]:
+        kwargs.setdefault("options", self.options(input))
+        return self.llm.stream(input, **kwargs)
+
+
+def create_model(
+    model: str, timeout: Optional[float] = None, base_url: Optional[str] = None
+) -> SizedChatOllama:
+    """Creates the client for ``model``, sized by the configuration.
+
+    ``base_url`` replaces ``OLLAMA_HOST``.
+    """
+    from langchain_ollama import ChatOllama
+
+    from commitai.config import current_config
+
+    config = current_config()
+
+    client_kwargs: Dict[str, Any] = {}
+    if timeout is not None:
+        client_kwargs["client_kwargs"] = {"timeout": timeout}
+    if base_url is not None:
+        client_kwargs["base_url"] = base_url
+    temperature = 0.7
+    llm = ChatOllama(
+        model=model_name(model),
+        temperature=temperature,
+        keep_alive=keep_alive(),
+        **client_kwargs,
+    )
+    return SizedChatOllama(
+        llm, temperature, config.ollama_num_ctx, config.ollama_num_predict
+    )
+
+
+def warm_up(
+    model: str,
+    keep_alive_for: Optional[str] = None,
+    base_url: Optional[str] = None,
+    timeout: float = WARM_UP_TIMEOUT,
+) -> float:
+    """Loads ``model`` into Ollama's memory and returns the load time in seconds.
+
+    The model is loaded with the context size requests will ask for (the
+    ``ollama_num_ctx`` setting, or the smallest derived one), so they do not
+    trigger a reload. ``base_url`` replaces ``OLLAMA_HOST``.
+    """
+    # Imported here: urllib takes a while to import and only this call needs it.
+    import urllib.error
+    import urllib.request
+
+    from commitai.config import current_config
+
+    server = base_url.rstrip("/") if base_url else host()
+    num_ctx = current_config().ollama_num_ctx or DEFAULT_NUM_CTX
+    payload = {
+        "model": model_name(model),
+        "keep_alive": keep_alive(keep_alive_for),
+        "options": {"num_ctx": num_ctx},
+        "stream": False,
+    }
+    request = urllib.request.Request(
+        f"{server}/api/generate",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            reply = json.loads(response.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        try:
+            detail = json.loads(e.read())["error"]
+        except (ValueError, KeyError, TypeError):
+            detail = str(e)
+        raise OllamaError(f"Ollama could not load {payload['model']}: {detail}") from e
+    except (urllib.error.URLError, OSError) as e:
+        reason = getattr(e, "reason", e)
+        raise OllamaError(f"Could not reach Ollama at {server}: {reason}") from e
+    load_duration = reply.get("load_duration")
+    if isinstance(load_duration, (int, float)):
+        return load_duration / 1e9
+    return time.perf_counter() - started
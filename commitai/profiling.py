@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""Lightweight phase timing for a single commitai run.
+
+Code marks its phases with ``with span("name"):``. Spans are only recorded
+while a :class:`Profiler` is active (``--profile`` or ``--profile-output``);
+otherwise ``span`` costs a global lookup. Recorded spans can be printed as a
+phase breakdown, or written as JSON lines or in the Chrome trace event format
+(loadable in ``chrome://tracing`` and Perfetto).
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+PROFILE_FORMATS = ("jsonl", "chrome")
+
+
+class Span(NamedTuple):
+    name: str
+    start: float
+    duration: float
+    thread_id: int
+    depth: int
+    attrs: Dict[str, Any]
+
+
+class Profiler:
+    def __init__(
+        self, attrs: Optional[Dict[str, Any]] = None, origin: Optional[float] = None
+    ) -> None:
+        self.origin = time.perf_counter() if origin is None else origin
+        self.attrs = attrs or {}
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, name: str, start: float, end: float, **attrs: Any) -> None:
+        """Records a span measured elsewhere, e.g. before profiling started."""
+        depth = getattr(self._local, "depth", 0)
+        span = Span(name, start, end - start, threading.get_ident(), depth, attrs)
+        with self._lock:
+            self.spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[None]:
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self._local.depth = depth
+            self.record(name, start, end, **attrs)
+
+    def sorted_spans(self) -> List[Span]:
+        with self._lock:
+            return sorted(self.spans, key=lambda s: s.start)
+
+    def format_breakdown(self) -> str:
+        """Renders the spans as an indented table of phases."""
+        spans = self.sorted_spans()
+        total = max((s.start + s.duration for s in spans), default=self.origin)
+        total -= min((s.start for s in spans), default=self.origin)
+        lines = [f"{'phase':<36}{'ms':>10}{'%':>7}"]
+        main_thread = threading.main_thread().ident
+        for s in spans:
+            name = "  " * s.depth + s.name
+            if s.thread_id != main_thread:
+                name += " [thread]"
+            share = 100 * s.duration / total if total else 0.0
+            lines.append(f"{name:<36}{s.duration * 1000:>10.1f}{share:>6.1f}%")
+        return "\n".join(lines)
+
+    def to_json_lines(self) -> str:
+        lines = []
+        for s in self.sorted_spans():
+            entry = dict(self.attrs)
+            entry.update(
+                name=s.name,
+                start_ms=round((s.start - self.origin) * 1000, 3),
+                duration_ms=round(s.duration * 1000, 3),
+                thread=s.thread_id,
+                depth=s.depth,
+            )
+            if s.attrs:
+                entry["attrs"] = s.attrs
+            lines.append(json.dumps(entry, default=str))
+        return "".join(line + "\n" for line in lines)
+
+    def to_chrome_trace(self) -> str:
+        pid = os.getpid()
+        events = [
+            {
+                "name": s.name,
+                "ph": "X",
+                "ts": round((s.start - self.origin) * 1_000_000, 1),
+                "dur": round(s.duration * 1_000_000, 1),
+                "pid": pid,
+                "tid": s.thread_id,
+                "args": s.attrs,
+            }
+            for s in self.sorted_spans()
+        ]
+        return json.dumps({"traceEvents": events, "otherData": self.attrs}, default=str)
+
+    def write(self, path: str, profile_format: str = "jsonl") -> None:
+        """Writes the spans to ``path``; JSON lines are appended to it."""
+        if profile_format == "chrome":
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.to_chrome_trace())
+        else:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(self.to_json_lines())
+
+
+_ACTIVE: Optional[Profiler] = None
+
+
+@contextmanager
+def activate(profiler: Optional[Profiler]) -> Iterator[Optional[Profiler]]:
+    """Makes ``profiler`` receive the spans recorded in this process."""
+    global _ACTIVE
+    previous, _ACTIVE = _ACTIVE, profiler
+    try:
+        yield profiler
+    finally:
+        _ACTIVE = previous
+
+
+def event(name: str, **attrs: Any) -> None:
+    """Records an instant, e.g. counters read at the end of a phase."""
+    profiler = _ACTIVE
+    if profiler is not None:
+        now = time.perf_counter()
+        profiler.record(name, now, now, **attrs)
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[None]:
+    """Times the enclosed block if a profiler is active."""
+    profiler = _ACTIVE
+    if profiler is None:
+        yield
+        return
+    with profiler.span(name, **attrs):
+        yield
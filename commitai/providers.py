@@ -0,0 +1,415 @@
+# -*- coding: utf-8 -*-
+"""Registry of chat model providers.
+
+Each provider is matched by a model name prefix and owns a factory that imports
+its LangChain backend only when it is actually selected. Importing this module
+(and therefore ``commitai.cli``) never pulls in ``langchain_*`` packages, which
+keeps ``commitai --help`` and other non-generating commands fast.
+
+Packages add providers through the ``commitai.providers`` entry point group:
+the entry point name is the prefix and its object the factory, which is only
+imported once a matching model is selected. The ``[models]`` table of the
+global configuration file defines aliases, such as a vLLM or llama.cpp server that
+speaks the OpenAI protocol::
+
+    [models.fast]
+    provider = "openai"
+    model = "Qwen/Qwen2.5-Coder-7B-Instruct"
+    base_url = "http://gpu-box:8000/v1"
+    timeout = 10
+    max_concurrency = 4
+
+``commitai -m fast`` then uses that server.
+"""
+
+import os
+import threading
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    cast,
+)
+
+import click
+
+from commitai.llm import (
+    CacheBreakpointChatModel,
+    ChatModel,
+    ConcurrencyLimitedChatModel,
+)
+from commitai.local import MODEL_PREFIX
+
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+# Factories receive the model name and an optional request timeout in seconds.
+ProviderFactory = Callable[[str, Optional[float]], "BaseChatModel"]
+
+DEFAULT_MODEL = "gemini-2.5-pro-preview-03-25"
+ENTRY_POINT_GROUP = "commitai.providers"
+# Sent to servers behind a base_url that take no API key, since the OpenAI
+# and Anthropic clients refuse to start without one.
+UNUSED_API_KEY = "unused"
+# The shortest prompt prefixes, in tokens, that Anthropic caches.
+ANTHROPIC_MIN_CACHED_TOKENS = 1024
+ANTHROPIC_HAIKU_MIN_CACHED_TOKENS = 2048
+
+_PROVIDERS: List[Tuple[str, ProviderFactory]] = []
+_ENTRY_POINTS_LOADED = False
+_ENTRY_POINTS_LOCK = threading.Lock()
+
+_MODEL_CACHE: Dict[Tuple[str, Optional[float]], ChatModel] = {}
+_MODEL_CACHE_LOCK = threading.Lock()
+
+
+class ModelAlias(NamedTuple):
+    """A model name defined in the ``[models]`` table of the configuration."""
+
+    name: str
+    # The model requested from the provider.
+    model: str
+    # The backend serving ``model``; without one, ``model`` is resolved by
+    # prefix like any model name.
+    provider: Optional[str] = None
+    base_url: Optional[str] = None
+    # The environment variable holding the API key.
+    api_key_env: Optional[str] = None
+    # Used when no timeout is given on the command line.
+    timeout: Optional[float] = None
+    max_concurrency: Optional[int] = None
+
+
+def register_provider(prefix: str, factory: ProviderFactory) -> None:
+    """Registers a factory for model names starting with ``prefix``.
+
+    Providers registered later take precedence over earlier ones, so callers can
+    override a built-in backend for a given prefix.
+    """
+    _PROVIDERS.insert(0, (prefix, factory))
+
+
+def _entry_point_factory(entry_point: Any) -> ProviderFactory:
+    def create(model: str, timeout: Optional[float] = None) -> "BaseChatModel":
+        return cast("BaseChatModel", entry_point.load()(model, timeout))
+
+    return create
+
+
+def load_entry_points() -> None:
+    """Registers the providers of the ``commitai.providers`` entry point group.
+
+    Runs once per process. They take precedence over the built-in providers;
+    their modules are only imported when one of their models is selected.
+    """
+    global _ENTRY_POINTS_LOADED
+    with _ENTRY_POINTS_LOCK:
+        if _ENTRY_POINTS_LOADED:
+            return
+        _ENTRY_POINTS_LOADED = True
+        # Imported here: scanning the installed packages takes a while.
+        from importlib.metadata import entry_points
+
+        found = entry_points()
+        if hasattr(found, "select"):
+            group = found.select(group=ENTRY_POINT_GROUP)
+        else:  # Python < 3.10
+            group = found.get(ENTRY_POINT_GROUP, [])
+        for entry_point in sorted(group, key=lambda entry_point: entry_point.name):
+            register_provider(entry_point.name, _entry_point_factory(entry_point))
+
+
+def resolve_provider(model: str) -> Optional[ProviderFactory]:
+    """Returns the factory responsible for ``model``, if any."""
+    load_entry_points()
+    for prefix, factory in _PROVIDERS:
+        if model.startswith(prefix):
+            return factory
+    return None
+
+
+def provider_key(model: str) -> str:
+    """Returns the registered prefix serving ``model``, or the model itself.
+
+    Used to share per-provider resources such as rate limits. An alias is
+    its own provider.
+    """
+    if model in model_aliases():
+        return model
+    load_entry_points()
+    for prefix, _ in _PROVIDERS:
+        if model.startswith(prefix):
+            return prefix
+    return model
+
+
+def _option(name: str, entry: Dict[str, Any], key: str, kind: Any) -> Any:
+    from commitai.config import ConfigError
+
+    value = entry.get(key)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, kind):
+        raise ConfigError(f"[models.{name}] {key} has the wrong type: {value!r}")
+    if kind is not str and value <= 0:
+        raise ConfigError(f"[models.{name}] {key} must be positive.")
+    return value
+
+
+def parse_model_aliases(config: Dict[str, Any]) -> Dict[str, ModelAlias]:
+    """Reads the model aliases of the ``[models]`` table of ``config``."""
+    # Imported here: the configuration is only resolved once a model is used.
+    from commitai.config import ConfigError
+
+    table = config.get("models", {})
+    if not isinstance(table, dict):
+        raise ConfigError("[models] must be a table of model aliases.")
+    aliases = {}
+    for name, entry in table.items():
+        if not isinstance(entry, dict):
+            raise ConfigError(f"[models.{name}] must be a table.")
+        unknown = sorted(set(entry) - set(ModelAlias._fields[1:]))
+        if unknown:
+            raise ConfigError(f"[models.{name}] has unknown keys: {', '.join(unknown)}")
+        provider = _option(name, entry, "provider", str)
+        if provider is not None and provider not in _BACKENDS:
+            raise ConfigError(
+                f"[models.{name}] provider must be one of {', '.join(_BACKENDS)}."
+            )
+        alias = ModelAlias(
+            name,
+            _option(name, entry, "model", str) or name,
+            provider,
+            _option(name, entry, "base_url", str),
+            _option(name, entry, "api_key_env", str),
+            _option(name, entry, "timeout", (int, float)),
+            _option(name, entry, "max_concurrency", int),
+        )
+        if provider is None and (alias.base_url or alias.api_key_env):
+            raise ConfigError(
+                f"[models.{name}] needs a provider to use base_url or api_key_env."
+            )
+        aliases[name] = alias
+    return aliases
+
+
+_ALIASES: Optional[Dict[str, ModelAlias]] = None
+
+
+def model_aliases() -> Dict[str, ModelAlias]:
+    """Returns the model aliases of the global configuration file."""
+    from commitai.config import current_config
+
+    global _ALIASES
+    if _ALIASES is None:
+        _ALIASES = parse_model_aliases({"models": dict(current_config().models)})
+    return _ALIASES
+
+
+def _create_aliased(alias: ModelAlias, timeout: Optional[float]) -> ChatModel:
+    llm: ChatModel
+    if alias.provider is not None:
+        llm = _BACKENDS[alias.provider](
+            alias.model, timeout, alias.base_url, alias.api_key_env
+        )
+    else:
+        factory = resolve_provider(alias.model)
+        if factory is None:
+            raise click.ClickException(
+                f"🚫 Unsupported model: {alias.model} (aliased as {alias.name})"
+            )
+        llm = factory(alias.model, timeout)
+    if alias.max_concurrency:
+        llm = ConcurrencyLimitedChatModel(llm, alias.max_concurrency)
+    return llm
+
+
+def create_chat_model(model: str, timeout: Optional[float] = None) -> ChatModel:
+    """Returns a chat model for ``model``, reusing an existing client if any.
+
+    ``model`` is a model alias of the configuration file or a model name
+    served by a registered provider. Clients are memoized per model and
+    timeout, so every request made by the process (batch runs, fallbacks, a
+    daemon) shares one HTTP connection pool per provider instead of opening
+    new connections each time.
+    """
+    alias = model_aliases().get(model)
+    if alias is None:
+        factory = resolve_provider(model)
+        if factory is None:
+            raise click.ClickException(f"🚫 Unsupported model: {model}")
+    elif timeout is None:
+        timeout = alias.timeout
+    key = (model, timeout)
+    with _MODEL_CACHE_LOCK:
+        llm = _MODEL_CACHE.get(key)
+        if llm is None:
+            if alias is not None:
+                llm = _create_aliased(alias, timeout)
+            else:
+                assert factory is not None
+                llm = factory(model, timeout)
+            _MODEL_CACHE[key] = llm
+        return llm
+
+
+def ollama_model(model: str) -> Tuple[str, Optional[str]]:
+    """Returns the Ollama model behind ``model`` and the server serving it.
+
+    ``model`` is a model name or an alias of the configuration file; the
+    server is None when it is ``OLLAMA_HOST``.
+    """
+    alias = model_aliases().get(model)
+    if alias is None:
+        served = resolve_provider(model) is _create_ollama
+        name, base_url = model, None
+    else:
+        if alias.provider is not None:
+            served = alias.provider == "ollama"
+        else:
+            served = resolve_provider(alias.model) is _create_ollama
+        name, base_url = alias.model, alias.base_url
+    if not served:
+        raise click.ClickException(f"🚫 {model} is not served by Ollama")
+    return name, base_url
+
+
+def _timeout_kwargs(name: str, timeout: Optional[float]) -> Dict[str, Any]:
+    return {} if timeout is None else {name: timeout}
+
+
+def _base_url_kwargs(base_url: Optional[str]) -> Dict[str, Any]:
+    return {} if base_url is None else {"base_url": base_url}
+
+
+def _api_key(env: str, base_url: Optional[str]) -> Optional[str]:
+    return os.getenv(env) or (UNUSED_API_KEY if base_url else None)
+
+
+def get_google_api_key() -> Optional[str]:
+    """Gets the Google API key from environment variables in priority order."""
+    return (
+        os.getenv("GOOGLE_API_KEY")
+        or os.getenv("GEMINI_API_KEY")
+        or os.getenv("GOOGLE_GENERATIVE_AI_API_KEY")
+    )
+
+
+def _create_openai(
+    model: str,
+    timeout: Optional[float] = None,
+    base_url: Optional[str] = None,
+    api_key_env: Optional[str] = None,
+) -> "BaseChatModel":
+    api_key_env = api_key_env or "OPENAI_API_KEY"
+    api_key = _api_key(api_key_env, base_url)
+    if not api_key:
+        raise click.ClickException(
+            f"Error: {api_key_env} environment variable not set."
+        )
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=model,
+        api_key=api_key,
+        temperature=0.7,
+        # Retries are left to ResilientChatModel, so --retries is the only
+        # retry policy.
+        max_retries=0,
+        **_timeout_kwargs("timeout", timeout),
+        **_base_url_kwargs(base_url),
+    )
+
+
+def _create_anthropic(
+    model: str,
+    timeout: Optional[float] = None,
+    base_url: Optional[str] = None,
+    api_key_env: Optional[str] = None,
+) -> "BaseChatModel":
+    api_key_env = api_key_env or "ANTHROPIC_API_KEY"
+    api_key = _api_key(api_key_env, base_url)
+    if not api_key:
+        raise click.ClickException(
+            f"Error: {api_key_env} environment variable not set."
+        )
+    from langchain_anthropic import ChatAnthropic
+
+    llm = ChatAnthropic(
+        model_name=model,
+        api_key=api_key,
+        temperature=0.7,
+        max_retries=0,
+        **_timeout_kwargs("default_request_timeout", timeout),
+        **_base_url_kwargs(base_url),
+    )
+    min_tokens = (
+        ANTHROPIC_HAIKU_MIN_CACHED_TOKENS
+        if "haiku" in model
+        else ANTHROPIC_MIN_CACHED_TOKENS
+    )
+    return cast("BaseChatModel", CacheBreakpointChatModel(llm, min_tokens))
+
+
+def _create_google(
+    model: str,
+    timeout: Optional[float] = None,
+    base_url: Optional[str] = None,
+    api_key_env: Optional[str] = None,
+) -> "BaseChatModel":
+    if base_url is not None:
+        raise click.ClickException("Error: Gemini models do not take a base_url.")
+    try:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+    except ImportError as e:
+        raise click.ClickException(
+            "Error: 'langchain-google-genai' is not installed. "
+            "Run 'pip install commitai[test]' or "
+            "'pip install langchain-google-genai'"
+        ) from e
+    google_api_key_str = os.getenv(api_key_env) if api_key_env else get_google_api_key()
+    if not google_api_key_str:
+        raise click.ClickException(
+            "Error: Google API Key not found. Set GOOGLE_API_KEY, "
+            "GEMINI_API_KEY, or GOOGLE_GENERATIVE_AI_API_KEY."
+        )
+    return ChatGoogleGenerativeAI(
+        model=model,
+        google_api_key=google_api_key_str,
+        temperature=0.7,
+        convert_system_message_to_human=True,
+        **_timeout_kwargs("timeout", timeout),
+    )
+
+
+def _create_ollama(
+    model: str,
+    timeout: Optional[float] = None,
+    base_url: Optional[str] = None,
+    api_key_env: Optional[str] = None,
+) -> "BaseChatModel":
+    # Ollama models (e.g., llama3, ollama/qwen2.5-coder)
+    from commitai import local
+
+    return cast("BaseChatModel", local.create_model(model, timeout, base_url))
+
+
+# The backends a model alias can name as its provider.
+_BACKENDS: Dict[str, Callable[..., "BaseChatModel"]] = {
+    "openai": _create_openai,
+    "anthropic": _create_anthropic,
+    "google": _create_google,
+    "ollama": _create_ollama,
+}
+
+
+register_provider("llama", _create_ollama)
+register_provider(MODEL_PREFIX, _create_ollama)
+register_provider("gemini-", _create_google)
+register_provider("claude-", _create_anthropic)
+register_provider("gpt-", _create_openai)
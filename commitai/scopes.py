@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Partitioning of staged changes by the scopes of a monorepo.
+
+Scope roots are glob patterns over leading directories: ``packages/*`` makes
+``packages/api`` and ``packages/web`` two scopes, named ``api`` and ``web``.
+Files under no root form one more scope, named ``root``.
+
+A change spanning several scopes is described from one summary per scope,
+requested concurrently and merged into a single multi-scope message, instead
+of from one prompt mixing every package. It can also be split into one commit
+per scope, which the CLI applies by restaging each scope's changes in turn.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from commitai.budget import fit_files
+from commitai.diff import DiffFile, render_diff
+from commitai.git import StagedPath
+from commitai.llm import ChatModel, PromptInput, generate_text, invoke_text
+from commitai.profiling import span
+from commitai.summarize import DEFAULT_WORKERS
+from commitai.template import build_scope_message, build_scope_summaries_message
+
+ROOT_SCOPE = "root"
+
+
+class Scope(NamedTuple):
+    # The directory of the scope, or "" for files under no scope root.
+    root: str
+    files: List[DiffFile]
+
+    @property
+    def name(self) -> str:
+        return self.root.rpartition("/")[2] or ROOT_SCOPE
+
+
+def parse_scope_patterns(value: Optional[str]) -> Tuple[str, ...]:
+    """Parses comma-separated scope roots such as ``packages/*,services/*``."""
+    patterns = (pattern.strip().strip("/") for pattern in (value or "").split(","))
+    return tuple(pattern for pattern in patterns if pattern)
+
+
+def scope_root(path: str, patterns: Sequence[str]) -> str:
+    """Returns the root of the first scope containing ``path``, or ``""``."""
+    parts = path.split("/")
+    for pattern in patterns:
+        pattern_parts = pattern.split("/")
+        # The root must be a directory, so the path needs more components.
+        if len(parts) > len(pattern_parts) and all(
+            fnmatchcase(part, pattern_part)
+            for part, pattern_part in zip(parts, pattern_parts)
+        ):
+            return "/".join(parts[: len(pattern_parts)])
+    return ""
+
+
+def partition(files: Sequence[DiffFile], patterns: Sequence[str]) -> List[Scope]:
+    """Groups ``files`` by scope, in the order the scopes first appear."""
+    scopes: Dict[str, List[DiffFile]] = {}
+    for diff_file in files:
+        scopes.setdefault(scope_root(diff_file.path, patterns), []).append(diff_file)
+    return [Scope(root, scope_files) for root, scope_files in scopes.items()]
+
+
+def partition_paths(
+    paths: Sequence[StagedPath], patterns: Sequence[str]
+) -> Dict[str, List[str]]:
+    """Groups staged paths by scope root, with the sources of their renames."""
+    scopes: Dict[str, List[str]] = {}
+    for staged in paths:
+        scope = scopes.setdefault(scope_root(staged.path, patterns), [])
+        scope.append(staged.path)
+        if staged.old_path != staged.path:
+            scope.append(staged.old_path)
+    return scopes
+
+
+def multi_scope_message(
+    llm: ChatModel,
+    scopes: Sequence[Scope],
+    build_reduce_prompt: Callable[[str], PromptInput],
+    budget: int,
+    explanation: str = "",
+    workers: int = DEFAULT_WORKERS,
+    on_token: Optional[Callable[[str], None]] = None,
+) -> str:
+    """Generates one message for changes spanning several ``scopes``.
+
+    Every scope is summarized concurrently from at most ``budget`` tokens of
+    its diff; ``build_reduce_prompt`` receives the summaries in place of the
+    diff and returns the final prompt, whose answer is streamed through
+    ``on_token``.
+    """
+
+    def summarize(scope: Scope) -> str:
+        fitted = fit_files(scope.files, budget, explanation)
+        prompt = build_scope_message(scope.name, render_diff(fitted.files))
+        with span("summarize_scope", scope=scope.name):
+            return invoke_text(llm, prompt)
+
+    workers = max(1, min(workers, len(scopes)))
+    with span("map"), ThreadPoolExecutor(max_workers=workers) as pool:
+        summaries = list(pool.map(summarize, scopes))
+    merged = build_scope_summaries_message(
+        [(scope.name, summary) for scope, summary in zip(scopes, summaries)]
+    )
+    with span("reduce"):
+        return generate_text(llm, build_reduce_prompt(merged), on_token)
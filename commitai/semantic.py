@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""Similarity cache of generated messages for near-identical diffs.
+
+The exact cache in :mod:`commitai.cache` misses as soon as a single line of
+the staged diff changes, which is the usual case when a commit is amended with
+a small fix. This cache embeds every diff locally as a hashed n-gram vector
+and finds the most similar diff seen before by cosine similarity, so that its
+message can be reused as a draft or shown to the model as a hint.
+
+NumPy is only imported by this module, which ``commitai.cli`` loads when the
+cache is enabled.
+"""
+
+import os
+import re
+import tempfile
+import zlib
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_MAX_ENTRIES = 256
+DIMENSIONS = 2048
+# Only the start of a huge diff is embedded, to bound the cost of a lookup.
+MAX_EMBEDDED_CHARS = 200_000
+# A new entry replaces any entry at least this similar to it.
+_DUPLICATE_SIMILARITY = 0.999
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_WORD = re.compile(r"\w")
+
+
+class SemanticMatch(NamedTuple):
+    message: str
+    similarity: float
+
+
+def _changed_lines(diff: str) -> List[str]:
+    lines = []
+    for line in diff.splitlines():
+        if line.startswith(("+++", "---")):
+            continue
+        if line.startswith(("+", "-")):
+            lines.append(line)
+        elif line.startswith("diff --git "):
+            lines.append("d" + line[10:])
+    return lines
+
+
+def embed(diff: str) -> "np.ndarray":
+    """Embeds the changed lines and file names of ``diff`` as a unit vector.
+
+    Every word and pair of adjacent tokens of a line, tagged with whether the
+    line was added or removed, is hashed into one of ``DIMENSIONS`` buckets
+    with a pseudo-random sign. Repeated features are damped logarithmically
+    and lone punctuation is skipped, so that boilerplate shared by every diff
+    does not dominate the similarity.
+    """
+    features: List[str] = []
+    for line in _changed_lines(diff[:MAX_EMBEDDED_CHARS]):
+        kind, tokens = line[0], _TOKEN.findall(line[1:])
+        features.extend(kind + token for token in tokens if _WORD.match(token))
+        features.extend(f"{kind}{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    hashes = np.fromiter(
+        (zlib.crc32(feature.encode()) for feature in features),
+        dtype=np.uint32,
+        count=len(features),
+    )
+    unique, counts = np.unique(hashes, return_counts=True)
+    weights = np.where(unique & 0x80000000, -1.0, 1.0) * (1 + np.log(counts))
+    vector = np.bincount(unique % DIMENSIONS, weights=weights, minlength=DIMENSIONS)
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).astype(np.float32)
+
+
+class SemanticCache:
+    """Bounded store of diff embeddings and their messages in one ``.npz`` file.
+
+    Vectors are stored as float16, so a full cache takes about a megabyte.
+    The oldest entries are evicted first.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        threshold: float = DEFAULT_THRESHOLD,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ) -> None:
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._embedded: Optional[Tuple[str, "np.ndarray"]] = None
+
+    @classmethod
+    def for_repo(
+        cls, git_dir: str, threshold: Optional[float] = None
+    ) -> "SemanticCache":
+        path = os.path.join(git_dir, "commitai", "semantic.npz")
+        return cls(path, DEFAULT_THRESHOLD if threshold is None else threshold)
+
+    def _vector(self, diff: str) -> "np.ndarray":
+        # find() and add() are called with the same diff; embed it once.
+        if self._embedded is None or self._embedded[0] != diff:
+            self._embedded = (diff, embed(diff))
+        return self._embedded[1]
+
+    def _load(self) -> Tuple["np.ndarray", List[str]]:
+        try:
+            with np.load(self.path) as data:
+                vectors = data["vectors"].astype(np.float32)
+                messages = [str(message) for message in data["messages"]]
+        except (OSError, KeyError, ValueError):
+            return np.zeros((0, DIMENSIONS), dtype=np.float32), []
+        if vectors.shape != (len(messages), DIMENSIONS):
+            return np.zeros((0, DIMENSIONS), dtype=np.float32), []
+        return vectors, messages
+
+    def find(self, diff: str) -> Optional[SemanticMatch]:
+        """Returns the message of the most similar earlier diff, if similar enough."""
+        vectors, messages = self._load()
+        if not messages:
+            return None
+        similarities = vectors @ self._vector(diff)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return SemanticMatch(messages[best], float(similarities[best]))
+
+    def add(self, diff: str, message: str) -> None:
+        vector = self._vector(diff)
+        vectors, messages = self._load()
+        keep = vectors @ vector < _DUPLICATE_SIMILARITY
+        vectors = np.vstack([vectors[keep], vector])[-self.max_entries :]
+        messages = [m for m, k in zip(messages, keep) if k] + [message]
+        messages = messages[-self.max_entries :]
+
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npz")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    vectors=vectors.astype(np.float16),
+                    messages=np.array(messages, dtype=str),
+                )
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def clear(self) -> int:
+        """Removes every entry and returns how many there were."""
+        entries = len(self._load()[1])
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        return entries
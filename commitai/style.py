@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Index of past commit messages used as style examples in the prompt.
+
+The messages of earlier commits and the paths they touched are stored under
+``.git/commitai/style`` as JSON lines. The index is brought up to date from
+``git log <last indexed>..HEAD``, so a run only reads the commits made since
+the previous one, and nothing at all when HEAD did not move.
+
+Examples are the messages of the commits whose paths overlap most with the
+staged files, counting shared directories as partial overlap, so a change to
+``src/api/`` is shown how earlier ``src/api/`` changes were described.
+"""
+
+import json
+import os
+import subprocess
+import tempfile
+from itertools import chain
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Set
+
+DEFAULT_STYLE_EXAMPLES = 3
+# Commits read when the index is first built, and kept afterwards.
+DEFAULT_MAX_COMMITS = 5000
+# Longer messages are cut, so one verbose commit cannot crowd the prompt.
+MAX_MESSAGE_CHARS = 1000
+
+_RECORD = "\x1e"
+_FIELD = "\x1f"
+
+
+class IndexedCommit(NamedTuple):
+    sha: str
+    message: str
+    paths: List[str]
+
+
+def _path_keys(paths: Sequence[str]) -> FrozenSet[str]:
+    """Returns the paths and every directory containing them."""
+    keys: Set[str] = set()
+    for path in paths:
+        parts = path.split("/")
+        keys.update("/".join(parts[:end]) for end in range(1, len(parts) + 1))
+    return frozenset(keys)
+
+
+def _read_log(revisions: Sequence[str], max_commits: int) -> List[IndexedCommit]:
+    """Returns the non-merge commits of ``revisions``, oldest first."""
+    output = subprocess.check_output(
+        [
+            "git",
+            "-c",
+            "core.quotePath=false",
+            "log",
+            "--no-merges",
+            "--name-only",
+            f"--max-count={max_commits}",
+            f"--format={_RECORD}%H{_FIELD}%B{_FIELD}",
+            *revisions,
+            "--",
+        ],
+        stderr=subprocess.DEVNULL,
+    ).decode("utf-8", errors="replace")
+    commits = []
+    for record in output.split(_RECORD):
+        sha, _, rest = record.partition(_FIELD)
+        message, _, names = rest.partition(_FIELD)
+        message = message.strip()
+        if not sha or not message:
+            continue
+        paths = [name for name in names.splitlines() if name]
+        commits.append(IndexedCommit(sha, message[:MAX_MESSAGE_CHARS], paths))
+    commits.reverse()
+    return commits
+
+
+class StyleIndex:
+    def __init__(self, directory: str, max_commits: int = DEFAULT_MAX_COMMITS):
+        self.directory = directory
+        self.max_commits = max_commits
+        self._commits: Optional[List[IndexedCommit]] = None
+
+    @classmethod
+    def for_repo(cls, git_dir: str) -> "StyleIndex":
+        return cls(os.path.join(git_dir, "commitai", "style"))
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, "index.jsonl")
+
+    @property
+    def _head_path(self) -> str:
+        return os.path.join(self.directory, "head")
+
+    def indexed_head(self) -> Optional[str]:
+        """Returns the commit the index was last updated to."""
+        try:
+            with open(self._head_path, encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def commits(self) -> List[IndexedCommit]:
+        """Returns the indexed commits, oldest first."""
+        if self._commits is None:
+            commits: Dict[str, IndexedCommit] = {}
+            try:
+                with open(self._index_path, encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                            commit = IndexedCommit(
+                                entry["sha"], entry["message"], entry["paths"]
+                            )
+                        except (ValueError, KeyError, TypeError):
+                            continue
+                        commits[commit.sha] = commit
+            except OSError:
+                pass
+            self._commits = list(commits.values())
+        return self._commits
+
+    def update(self, head: Optional[str]) -> int:
+        """Indexes the commits up to ``head`` and returns how many were new."""
+        if head is None:
+            return 0
+        last = self.indexed_head()
+        if head == last:
+            return 0
+        try:
+            new = _read_log([f"{last}..{head}"] if last else [head], self.max_commits)
+        except subprocess.CalledProcessError:
+            # The last indexed commit is gone, e.g. after a rebase and gc.
+            new = _read_log([head], self.max_commits)
+
+        commits = self.commits()
+        known = {commit.sha for commit in commits}
+        new = [commit for commit in new if commit.sha not in known]
+        commits.extend(new)
+        os.makedirs(self.directory, exist_ok=True)
+        if len(commits) > 2 * self.max_commits:
+            del commits[: len(commits) - self.max_commits]
+            self._write_atomically(self._index_path, _dump(commits))
+        elif new:
+            with open(self._index_path, "a", encoding="utf-8") as f:
+                f.write(_dump(new))
+        self._write_atomically(self._head_path, head)
+        return len(new)
+
+    def _write_atomically(self, path: str, content: str) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def examples(self, paths: Sequence[str], count: int) -> List[str]:
+        """Returns up to ``count`` messages of commits touching similar paths.
+
+        Commits are ranked by the Jaccard similarity of their paths and
+        directories with those of ``paths``, newer commits first on ties.
+        When too few commits overlap, the most recent messages fill in.
+        """
+        if count <= 0:
+            return []
+        staged = _path_keys(paths)
+        ranked = []
+        for position, commit in enumerate(self.commits()):
+            keys = _path_keys(commit.paths)
+            shared = len(staged & keys)
+            if shared:
+                score = shared / (len(staged) + len(keys) - shared)
+                ranked.append((score, position, commit.message))
+        ranked.sort(reverse=True)
+        recent = (commit.message for commit in reversed(self.commits()))
+
+        messages: List[str] = []
+        for message in chain((message for _, _, message in ranked), recent):
+            if message not in messages:
+                messages.append(message)
+                if len(messages) == count:
+                    break
+        return messages
+
+    def clear(self) -> int:
+        """Removes the index and returns how many commits it held."""
+        indexed = len(self.commits())
+        for path in (self._index_path, self._head_path):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self._commits = None
+        return indexed
+
+
+def _dump(commits: Sequence[IndexedCommit]) -> str:
+    return "".join(json.dumps(commit._asdict()) + "\n" for commit in commits)
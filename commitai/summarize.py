@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Map-reduce commit message generation for diffs too large for one call.
+
+The staged diff is split per file and hunk into chunks, every chunk is
+summarized concurrently (map), and a final call turns the summaries into the
+conventional commit message (reduce).
+"""
+
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from commitai.diff import DiffFile, chunk_files
+from commitai.llm import ChatModel, PromptInput, generate_text, invoke_text
+from commitai.profiling import span
+from commitai.template import build_chunk_message, build_summaries_message
+
+# Diffs longer than this (in characters) are summarized in chunks.
+DEFAULT_MAP_REDUCE_THRESHOLD = 100_000
+DEFAULT_CHUNK_SIZE = 40_000
+DEFAULT_WORKERS = 4
+
+
+def summarize_chunks(
+    llm: ChatModel, chunks: List[str], workers: int = DEFAULT_WORKERS
+) -> List[str]:
+    """Summarizes every chunk concurrently, preserving the chunk order."""
+    # Imported here: concurrent.futures imports logging, which slows down
+    # every start of the CLI.
+    from concurrent.futures import ThreadPoolExecutor
+
+    total = len(chunks)
+
+    def summarize(indexed: Tuple[int, str]) -> str:
+        index, chunk = indexed
+        with span("summarize_chunk", index=index, chars=len(chunk)):
+            return invoke_text(llm, build_chunk_message(index + 1, total, chunk))
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, total))) as pool:
+        return list(pool.map(summarize, enumerate(chunks)))
+
+
+def map_reduce_message(
+    llm: ChatModel,
+    files: Sequence[DiffFile],
+    build_reduce_prompt: Callable[[str], PromptInput],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: int = DEFAULT_WORKERS,
+    on_token: Optional[Callable[[str], None]] = None,
+) -> str:
+    """Generates a commit message for the parsed ``files`` through summaries.
+
+    ``build_reduce_prompt`` receives the combined chunk summaries in place of
+    the diff and returns the final prompt, so the reduce step uses the same
+    system message, template and explanation as a single-shot generation.
+    Only the reduce step is streamed through ``on_token``.
+    """
+    with span("map"):
+        summaries = summarize_chunks(llm, chunk_files(files, chunk_size), workers)
+    reduce_prompt = build_reduce_prompt(build_summaries_message(summaries))
+    with span("reduce"):
+        return generate_text(llm, reduce_prompt, on_token)
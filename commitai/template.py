@@ -23,3 +23,75 @@ adding_template = " The message should follow this template: "
 
 def build_user_message(explanation, diff):
     return f"Here is a high-level explanation of the commit: {explanation}\n\n{diff}"
+
+
+def build_similar_message_hint(message):
+    return (
+        "A very similar change was previously committed with the message below. "
+        "Keep its wording where it still applies and change what the diff above "
+        f"does differently:\n\n{message}"
+    )
+
+
+def build_style_examples(messages):
+    examples = "\n\n".join(f"---\n{message}" for message in messages)
+    return (
+        "Earlier commits of this repository that touched the same files had the "
+        "messages below. Follow their style (type and scope names, tone, length, "
+        f"body layout), not their content:\n\n{examples}\n---"
+    )
+
+
+def build_truncation_notice(truncated):
+    omitted = ", ".join(f"{path} ({size} bytes)" for path, size in truncated)
+    return (
+        "Note: the diff above was truncated to fit the size budget, so the "
+        f"following files are incomplete or missing: {omitted}. "
+        "Describe them only as far as the visible changes allow."
+    )
+
+
+chunk_summary_instructions = (
+    "You are helping to write a git commit message for a large change. "
+    "Summarize the following part of a git diff in a few concise bullet points. "
+    "Name the files touched and describe what changed and why it likely changed. "
+    "Do not write a commit message yet and do not include code blocks."
+)
+
+
+def build_chunk_message(index, total, chunk):
+    return f"{chunk_summary_instructions}\n\nPart {index} of {total}:\n\n{chunk}"
+
+
+def build_summaries_message(summaries):
+    parts = "\n\n".join(
+        f"Part {index}:\n{summary}" for index, summary in enumerate(summaries, 1)
+    )
+    return (
+        "The staged diff was too large to include directly. "
+        f"Here are summaries of each part of it:\n\n{parts}"
+    )
+
+
+scope_summary_instructions = (
+    "You are helping to write a git commit message for a change to a monorepo. "
+    "Summarize the following changes to one of its scopes in a few concise "
+    "bullet points: what changed and why it likely changed. "
+    "Do not write a commit message yet and do not include code blocks."
+)
+
+
+def build_scope_message(scope, diff):
+    return f"{scope_summary_instructions}\n\nScope: {scope}\n\n{diff}"
+
+
+def build_scope_summaries_message(summaries):
+    parts = "\n\n".join(f"Scope {scope}:\n{summary}" for scope, summary in summaries)
+    scopes = ",".join(scope for scope, _ in summaries)
+    return (
+        "The staged changes span several scopes of a monorepo. Here are "
+        f"summaries of the changes to each of them:\n\n{parts}\n\n"
+        "Write one commit message covering every scope: name them all in the "
+        f"header, e.g. <type>({scopes}): <subject>, and give each scope its own "
+        "paragraph or bullet points in the body."
+    )
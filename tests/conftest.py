@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import os
+from unittest.mock import patch
+
+import pytest
+
+from commitai.config import SETTINGS
+
+
+@pytest.fixture(autouse=True)
+def fresh_model_cache():
+    """Keeps memoized chat model clients from leaking between tests."""
+    with patch.dict("commitai.providers._MODEL_CACHE", clear=True):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def no_daemon(tmp_path, monkeypatch):
+    """Keeps a daemon running on the developer's machine out of the tests."""
+    monkeypatch.setenv("COMMITAI_SOCKET", str(tmp_path / "commitai.sock"))
+
+
+@pytest.fixture(autouse=True)
+def no_user_config(tmp_path, monkeypatch):
+    """Keeps the developer's configuration files out of the tests.
+
+    Every test resolves its own configuration, compiled into its own cache.
+    """
+    monkeypatch.setenv("COMMITAI_CONFIG", str(tmp_path / "missing-config.toml"))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    for name in os.environ:
+        if name.startswith("COMMITAI_") and name[9:].lower() in SETTINGS:
+            monkeypatch.delenv(name)
+    monkeypatch.delenv("TEMPLATE_COMMIT", raising=False)
+    with (
+        patch("commitai.config._CONFIG", None),
+        patch("commitai.providers._ALIASES", None),
+    ):
+        yield
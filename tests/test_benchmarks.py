@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import json
+
+from benchmarks.run import METRICS, compare, main
+
+
+def test_benchmark_smoke_run(tmp_path, capsys):
+    """Test the small scenario runs end to end with the fake model."""
+    baseline_path = tmp_path / "baseline.json"
+
+    exit_code = main(
+        ["-s", "small", "-n", "1", "--save-baseline", "--baseline", str(baseline_path)]
+    )
+
+    assert exit_code == 0
+    results = json.loads(baseline_path.read_text())
+    assert set(results) == {"small"}
+    assert set(results["small"]) == set(METRICS)
+    assert all(value > 0 for value in results["small"].values())
+    assert "small" in capsys.readouterr().out
+
+    assert compare(results, results) == []
+    faster = {"small": {name: value / 4 for name, value in results["small"].items()}}
+    regressions = compare(results, faster)
+    assert any(line.startswith("small.peak_rss_mb:") for line in regressions)
+
+
+def test_compare_ignores_noise_and_unknown_metrics():
+    baseline = {"small": {"generate_s": 0.001, "peak_rss_mb": 50.0}}
+    results = {"small": {"generate_s": 0.004, "peak_rss_mb": 70.0, "new_s": 1.0}}
+
+    assert compare(results, baseline) == [
+        "small.peak_rss_mb: 70.0000 vs baseline 50.0000 (+40%)"
+    ]
+    assert compare(results, baseline, tolerance=0.5) == []
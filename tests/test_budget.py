@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+from commitai.budget import (
+    DEFAULT_CONTEXT_WINDOW,
+    RESERVED_OUTPUT_TOKENS,
+    context_window,
+    estimate_tokens,
+    fit_files,
+    prompt_budget,
+    relevance,
+)
+from commitai.diff import parse_diff, render_diff
+
+
+def _file(path: str, hunks: int = 1, lines: int = 1, status: str = "") -> str:
+    header = f"diff --git a/{path} b/{path}\n{status}--- a/{path}\n+++ b/{path}\n"
+    body = "".join(
+        f"@@ -{i * 100},{lines} +{i * 100},{lines} @@\n"
+        + "".join(f"+{path} line {n}\n" for n in range(lines))
+        for i in range(1, hunks + 1)
+    )
+    return header + body
+
+
+def test_context_window_by_prefix():
+    assert context_window("gpt-4o-mini") == 128_000
+    assert context_window("gpt-4") == 8_192
+    assert context_window("claude-3-5-sonnet-latest") == 200_000
+    assert context_window("gemini-2.5-pro-preview-03-25") == 1_048_576
+    assert context_window("llama3.1:8b") == 131_072
+    assert context_window("llama3") == 8_192
+    assert context_window("ollama/llama3.1") == 131_072
+    assert context_window("mystery") == DEFAULT_CONTEXT_WINDOW
+
+
+def test_prompt_budget():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 2
+    assert prompt_budget("gpt-4", "x" * 300) == 8_192 - RESERVED_OUTPUT_TOKENS - 100
+    assert prompt_budget("gpt-4", window=2_000) == 2_000 - RESERVED_OUTPUT_TOKENS
+    assert prompt_budget("gpt-4", window=10) == 0
+
+
+def test_relevance_prefers_source_files():
+    source, test, docs, deleted = parse_diff(
+        _file("src/app.py")
+        + _file("tests/app_check.py")
+        + _file("README.md")
+        + _file("old.py", status="deleted file mode 100644\n")
+    )
+    assert relevance(source) > relevance(test) > relevance(docs)
+    assert relevance(deleted) < relevance(source)
+    assert relevance(docs, "Rewrite the readme") > relevance(docs)
+
+
+def test_fit_files_keeps_diff_that_fits():
+    files = parse_diff(_file("a.py") + _file("b.py"))
+    fitted = fit_files(files, 10_000)
+    assert fitted.files == files
+    assert fitted.truncated == []
+
+
+def test_fit_files_shares_budget_by_relevance():
+    small = _file("small.py")
+    files = parse_diff(
+        small + _file("big.py", hunks=20, lines=20) + _file("x.md", 20, 20)
+    )
+    budget = 1_000
+
+    fitted = fit_files(files, budget)
+
+    assert estimate_tokens(render_diff(fitted.files)) <= budget
+    assert [f.path for f in fitted.files] == ["small.py", "big.py", "x.md"]
+    # Small files are kept whole; the rest is shared by relevance.
+    assert fitted.files[0].text == small
+    big, docs = fitted.files[1:]
+    assert 0 < len(docs.hunks) < len(big.hunks) < 20
+    assert [t.path for t in fitted.truncated] == ["big.py", "x.md"]
+    omitted = sum(t.omitted_bytes for t in fitted.truncated)
+    assert omitted == len(render_diff(files)) - len(render_diff(fitted.files))
+
+
+def test_fit_files_cuts_a_single_large_hunk_at_a_line():
+    (big,) = parse_diff(_file("big.py", lines=500))
+    fitted = fit_files([big], 500)
+    (trimmed,) = fitted.files
+    assert estimate_tokens(trimmed.text) <= 500
+    assert trimmed.text.endswith("\n")
+    assert big.text.startswith(trimmed.text)
+
+
+def test_fit_files_drops_least_relevant_files_when_headers_do_not_fit():
+    files = parse_diff(_file("app.py", lines=50) + _file("notes.md", lines=50))
+    budget = estimate_tokens(files[0].header) + 20
+
+    fitted = fit_files(files, budget)
+
+    assert [f.path for f in fitted.files] == ["app.py"]
+    assert [t.path for t in fitted.truncated] == ["app.py", "notes.md"]
+    assert fitted.truncated[1].omitted_bytes == len(files[1].text)
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import os
+from unittest.mock import MagicMock
+
+from commitai.cache import MessageCache
+
+
+def _set_mtime(cache: MessageCache, key: str, mtime: int) -> None:
+    os.utime(os.path.join(cache.directory, key + ".txt"), (mtime, mtime))
+
+
+def test_key_depends_on_every_field():
+    base = MessageCache.key("gpt-4", "system", "template", "why", "diff")
+    assert base == MessageCache.key("gpt-4", "system", "template", "why", "diff")
+    assert base != MessageCache.key("gpt-4o", "system", "template", "why", "diff")
+    assert base != MessageCache.key("gpt-4", "system", None, "why", "diff")
+    assert base != MessageCache.key("gpt-4", "system", "template", "", "diff")
+    assert base != MessageCache.key("gpt-4", "system", "template", "why", "diff2")
+    assert base != MessageCache.key(
+        "gpt-4", "system", "template", "why", "diff", ["packages/*"]
+    )
+    assert MessageCache.key("m", "s", "ab", "", "d") != MessageCache.key(
+        "m", "s", "a", "b", "d"
+    )
+
+
+def test_get_and_put_round_trip(tmp_path):
+    cache = MessageCache(str(tmp_path / "cache"))
+    assert cache.get("missing") is None
+    cache.put("k1", "feat: add cache")
+    assert cache.get("k1") == "feat: add cache"
+    assert cache.stats().entries == 1
+
+
+def test_for_repo_uses_git_dir(tmp_path):
+    repo = MagicMock(git_dir=str(tmp_path / ".git"))
+    cache = MessageCache.for_repo(repo)
+    assert cache.directory == str(tmp_path / ".git" / "commitai" / "cache")
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = MessageCache(str(tmp_path), max_bytes=25)
+    cache.put("old", "x" * 10)
+    cache.put("used", "y" * 10)
+    _set_mtime(cache, "old", 1_000)
+    _set_mtime(cache, "used", 2_000)
+    # Reading refreshes the entry, so "old" becomes the eviction candidate.
+    assert cache.get("old") == "x" * 10
+    cache.put("new", "z" * 10)
+
+    assert cache.get("used") is None
+    assert cache.get("old") == "x" * 10
+    assert cache.get("new") == "z" * 10
+    stats = cache.stats()
+    assert stats.entries == 2
+    assert stats.total_bytes == 20
+
+
+def test_clear(tmp_path):
+    cache = MessageCache(str(tmp_path / "cache"))
+    assert cache.clear() == 0
+    cache.put("a", "one")
+    cache.put("b", "two")
+    assert cache.clear() == 2
+    assert cache.stats().entries == 0
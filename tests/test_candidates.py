@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+
+from commitai.candidates import (
+    Candidate,
+    fan_out,
+    format_alternatives,
+    strip_comments,
+)
+
+
+def _after(delay, message):
+    def job():
+        time.sleep(delay)
+        return message
+
+    return job
+
+
+def test_fan_out_runs_jobs_concurrently():
+    jobs = [(f"m{i}", _after(0.2, f"message {i}")) for i in range(3)]
+
+    start = time.perf_counter()
+    candidates = fan_out(jobs)
+
+    assert time.perf_counter() - start < 0.5
+    assert candidates == [Candidate(f"m{i}", f"message {i}") for i in range(3)]
+
+
+def test_fan_out_first_returns_fastest():
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return "slow"
+
+    try:
+        candidates = fan_out([("a", slow), ("b", _after(0, "fast"))], first=True)
+    finally:
+        release.set()
+
+    assert candidates == [Candidate("b", "fast")]
+
+
+def test_fan_out_reports_failures_and_drops_duplicates():
+    def fail():
+        raise ValueError("boom")
+
+    errors = []
+    candidates = fan_out(
+        [("a", lambda: "same\n"), ("b", fail), ("c", lambda: "same")],
+        on_error=lambda model, error: errors.append((model, str(error))),
+    )
+
+    assert candidates == [Candidate("a", "same\n")]
+    assert errors == [("b", "boom")]
+
+
+def test_fan_out_raises_when_every_job_fails():
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError, match="boom"):
+        fan_out([("a", fail), ("b", fail)], first=True)
+
+
+def test_alternatives_are_stripped_after_editing():
+    alternatives = format_alternatives([Candidate("gpt-4o", "fix: b\n\nBody")])
+    text = "feat: a\n" + alternatives
+
+    assert "# --- Candidate 2 (gpt-4o) ---\n# fix: b\n#\n# Body" in alternatives
+    assert strip_comments(text) == "feat: a"
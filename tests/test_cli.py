@@ -1,8 +1,13 @@
 # File: commitai/tests/test_cli.py
 # -*- coding: utf-8 -*-
+import json
 import os
-from unittest.mock import MagicMock, mock_open, patch
+import subprocess
+import sys
+import threading
+from unittest.mock import ANY, MagicMock, PropertyMock, mock_open, patch
 
+import click
 import pytest
 from click import UsageError
 from click.testing import CliRunner
@@ -13,8 +18,24 @@ from langchain_google_genai import (
 from langchain_ollama import ChatOllama
 from langchain_openai import ChatOpenAI
 
-from commitai.cli import cli
-from commitai.template import adding_template
+from commitai.cache import MessageCache
+from commitai.cli import (
+    _GenerationSettings,
+    _hook_message,
+    _produce_message,
+    _StagedChanges,
+    cli,
+)
+from commitai.compact import Compaction
+from commitai.config import Config
+from commitai.diff import parse_diff
+from commitai.filters import FilteredFile
+from commitai.git import TruncatedFile
+from commitai.llm import TokenUsage
+from commitai.local import OllamaError
+from commitai.providers import _MODEL_CACHE
+from commitai.semantic import SemanticMatch
+from commitai.template import adding_template, default_system_message
 
 
 # Fixture to mock external dependencies for generate_message
@@ -30,29 +51,23 @@ def mock_generate_deps(tmp_path):
 
     with (
         patch(
-            "commitai.cli.ChatGoogleGenerativeAI",
+            "langchain_google_genai.ChatGoogleGenerativeAI",
             spec=ActualChatGoogleGenerativeAI,
-            create=True,
         ) as mock_google_class_in_cli,
-        patch("commitai.cli.ChatOpenAI", spec=ChatOpenAI) as mock_openai_class,
-        patch("commitai.cli.ChatAnthropic", spec=ChatAnthropic) as mock_anthropic_class,
-        patch("commitai.cli.ChatOllama", spec=ChatOllama) as mock_ollama_class,
+        patch("langchain_openai.ChatOpenAI", spec=ChatOpenAI) as mock_openai_class,
+        patch(
+            "langchain_anthropic.ChatAnthropic", spec=ChatAnthropic
+        ) as mock_anthropic_class,
+        patch("langchain_ollama.ChatOllama", spec=ChatOllama) as mock_ollama_class,
         patch("commitai.cli.stage_all_changes") as mock_stage,
         patch("commitai.cli.run_pre_commit_hook", return_value=True) as mock_hook,
-        patch(
-            "commitai.cli.get_staged_changes_diff", return_value="Staged changes diff"
-        ) as mock_diff,
-        patch(
-            "commitai.cli.get_repository_name", return_value=str(fake_repo_path)
-        ) as mock_repo,
-        patch(
-            "commitai.cli.get_current_branch_name", return_value="main"
-        ) as mock_branch,
+        patch("commitai.cli.RepoContext") as mock_repo_class,
+        patch("commitai.cli.MessageCache") as mock_cache_class,
         patch("commitai.cli.create_commit") as mock_commit,
         patch("click.edit") as mock_edit,
         patch("click.clear"),
         patch(
-            "commitai.cli._get_google_api_key", return_value="fake_google_key"
+            "commitai.providers.get_google_api_key", return_value="fake_google_key"
         ) as mock_get_google_key,
         patch("os.getenv") as mock_getenv,
         patch("os.makedirs") as mock_makedirs,
@@ -61,6 +76,23 @@ def mock_generate_deps(tmp_path):
     ):  # Mock os.path.exists
         mock_path_exists.return_value = False
 
+        mock_repo = mock_repo_class.return_value
+        mock_repo.toplevel = str(fake_repo_path)
+        mock_repo.git_dir = str(fake_git_dir)
+        mock_repo.branch = "main"
+        mock_repo.truncated_files = []
+        mock_repo.filtered_files = []
+        mock_repo.compaction = None
+        # No commits yet, so the style index has nothing to read.
+        mock_repo.head_sha = None
+        mock_cache = mock_cache_class.for_repo.return_value
+        mock_cache.get.return_value = None
+        mock_diff = PropertyMock(return_value="Staged changes diff")
+        type(mock_repo).staged_diff = mock_diff
+        type(mock_repo).diff_files = PropertyMock(
+            side_effect=lambda: parse_diff(mock_diff())
+        )
+
         mock_openai_instance = mock_openai_class.return_value
         mock_anthropic_instance = mock_anthropic_class.return_value
         mock_google_instance = mock_google_class_in_cli.return_value
@@ -105,7 +137,8 @@ def mock_generate_deps(tmp_path):
             "hook": mock_hook,
             "diff": mock_diff,
             "repo": mock_repo,
-            "branch": mock_branch,
+            "repo_class": mock_repo_class,
+            "cache": mock_cache,
             "commit": mock_commit,
             "edit": mock_edit,
             "getenv": mock_getenv,
@@ -119,6 +152,18 @@ def mock_generate_deps(tmp_path):
         }
 
 
+def _input_text(prompt):
+    """Returns the text of a model input: a string or chat messages."""
+    if isinstance(prompt, str):
+        return prompt
+    return "\n\n".join(message["content"] for message in prompt)
+
+
+def _prompt_text(call):
+    """Returns the text of the prompt a mocked model was invoked with."""
+    return _input_text(call.kwargs["input"])
+
+
 # --- Test generate command ---
 
 
@@ -144,7 +189,7 @@ def test_generate_default_gemini(mock_generate_deps):
     )
     call_args = mock_generate_deps["google_instance"].invoke.call_args
     assert call_args is not None
-    prompt = call_args.kwargs["input"]
+    prompt = _prompt_text(call_args)
     assert adding_template not in prompt
 
     mock_generate_deps["google_instance"].invoke.assert_called_once()
@@ -159,6 +204,452 @@ def test_generate_default_gemini(mock_generate_deps):
     mock_generate_deps["commit"].assert_called_once_with("Generated commit message")
 
 
+def test_generate_reports_truncated_diff(mock_generate_deps):
+    """Test the prompt mentions files cut by the diff byte budget."""
+    runner = CliRunner()
+    mock_generate_deps[
+        "file_open"
+    ].return_value.read.return_value = "Generated commit message"
+    mock_generate_deps["repo"].truncated_files = [TruncatedFile("big.lock", 2048)]
+
+    result = runner.invoke(
+        cli, ["generate", "--max-diff-bytes", "1000", "--max-diff-tokens", "100"]
+    )
+
+    assert result.exit_code == 0, result.output
+    mock_generate_deps["repo_class"].assert_called_once_with(
+        300, filter_noise=True, compact=True
+    )
+    prompt = _prompt_text(mock_generate_deps["google_instance"].invoke.call_args)
+    assert "big.lock (2048 bytes)" in prompt
+
+
+def test_generate_reports_filtered_files(mock_generate_deps):
+    """Test the bytes saved by the noise filter are reported."""
+    runner = CliRunner()
+    mock_generate_deps["repo"].filtered_files = [
+        FilteredFile("package-lock.json", "lockfile", 900, 800, 40_000),
+        FilteredFile("logo.png", "binary file", 0, 0, 120),
+    ]
+
+    result = runner.invoke(cli, ["generate", "-c"])
+
+    assert result.exit_code == 0, result.output
+    assert "Summarized 2 noisy file(s) (package-lock.json, logo.png)" in (result.output)
+    assert "saving 40,120 bytes (~13,373 tokens)" in result.output
+
+
+def test_generate_no_filter(mock_generate_deps):
+    """Test --no-filter reads the staged diff unfiltered."""
+    runner = CliRunner()
+    result = runner.invoke(cli, ["generate", "-c", "--no-filter"])
+
+    assert result.exit_code == 0, result.output
+    mock_generate_deps["repo_class"].assert_called_once_with(
+        400_000, filter_noise=False, compact=True
+    )
+
+
+def test_generate_reports_compaction(mock_generate_deps):
+    """Test the bytes saved by compacting the diff are reported."""
+    runner = CliRunner()
+    mock_generate_deps["repo"].compaction = Compaction(40_000, 10_000, 12, 3, 1)
+
+    result = runner.invoke(cli, ["generate", "-c"])
+
+    assert result.exit_code == 0, result.output
+    assert (
+        "Compacted the diff to 25% of its size (12 unchanged move(s), "
+        "3 whitespace-only hunk(s), 1 line(s) of context), saving 30,000 bytes"
+    ) in result.output
+
+
+def test_generate_no_compact(mock_generate_deps):
+    """Test --no-compact reads the staged diff as git prints it."""
+    runner = CliRunner()
+    result = runner.invoke(cli, ["generate", "-c", "--no-compact"])
+
+    assert result.exit_code == 0, result.output
+    mock_generate_deps["repo_class"].assert_called_once_with(
+        400_000, filter_noise=True, compact=False
+    )
+
+
+def test_generate_options_default_to_configuration(mock_generate_deps, monkeypatch):
+    """Test configured settings replace the built-in option defaults."""
+    monkeypatch.setenv("COMMITAI_MAX_DIFF_BYTES", "1000")
+    monkeypatch.setenv("COMMITAI_COMPACT", "false")
+    runner = CliRunner()
+    result = runner.invoke(cli, ["generate", "-c", "--max-diff-bytes", "500"])
+
+    assert result.exit_code == 0, result.output
+    mock_generate_deps["repo_class"].assert_called_once_with(
+        500, filter_noise=True, compact=False
+    )
+
+
+def test_generate_fits_prompt_to_context_window(mock_generate_deps):
+    """Test the diff is trimmed to fit --context-window."""
+    runner = CliRunner()
+    mock_generate_deps["diff"].return_value = (
+        "diff --git a/app.py b/app.py\n@@ -1 +1 @@\n-a\n+b\n"
+        "diff --git a/data.py b/data.py\n@@ -1,3000 +1,3000 @@\n"
+        + "+generated line\n"
+        * 3000
+    )
+
+    result = runner.invoke(cli, ["generate", "-c", "--context-window", "4000"])
+
+    assert result.exit_code == 0, result.output
+    prompt = _prompt_text(mock_generate_deps["google_instance"].invoke.call_args)
+    assert "diff --git a/app.py b/app.py\n@@ -1 +1 @@\n-a\n+b\n" in prompt
+    assert "following files are incomplete or missing: data.py (" in prompt
+    assert len(prompt) < 4000 * 3
+
+
+def test_generate_large_diff_uses_map_reduce(mock_generate_deps):
+    """Test diffs above the threshold are summarized chunk by chunk."""
+    runner = CliRunner()
+    mock_generate_deps["diff"].return_value = "".join(
+        f"diff --git a/f{i} b/f{i}\n@@ -1 +1 @@\n-a\n+b\n" for i in range(3)
+    )
+    mock_generate_deps[
+        "file_open"
+    ].return_value.read.return_value = "Generated commit message"
+
+    result = runner.invoke(
+        cli, ["generate", "--map-reduce-threshold", "10", "--workers", "2"]
+    )
+
+    assert result.exit_code == 0, result.output
+    invoke = mock_generate_deps["google_instance"].invoke
+    assert invoke.call_count == 2
+    reduce_prompt = _prompt_text(invoke.call_args)
+    assert "Here are summaries of each part" in reduce_prompt
+    mock_generate_deps["commit"].assert_called_once_with("Generated commit message")
+
+
+def test_generate_uses_cached_message(mock_generate_deps):
+    """Test a cache hit skips the model and commits the cached message."""
+    runner = CliRunner()
+    mock_generate_deps["cache"].get.return_value = "Cached commit message"
+
+    result = runner.invoke(cli, ["generate", "-c", "Test explanation"])
+
+    assert result.exit_code == 0, result.output
+    assert "Reusing cached message" in result.output
+    mock_generate_deps["google_instance"].invoke.assert_not_called()
+    mock_generate_deps["cache"].put.assert_not_called()
+    mock_generate_deps["commit"].assert_called_once_with("Cached commit message")
+
+
+def test_generate_stores_message_in_cache(mock_generate_deps):
+    """Test a cache miss stores the generated message."""
+    runner = CliRunner()
+    result = runner.invoke(cli, ["generate", "-c", "Test explanation"])
+
+    assert result.exit_code == 0, result.output
+    key = mock_generate_deps["cache"].get.call_args.args[0]
+    mock_generate_deps["cache"].put.assert_called_once_with(
+        key, "Generated commit message"
+    )
+
+
+def test_generate_cache_key_covers_prompt_settings(mock_generate_deps):
+    """Test settings that change the prompt also change the cache key."""
+    runner = CliRunner()
+    keys = set()
+    with patch("commitai.cli.MessageCache.key", side_effect=MessageCache.key):
+        for args in ([], ["--scopes", "packages/*"], ["--context-window", "8000"]):
+            result = runner.invoke(cli, ["generate", "-c", *args, "Explanation"])
+            assert result.exit_code == 0, result.output
+            keys.add(mock_generate_deps["cache"].get.call_args.args[0])
+
+    assert len(keys) == 3
+
+
+def test_generate_no_cache_flag(mock_generate_deps):
+    """Test --no-cache bypasses the message cache entirely."""
+    runner = CliRunner()
+    mock_generate_deps["cache"].get.return_value = "Cached commit message"
+
+    result = runner.invoke(cli, ["generate", "-c", "--no-cache", "Test explanation"])
+
+    assert result.exit_code == 0, result.output
+    mock_generate_deps["cache"].get.assert_not_called()
+    mock_generate_deps["cache"].put.assert_not_called()
+    mock_generate_deps["commit"].assert_called_once_with("Generated commit message")
+
+
+def test_generate_semantic_cache_draft(mock_generate_deps):
+    """Test --semantic-cache draft reuses the message of a similar diff."""
+    runner = CliRunner()
+    with patch("commitai.semantic.SemanticCache") as mock_semantic_class:
+        semantic = mock_semantic_class.for_repo.return_value
+        semantic.find.return_value = SemanticMatch("fix: similar change", 0.97)
+        result = runner.invoke(
+            cli,
+            [
+                "generate",
+                "-c",
+                "--semantic-cache",
+                "draft",
+                "--semantic-threshold",
+                "0.95",
+            ],
+        )
+
+    assert result.exit_code == 0, result.output
+    assert "Reusing the message of a 97% similar diff." in result.output
+    mock_semantic_class.for_repo.assert_called_once_with(
+        mock_generate_deps["repo"].git_dir, 0.95
+    )
+    mock_generate_deps["google_instance"].invoke.assert_not_called()
+    mock_generate_deps["commit"].assert_called_once_with("fix: similar change")
+
+
+def test_generate_semantic_cache_hint(mock_generate_deps):
+    """Test --semantic-cache hint shows the similar message to the model."""
+    runner = CliRunner()
+    with patch("commitai.semantic.SemanticCache") as mock_semantic_class:
+        semantic = mock_semantic_class.for_repo.return_value
+        semantic.find.return_value = SemanticMatch("fix: similar change", 0.97)
+        result = runner.invoke(cli, ["generate", "-c", "--semantic-cache", "hint"])
+
+    assert result.exit_code == 0, result.output
+    prompt = _prompt_text(mock_generate_deps["google_instance"].invoke.call_args)
+    assert "A very similar change was previously committed" in prompt
+    assert prompt.endswith("fix: similar change")
+    formatted_diff = semantic.find.call_args.args[0]
+    semantic.add.assert_called_once_with(formatted_diff, "Generated commit message")
+
+
+def test_generate_shows_style_examples(mock_generate_deps):
+    """Test messages of earlier commits on the same paths reach the prompt."""
+    runner = CliRunner()
+    mock_generate_deps["repo"].head_sha = "abc123"
+    with patch("commitai.cli.StyleIndex") as mock_index_class:
+        index = mock_index_class.for_repo.return_value
+        index.examples.return_value = ["feat(api): add paging"]
+        result = runner.invoke(cli, ["generate", "-c", "--style-examples", "2"])
+
+    assert result.exit_code == 0, result.output
+    index.update.assert_called_once_with("abc123")
+    index.examples.assert_called_once_with([], 2)
+    prompt = _prompt_text(mock_generate_deps["google_instance"].invoke.call_args)
+    assert "Earlier commits of this repository" in prompt
+    assert "---\nfeat(api): add paging\n---" in prompt
+
+
+def test_generate_without_style_examples(mock_generate_deps):
+    """Test --style-examples 0 leaves the history out of the prompt."""
+    runner = CliRunner()
+    with patch("commitai.cli.StyleIndex") as mock_index_class:
+        result = runner.invoke(cli, ["generate", "-c", "--style-examples", "0"])
+
+    assert result.exit_code == 0, result.output
+    mock_index_class.for_repo.return_value.update.assert_not_called()
+
+
+def test_generate_models_offers_every_candidate(mock_generate_deps):
+    """Test --models asks every model and comments out the extra messages."""
+    runner = CliRunner()
+    for name, text in (
+        ("openai", "feat: from gpt"),
+        ("anthropic", "feat: from claude"),
+    ):
+        mock_generate_deps[f"{name}_instance"].invoke.return_value = MagicMock(
+            content=text
+        )
+    handle = mock_generate_deps["file_open"].return_value
+    handle.read.return_value = (
+        "# feat: from gpt\n\n# --- Candidate 2 ---\nfeat: from claude\n"
+    )
+
+    result = runner.invoke(
+        cli, ["generate", "--models", "gpt-4o,claude-3-5-sonnet-latest"]
+    )
+
+    assert result.exit_code == 0, result.output
+    mock_generate_deps["openai_instance"].invoke.assert_called_once()
+    mock_generate_deps["anthropic_instance"].invoke.assert_called_once()
+    mock_generate_deps["google_instance"].invoke.assert_not_called()
+    written = "".join(call.args[0] for call in handle.write.call_args_list)
+    assert written.startswith("feat: from gpt\n")
+    assert "# --- Candidate 2 (claude-3-5-sonnet-latest) ---" in written
+    assert "# feat: from claude" in written
+    mock_generate_deps["commit"].assert_called_once_with("feat: from claude")
+
+
+def test_generate_candidates_first(mock_generate_deps):
+    """Test --first commits the first message without waiting for the rest."""
+    runner = CliRunner()
+    result = runner.invoke(cli, ["generate", "-c", "--candidates", "3", "--first"])
+
+    assert result.exit_code == 0, result.output
+    mock_generate_deps["commit"].assert_called_once_with("Generated commit message")
+    mock_generate_deps["cache"].get.assert_not_called()
+
+
+def test_generate_models_skips_failed_model(mock_generate_deps):
+    """Test a failing model is reported while the others still answer."""
+    runner = CliRunner()
+    mock_generate_deps["openai_instance"].invoke.side_effect = ValueError("boom")
+
+    result = runner.invoke(
+        cli, ["generate", "-c", "--models", "gpt-4o,gemini-2.0-flash"]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "gpt-4o did not produce a message: boom" in result.output
+    mock_generate_deps["commit"].assert_called_once_with("Generated commit message")
+
+
+def test_generate_candidates_rejects_stream(mock_generate_deps):
+    """Test --stream cannot be combined with several candidates."""
+    runner = CliRunner()
+    result = runner.invoke(cli, ["generate", "--stream", "--candidates", "2"])
+
+    assert result.exit_code == 2
+    assert "--stream cannot be combined" in result.output
+    mock_generate_deps["google_instance"].invoke.assert_not_called()
+
+
+def test_generate_stream(mock_generate_deps):
+    """Test --stream echoes tokens and writes them to COMMIT_EDITMSG."""
+    runner = CliRunner()
+    chunks = []
+    for text in ("feat: ", "stream ", "tokens"):
+        chunk = MagicMock()
+        chunk.content = text
+        chunks.append(chunk)
+    mock_generate_deps["google_instance"].stream.return_value = iter(chunks)
+
+    result = runner.invoke(cli, ["generate", "-c", "--stream", "Test explanation"])
+
+    assert result.exit_code == 0, result.output
+    assert "feat: stream tokens" in result.output
+    mock_generate_deps["google_instance"].invoke.assert_not_called()
+    handle = mock_generate_deps["file_open"].return_value
+    for text in ("feat: ", "stream ", "tokens"):
+        handle.write.assert_any_call(text)
+    handle.flush.assert_called()
+    mock_generate_deps["commit"].assert_called_once_with("feat: stream tokens")
+
+
+def test_generate_profile_prints_phases(mock_generate_deps):
+    """Test --profile prints a breakdown of the phases of the run."""
+    runner = CliRunner()
+    with patch("commitai.cli.Profiler.write") as mock_write:
+        result = runner.invoke(
+            cli,
+            [
+                "generate",
+                "-c",
+                "--profile",
+                "--profile-output",
+                "trace.json",
+                "--profile-format",
+                "chrome",
+            ],
+        )
+
+    assert result.exit_code == 0, result.output
+    for phase in ("startup", "generate", "initialize_llm", "collect_diff", "llm"):
+        assert phase in result.output
+    assert "git_commit" in result.output
+    mock_write.assert_called_once_with("trace.json", "chrome")
+
+
+def test_generate_speculative_keeps_result(mock_generate_deps):
+    """Test --speculative reuses the background result if the index is unchanged."""
+    runner = CliRunner()
+    with patch("commitai.cli.get_staged_tree_hash", return_value="tree1"):
+        result = runner.invoke(cli, ["generate", "-c", "--speculative"])
+
+    assert result.exit_code == 0, result.output
+    mock_generate_deps["google_instance"].invoke.assert_called_once()
+    mock_generate_deps["repo"].invalidate_staged_diff.assert_not_called()
+    mock_generate_deps["commit"].assert_called_once_with("Generated commit message")
+
+
+def test_generate_speculative_regenerates_after_hook_change(mock_generate_deps):
+    """Test --speculative regenerates when the hook modifies the index."""
+    runner = CliRunner()
+    with patch("commitai.cli.get_staged_tree_hash", side_effect=["tree1", "tree2"]):
+        result = runner.invoke(cli, ["generate", "-c", "--speculative"])
+
+    assert result.exit_code == 0, result.output
+    assert "regenerating" in result.output
+    assert mock_generate_deps["google_instance"].invoke.call_count == 2
+    mock_generate_deps["repo"].invalidate_staged_diff.assert_called_once()
+    mock_generate_deps["commit"].assert_called_once_with("Generated commit message")
+
+
+def test_generate_speculative_shows_kept_result_when_streaming(mock_generate_deps):
+    """Test --stream --speculative prints a kept result, which did not stream."""
+    runner = CliRunner()
+    with patch("commitai.cli.get_staged_tree_hash", return_value="tree1"):
+        result = runner.invoke(cli, ["generate", "-c", "--stream", "--speculative"])
+
+    assert result.exit_code == 0, result.output
+    assert "Generated commit message" in result.output
+    mock_generate_deps["google_instance"].invoke.assert_called_once()
+    mock_generate_deps["google_instance"].stream.assert_not_called()
+
+
+def test_generate_speculative_hook_fails(mock_generate_deps):
+    """Test --speculative still aborts when the pre-commit hook fails."""
+    runner = CliRunner()
+    mock_generate_deps["hook"].return_value = False
+    with patch("commitai.cli.get_staged_tree_hash", return_value="tree1"):
+        result = runner.invoke(cli, ["generate", "-c", "--speculative"])
+
+    assert result.exit_code == 1, result.output
+    assert "Pre-commit hook failed" in result.output
+    mock_generate_deps["commit"].assert_not_called()
+
+
+def test_discarded_speculation_is_not_cached():
+    """Test a message generated for a superseded diff stays out of the caches."""
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content="feat: stale", usage_metadata=None)
+    cache, semantic = MagicMock(), MagicMock()
+    cache.get.return_value = None
+    semantic.find.return_value = None
+    settings = _GenerationSettings(
+        model="gpt-4",
+        explanation="",
+        template=None,
+        map_reduce_threshold=None,
+        workers=1,
+        cache=cache,
+        semantic_cache=semantic,
+        semantic_mode="hint",
+    )
+    staged = _StagedChanges("repo/main", "repo/main\n\ndiff", parse_diff("diff"), [])
+    discarded = threading.Event()
+    discarded.set()
+
+    message = _produce_message(llm, MagicMock(), staged, settings, False, discarded)
+
+    assert message == "feat: stale"
+    cache.put.assert_not_called()
+    semantic.add.assert_not_called()
+
+
+def test_generate_speculative_reraises_generation_error(mock_generate_deps):
+    """Test errors from the background generation surface to the user."""
+    runner = CliRunner()
+    mock_generate_deps["google_instance"].invoke.side_effect = Exception("boom")
+    with patch("commitai.cli.get_staged_tree_hash", return_value="tree1"):
+        result = runner.invoke(cli, ["generate", "-c", "--speculative"])
+
+    assert result.exit_code == 1, result.output
+    assert "Error during AI generation: boom" in result.output
+    mock_generate_deps["commit"].assert_not_called()
+
+
 def test_generate_select_gpt4(mock_generate_deps):
     """Test selecting gpt-4 model via generate command."""
     runner = CliRunner()
@@ -169,12 +660,38 @@ def test_generate_select_gpt4(mock_generate_deps):
 
     assert result.exit_code == 0, result.output
     mock_generate_deps["openai_class"].assert_called_once_with(
-        model="gpt-4", api_key="fake_openai_key", temperature=0.7
+        model="gpt-4", api_key="fake_openai_key", temperature=0.7, max_retries=0
     )
     mock_generate_deps["openai_instance"].invoke.assert_called_once()
     mock_generate_deps["commit"].assert_called_once()
 
 
+def test_generate_caches_system_prompt(mock_generate_deps, monkeypatch):
+    """Test the stable instructions are sent apart, marked for prompt caching."""
+    template = "Mention the ticket. " * 400
+    monkeypatch.setenv("COMMITAI_TEMPLATE", template)
+    mock_generate_deps["anthropic_instance"].invoke.return_value = MagicMock(
+        content="feat: cached",
+        usage_metadata=TokenUsage(2048, 1536).as_metadata(),
+    )
+    runner = CliRunner()
+    result = runner.invoke(cli, ["generate", "-c", "-m", "claude-3-5-haiku-latest"])
+
+    assert result.exit_code == 0, result.output
+    system, user = mock_generate_deps["anthropic_instance"].invoke.call_args.kwargs[
+        "input"
+    ]
+    assert system["role"] == "system"
+    [block] = system["content"]
+    assert block["text"] == default_system_message + adding_template + template
+    assert block["cache_control"] == {"type": "ephemeral"}
+    assert user["role"] == "user"
+    assert "Staged changes diff" in user["content"]
+    assert "1,536 of 2,048 input tokens read from the provider's prompt cache" in (
+        result.output
+    )
+
+
 def test_generate_select_claude(mock_generate_deps):
     """Test selecting claude model via generate command."""
     runner = CliRunner()
@@ -190,11 +707,125 @@ def test_generate_select_claude(mock_generate_deps):
         model_name="claude-3-opus-20240229",
         api_key="fake_anthropic_key",
         temperature=0.7,
+        max_retries=0,
     )
     mock_generate_deps["anthropic_instance"].invoke.assert_called_once()
     mock_generate_deps["commit"].assert_called_once()
 
 
+class ServiceUnavailableError(Exception):
+    pass
+
+
+@patch("commitai.llm.time.sleep")
+def test_generate_falls_back_after_retries(mock_sleep, mock_generate_deps):
+    runner = CliRunner()
+    mock_generate_deps[
+        "file_open"
+    ].return_value.read.return_value = "Generated commit message"
+    mock_generate_deps["openai_instance"].invoke.side_effect = ServiceUnavailableError(
+        "overloaded"
+    )
+
+    result = runner.invoke(
+        cli,
+        [
+            "generate",
+            "-m",
+            "gpt-4",
+            "--fallback-models",
+            "claude-3-haiku",
+            "--retries",
+            "1",
+            "--timeout",
+            "30",
+        ],
+    )
+
+    assert result.exit_code == 0, result.output
+    mock_generate_deps["openai_class"].assert_called_once_with(
+        model="gpt-4",
+        api_key="fake_openai_key",
+        temperature=0.7,
+        max_retries=0,
+        timeout=30.0,
+    )
+    assert mock_generate_deps["openai_instance"].invoke.call_count == 2
+    mock_generate_deps["anthropic_class"].assert_called_once_with(
+        model_name="claude-3-haiku",
+        api_key="fake_anthropic_key",
+        temperature=0.7,
+        max_retries=0,
+        default_request_timeout=30.0,
+    )
+    mock_generate_deps["anthropic_instance"].invoke.assert_called_once()
+    mock_generate_deps["commit"].assert_called_once()
+
+
+def test_generate_uses_running_daemon(mock_generate_deps):
+    runner = CliRunner()
+    served = MagicMock()
+    served.invoke.return_value.content = "feat: served by the daemon"
+    with patch("commitai.daemon.connect", return_value=served) as mock_connect:
+        result = runner.invoke(cli, ["generate", "-c", "-m", "gpt-4", "--retries", "0"])
+
+    assert result.exit_code == 0, result.output
+    mock_connect.assert_called_once_with("gpt-4", [], None, 0)
+    mock_generate_deps["openai_class"].assert_not_called()
+    mock_generate_deps["commit"].assert_called_once_with("feat: served by the daemon")
+
+    with patch("commitai.daemon.connect") as mock_connect:
+        result = runner.invoke(cli, ["generate", "-c", "-m", "gpt-4", "--no-daemon"])
+    assert result.exit_code == 0, result.output
+    mock_connect.assert_not_called()
+    mock_generate_deps["openai_class"].assert_called_once()
+
+
+def test_daemon_commands_without_daemon():
+    runner = CliRunner()
+    result = runner.invoke(cli, ["daemon", "status"])
+    assert result.exit_code == 0
+    assert "No daemon is running." in result.output
+
+    result = runner.invoke(cli, ["daemon", "stop"])
+    assert result.exit_code == 0
+    assert "No daemon is running." in result.output
+
+
+def test_daemon_start_detaches():
+    from commitai.daemon import DaemonStatus
+
+    runner = CliRunner()
+    running = DaemonStatus(42, "1.0", 0.0, 0, ["gpt-4"])
+    with (
+        patch("commitai.daemon.status", side_effect=[None, None, running]),
+        patch("subprocess.Popen") as mock_popen,
+        patch("time.sleep"),
+    ):
+        result = runner.invoke(cli, ["daemon", "start", "-m", "gpt-4"])
+
+    assert result.exit_code == 0, result.output
+    assert "Daemon started (pid 42)" in result.output
+    args = mock_popen.call_args.args[0]
+    assert args[1:] == [
+        "-m",
+        "commitai.cli",
+        "daemon",
+        "start",
+        "--foreground",
+        "--idle-timeout",
+        "3600.0",
+        "--model",
+        "gpt-4",
+    ]
+    assert mock_popen.call_args.kwargs["start_new_session"] is True
+
+    with patch("commitai.daemon.status", return_value=running):
+        result = runner.invoke(cli, ["daemon", "status"])
+    assert "PID:      42" in result.output
+    assert "Models:   gpt-4" in result.output
+
+
 def test_generate_select_ollama(mock_generate_deps):
     """Test selecting ollama model via generate command."""
     runner = CliRunner()
@@ -205,12 +836,27 @@ def test_generate_select_ollama(mock_generate_deps):
 
     assert result.exit_code == 0, result.output
     mock_generate_deps["ollama_class"].assert_called_once_with(
-        model="llama3", temperature=0.7
+        model="llama3", temperature=0.7, keep_alive="30m"
     )
     mock_generate_deps["ollama_instance"].invoke.assert_called_once()
+    options = mock_generate_deps["ollama_instance"].invoke.call_args.kwargs["options"]
+    assert options["num_ctx"] == 8192
+    assert options["num_predict"] == 256
     mock_generate_deps["commit"].assert_called_once()
 
 
+def test_generate_select_any_ollama_model(mock_generate_deps):
+    """Test the ollama/ prefix selects any model Ollama serves."""
+    runner = CliRunner()
+    result = runner.invoke(cli, ["generate", "-c", "-m", "ollama/qwen2.5-coder:7b"])
+
+    assert result.exit_code == 0, result.output
+    assert mock_generate_deps["ollama_class"].call_args.kwargs["model"] == (
+        "qwen2.5-coder:7b"
+    )
+    mock_generate_deps["commit"].assert_called_once_with("Generated commit message")
+
+
 def test_generate_with_add_flag(mock_generate_deps):
     """Test the -a flag with generate command."""
     runner = CliRunner()
@@ -315,6 +961,8 @@ def test_generate_google_key_priority(mock_generate_deps):
     )
     mock_generate_deps["google_class"].reset_mock()
     mock_generate_deps["commit"].reset_mock()
+    # Clients are memoized per process; forget them so the new key is read.
+    _MODEL_CACHE.clear()
 
     mock_generate_deps["get_google_key"].return_value = "gemini_key"
     result = runner.invoke(cli, ["generate", "-m", "gemini-pro"])
@@ -327,6 +975,8 @@ def test_generate_google_key_priority(mock_generate_deps):
     )
     mock_generate_deps["google_class"].reset_mock()
     mock_generate_deps["commit"].reset_mock()
+    # Clients are memoized per process; forget them so the new key is read.
+    _MODEL_CACHE.clear()
 
     mock_generate_deps["get_google_key"].return_value = "google_key"
     result = runner.invoke(cli, ["generate", "-m", "gemini-pro"])
@@ -393,7 +1043,7 @@ def test_generate_with_global_template(mock_generate_deps):
     assert result.exit_code == 0, result.output
     call_args = mock_generate_deps["google_instance"].invoke.call_args
     assert call_args is not None, "invoke was not called"
-    prompt = call_args.kwargs["input"]
+    prompt = _prompt_text(call_args)
     assert "Global Template Instruction." in prompt
     assert adding_template in prompt
     mock_generate_deps["commit"].assert_called_once()
@@ -418,7 +1068,7 @@ def test_generate_with_local_template(mock_get_template, mock_generate_deps):
     mock_get_template.assert_called_once()  # Verify get_commit_template was called
     call_args = mock_generate_deps["google_instance"].invoke.call_args
     assert call_args is not None, "invoke was not called"
-    prompt = call_args.kwargs["input"]
+    prompt = _prompt_text(call_args)
     assert (
         local_template_content in prompt
     ), f"Local template content not found in prompt:\n{prompt}"
@@ -448,7 +1098,7 @@ def test_generate_with_deprecated_template_option(mock_generate_deps):
     assert "Warning: The --template/-t option is deprecated" in result.output
     call_args = mock_generate_deps["google_instance"].invoke.call_args
     assert call_args is not None, "invoke was not called"
-    prompt = call_args.kwargs["input"]
+    prompt = _prompt_text(call_args)
     assert "Deprecated Template" in prompt
     assert adding_template in prompt
     mock_generate_deps["commit"].assert_called_once()
@@ -506,7 +1156,7 @@ def test_generate_write_error_io(mock_generate_deps):
     mock_generate_deps["commit"].assert_not_called()
 
 
-@patch("commitai.cli.ChatGoogleGenerativeAI", None)
+@patch.dict(sys.modules, {"langchain_google_genai": None})
 def test_generate_google_module_not_installed(mock_generate_deps):
     """Test generate command error when google module not installed."""
     runner = CliRunner()
@@ -551,7 +1201,7 @@ def test_create_template_command():
     with patch("commitai.cli.save_commit_template") as mock_save_template:
         result = runner.invoke(cli, ["create-template", "Test template content"])
         assert result.exit_code == 0, result.output
-        mock_save_template.assert_called_once_with("Test template content")
+        mock_save_template.assert_called_once_with("Test template content", ANY)
         assert "Template saved successfully." in result.output
 
 
@@ -563,3 +1213,360 @@ def test_create_template_command_no_content():
         assert result.exit_code == 0, result.output
         mock_save_template.assert_not_called()
         assert "Please provide the template content." in result.output
+
+
+# --- Test cache commands ---
+
+
+def test_cache_stats_and_clear_commands(tmp_path):
+    """Test the cache stats and clear subcommands."""
+    runner = CliRunner()
+    with patch("commitai.cli.RepoContext") as mock_repo_class:
+        mock_repo_class.return_value.git_dir = str(tmp_path)
+        MessageCache.for_repo(mock_repo_class.return_value).put("key", "message")
+
+        result = runner.invoke(cli, ["cache", "stats"])
+        assert result.exit_code == 0, result.output
+        assert "Entries:   1" in result.output
+
+        result = runner.invoke(cli, ["cache", "clear"])
+        assert result.exit_code == 0, result.output
+        assert "Removed 1 cached message(s)." in result.output
+
+
+# --- Test history command ---
+
+
+@pytest.fixture
+def history_repo(tmp_path, monkeypatch):
+    repo_path = tmp_path / "history-repo"
+    repo_path.mkdir()
+    monkeypatch.chdir(repo_path)
+    for key, value in {
+        "GIT_AUTHOR_NAME": "Test",
+        "GIT_AUTHOR_EMAIL": "test@example.com",
+        "GIT_COMMITTER_NAME": "Test",
+        "GIT_COMMITTER_EMAIL": "test@example.com",
+    }.items():
+        monkeypatch.setenv(key, value)
+    subprocess.run(["git", "init", "-q"], check=True)
+    for index in range(3):
+        (repo_path / f"file{index}.txt").write_text(f"content {index}\n")
+        subprocess.run(["git", "add", "."], check=True)
+        subprocess.run(["git", "commit", "-q", "-m", f"wip {index}"], check=True)
+    return repo_path
+
+
+def test_history_command_outputs_mapping(history_repo):
+    """Test history generates one message per commit and prints a mapping."""
+    llm = MagicMock()
+    llm.invoke.side_effect = lambda input: MagicMock(
+        content="feat: "
+        + _input_text(input).split("explanation of the commit: ")[1].split("\n")[0]
+    )
+    runner = CliRunner()
+    with patch("commitai.cli._initialize_llm", return_value=llm):
+        result = runner.invoke(
+            cli, ["history", "HEAD~2..HEAD", "-j", "2", "-o", "first.json"]
+        )
+
+    assert result.exit_code == 0, result.output
+    mapping = json.loads((history_repo / "first.json").read_text())
+    assert sorted(mapping.values()) == ["feat: wip 1", "feat: wip 2"]
+    assert llm.invoke.call_count == 2
+    prompt = _prompt_text(llm.invoke.call_args_list[0])
+    assert "diff --git" in prompt
+
+    # A second run resumes from the saved progress without new requests.
+    with patch("commitai.cli._initialize_llm", return_value=llm):
+        result = runner.invoke(cli, ["history", "HEAD~2..HEAD", "-o", "out.json"])
+    assert result.exit_code == 0, result.output
+    assert llm.invoke.call_count == 2
+    assert json.loads((history_repo / "out.json").read_text()) == mapping
+
+
+def test_history_command_rebase_todo(history_repo):
+    """Test history can emit a rebase todo list amending each commit."""
+    llm = MagicMock()
+    llm.invoke.return_value = MagicMock(content="chore: reworded")
+    runner = CliRunner()
+    with patch("commitai.cli._initialize_llm", return_value=llm):
+        result = runner.invoke(
+            cli, ["history", "HEAD~1..HEAD", "--format", "rebase-todo", "-o", "todo"]
+        )
+
+    assert result.exit_code == 0, result.output
+    lines = (history_repo / "todo").read_text().splitlines()
+    assert lines[0].startswith("pick ") and lines[0].endswith("wip 2")
+    assert lines[1].startswith("exec git commit --amend")
+
+
+def test_history_command_invalid_range(history_repo):
+    """Test history reports an unknown revision range."""
+    runner = CliRunner()
+    with patch("commitai.cli._initialize_llm") as mock_init:
+        result = runner.invoke(cli, ["history", "nope..HEAD"])
+    assert result.exit_code == 1
+    assert "Invalid revision range" in result.output
+    mock_init.assert_not_called()
+
+
+def test_history_command_rejects_merges(history_repo):
+    """Test history refuses a range whose rewrite would drop a merge."""
+    subprocess.run(["git", "checkout", "-q", "-b", "side", "HEAD~1"], check=True)
+    (history_repo / "side.txt").write_text("side\n")
+    subprocess.run(["git", "add", "."], check=True)
+    subprocess.run(["git", "commit", "-q", "-m", "side"], check=True)
+    subprocess.run(["git", "checkout", "-q", "-"], check=True)
+    subprocess.run(["git", "merge", "-q", "--no-ff", "-m", "merge", "side"], check=True)
+    merge = subprocess.check_output(["git", "rev-parse", "HEAD"], text=True)
+
+    runner = CliRunner()
+    with patch("commitai.cli._initialize_llm") as mock_init:
+        result = runner.invoke(
+            cli, ["history", "HEAD~2..HEAD", "--format", "rebase-todo"]
+        )
+
+    assert result.exit_code == 1
+    assert f"contains 1 merge commit(s), starting with {merge[:12]}" in result.output
+    mock_init.assert_not_called()
+
+
+def test_ollama_warm_command():
+    """Test 'ollama warm' loads the model and reports how long it stays."""
+    runner = CliRunner()
+    with patch("commitai.local.warm_up", return_value=1.5) as mock_warm:
+        result = runner.invoke(
+            cli, ["commitai-ollama", "warm", "-m", "ollama/phi3", "--keep-alive", "-1"]
+        )
+
+    assert result.exit_code == 0, result.output
+    mock_warm.assert_called_once_with("ollama/phi3", "-1", None)
+    assert "phi3 is loaded (took 1.5s)" in result.output
+    assert "as long as Ollama runs" in result.output
+
+
+def test_ollama_warm_command_resolves_model_aliases(tmp_path, monkeypatch):
+    """Test 'ollama warm' loads the model an alias names, on its server."""
+    config = tmp_path / "config.toml"
+    config.write_text(
+        "[models.local]\n"
+        'provider = "ollama"\n'
+        'model = "qwen2.5-coder:7b"\n'
+        'base_url = "http://gpu-box:11434"\n'
+        "[models.remote]\n"
+        'model = "gpt-4o"\n'
+    )
+    monkeypatch.setenv("COMMITAI_CONFIG", str(config))
+    runner = CliRunner()
+    with patch("commitai.local.warm_up", return_value=1.5) as mock_warm:
+        result = runner.invoke(cli, ["ollama", "warm", "-m", "local"])
+        rejected = runner.invoke(cli, ["ollama", "warm", "-m", "remote"])
+
+    assert result.exit_code == 0, result.output
+    mock_warm.assert_called_once_with("qwen2.5-coder:7b", None, "http://gpu-box:11434")
+    assert rejected.exit_code == 1
+    assert "remote is not served by Ollama" in rejected.output
+
+
+def test_ollama_warm_command_reports_errors():
+    """Test 'ollama warm' turns Ollama errors into a clean failure."""
+    runner = CliRunner()
+    with patch("commitai.local.warm_up", side_effect=OllamaError("unreachable")):
+        result = runner.invoke(cli, ["ollama", "warm", "-m", "llama3"])
+
+    assert result.exit_code == 1
+    assert "Error: unreachable" in result.output
+
+
+def test_hook_install_and_uninstall(tmp_path, monkeypatch):
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    monkeypatch.chdir(tmp_path)
+    hooks_dir = tmp_path / ".git" / "hooks"
+    runner = CliRunner()
+
+    result = runner.invoke(cli, ["hook", "install", "-m", "gpt-4o", "--prewarm"])
+
+    assert result.exit_code == 0, result.output
+    script = (hooks_dir / "prepare-commit-msg").read_text()
+    assert 'hook prepare-commit-msg --model gpt-4o "$@"' in script
+    assert (
+        "hook prewarm --model gpt-4o" in (hooks_dir / "post-index-change").read_text()
+    )
+
+    (hooks_dir / "prepare-commit-msg").write_text("#!/bin/sh\nexit 0\n")
+    result = runner.invoke(cli, ["hook", "install"])
+    assert result.exit_code != 0
+    assert "pass --force to replace it" in result.output
+
+    result = runner.invoke(cli, ["hook", "uninstall"])
+    assert result.exit_code == 0, result.output
+    assert not (hooks_dir / "post-index-change").exists()
+    assert (hooks_dir / "prepare-commit-msg").exists()
+
+
+@pytest.fixture
+def hook_repo(tmp_path):
+    with patch("commitai.cli.RepoContext") as mock_repo_class:
+        mock_repo_class.return_value.git_dir = str(tmp_path)
+        yield mock_repo_class
+
+
+def test_hook_prepare_commit_msg(hook_repo, tmp_path):
+    message_file = tmp_path / "COMMIT_EDITMSG"
+    message_file.write_text("\n# Please enter the commit message.\n")
+    runner = CliRunner()
+    with patch("commitai.cli._hook_message", return_value="feat: hook") as mock_gen:
+        result = runner.invoke(
+            cli, ["hook", "prepare-commit-msg", str(message_file), "-m", "gpt-4"]
+        )
+        assert result.exit_code == 0, result.output
+        mock_gen.assert_called_once_with(hook_repo.return_value, "gpt-4")
+        assert message_file.read_text() == (
+            "feat: hook\n\n# Please enter the commit message.\n"
+        )
+
+        mock_gen.reset_mock()
+        result = runner.invoke(
+            cli, ["hook", "prepare-commit-msg", str(message_file), "message"]
+        )
+        assert result.exit_code == 0, result.output
+        mock_gen.assert_not_called()
+
+
+def test_hook_message_uses_configured_settings(tmp_path):
+    """Test the hook generates with the context window and semantic cache set."""
+    config = Config(context_window=4096, semantic_cache="hint", semantic_threshold=0.8)
+    repo = MagicMock(git_dir=str(tmp_path))
+    with (
+        patch("commitai.cli._config", return_value=config),
+        patch("commitai.cli._prepare_context", return_value="diff"),
+        patch("commitai.cli._initialize_llm"),
+        patch("commitai.cli.get_commit_template", return_value=None),
+        patch("commitai.cli._produce_message", return_value="feat: hook") as produce,
+    ):
+        assert _hook_message(repo, "gpt-4") == "feat: hook"
+
+    settings = produce.call_args.args[3]
+    assert settings.context_window == 4096
+    assert settings.semantic_mode == "hint"
+    assert settings.semantic_cache.threshold == 0.8
+
+
+def test_hook_prepare_commit_msg_never_blocks_the_commit(hook_repo, tmp_path):
+    message_file = tmp_path / "COMMIT_EDITMSG"
+    message_file.write_text("# Git's template\n")
+    runner = CliRunner()
+    with patch(
+        "commitai.cli._hook_message",
+        side_effect=click.ClickException("No staged changes found."),
+    ):
+        result = runner.invoke(cli, ["hook", "prepare-commit-msg", str(message_file)])
+
+    assert result.exit_code == 0, result.output
+    assert "no message generated: No staged changes found." in result.output
+    assert message_file.read_text() == "# Git's template\n"
+
+
+def test_hook_prewarm_follows_the_index(hook_repo, tmp_path):
+    runner = CliRunner()
+    with (
+        patch("commitai.cli._hook_message") as mock_gen,
+        patch("commitai.cli.get_staged_tree_hash", side_effect=["t1", "t2", "t2"]),
+        patch("time.sleep"),
+    ):
+        result = runner.invoke(cli, ["hook", "prewarm", "-m", "gpt-4"])
+
+    assert result.exit_code == 0, result.output
+    assert mock_gen.call_count == 2
+    assert (tmp_path / "commitai" / "prewarm.tree").read_text() == "t2"
+    assert not (tmp_path / "commitai" / "prewarm.lock").exists()
+
+
+@pytest.fixture
+def monorepo(history_repo):
+    for path in ("packages/api/views.py", "packages/api/old.py", "packages/web/app.js"):
+        (history_repo / path).parent.mkdir(parents=True, exist_ok=True)
+        (history_repo / path).write_text(f"# {path}\n")
+    subprocess.run(["git", "add", "."], check=True)
+    subprocess.run(["git", "commit", "-q", "-m", "add packages"], check=True)
+
+    (history_repo / "packages/api/views.py").write_text("# views\nroute = 1\n")
+    (history_repo / "packages/web/app.js").write_text("// app\nrender();\n")
+    subprocess.run(
+        ["git", "mv", "packages/api/old.py", "packages/web/moved.py"], check=True
+    )
+    subprocess.run(["git", "add", "."], check=True)
+    return history_repo
+
+
+def _scope_llm():
+    def answer(input):
+        if "Scope api" in input and "Scope web" in input:
+            return MagicMock(content="feat(api,web): route and render")
+        if "Scope: " in input:
+            return MagicMock(content="summary of " + input.split("Scope: ")[1][:3])
+        scope = "api" if "(api)" in input else "web"
+        return MagicMock(content=f"feat({scope}): update {scope}")
+
+    llm = MagicMock()
+    llm.invoke.side_effect = lambda input: answer(_input_text(input))
+    return llm
+
+
+def test_generate_split_commits_each_scope(monorepo):
+    """Test --split creates one commit per scope, renames included."""
+    llm = _scope_llm()
+    runner = CliRunner()
+    with patch("commitai.cli._initialize_llm", return_value=llm):
+        result = runner.invoke(
+            cli,
+            [
+                "generate",
+                "-c",
+                "--scopes",
+                "packages/*",
+                "--split",
+                "--style-examples",
+                "0",
+            ],
+        )
+
+    assert result.exit_code == 0, result.output
+    assert "Splitting the staged changes into 2 commits" in result.output
+
+    def show(revision):
+        return subprocess.check_output(
+            ["git", "show", "--format=%s", "--name-status", revision], text=True
+        ).split("\n")
+
+    first, second = show("HEAD~1"), show("HEAD")
+    assert first[0] == "feat(api): update api"
+    assert first[2:] == ["M\tpackages/api/views.py", ""]
+    # The rename lands in the scope of its destination, deletion included.
+    assert second[0] == "feat(web): update web"
+    assert "R100\tpackages/api/old.py\tpackages/web/moved.py" in second
+    assert subprocess.run(["git", "diff", "--cached", "--quiet"]).returncode == 0
+    assert not (monorepo / ".git" / "commitai" / "split").exists()
+
+
+def test_generate_scopes_merges_scope_summaries(monorepo):
+    """Test --scopes summarizes every scope and merges the summaries."""
+    llm = _scope_llm()
+    runner = CliRunner()
+    with patch("commitai.cli._initialize_llm", return_value=llm):
+        result = runner.invoke(
+            cli, ["generate", "-c", "--scopes", "packages/*", "--style-examples", "0"]
+        )
+
+    assert result.exit_code == 0, result.output
+    assert llm.invoke.call_count == 3
+    subject = subprocess.check_output(["git", "log", "--format=%s", "-1"], text=True)
+    assert subject.strip() == "feat(api,web): route and render"
+
+
+def test_generate_split_needs_scopes():
+    """Test --split is refused without --scopes."""
+    result = CliRunner().invoke(cli, ["generate", "--split"])
+    assert result.exit_code == 2
+    assert "--split needs --scopes" in result.output
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+import subprocess
+
+from commitai.compact import (
+    CONTEXT_LINES,
+    collapse_moves,
+    compact_files,
+    context_lines_for,
+    is_whitespace_only,
+    trim_context,
+)
+from commitai.diff import DiffHunk, parse_diff
+from commitai.git import RepoContext
+
+
+def _rename(old, new, kind="rename"):
+    return (
+        f"diff --git a/{old} b/{new}\nsimilarity index 100%\n"
+        f"{kind} from {old}\n{kind} to {new}\n"
+    )
+
+
+def test_context_lines_for():
+    assert context_lines_for(0) is None
+    assert context_lines_for(CONTEXT_LINES[0][0]) == 2
+    assert context_lines_for(CONTEXT_LINES[-1][0] - 1) == 1
+    assert context_lines_for(CONTEXT_LINES[-1][0]) == 0
+
+
+def test_collapse_moves_groups_by_directories():
+    files = parse_diff(
+        _rename("src/a.py", "lib/a.py")
+        + "diff --git a/app.py b/app.py\n@@ -1 +1 @@\n-a\n+b\n"
+        + _rename("src/b.py", "lib/c.py")
+        + _rename("README", "docs/README", kind="copy")
+        + "diff --git a/x.sh b/y.sh\nold mode 100644\nnew mode 100755\n"
+        "similarity index 100%\nrename from x.sh\nrename to y.sh\n"
+    )
+
+    collapsed, moves = collapse_moves(files)
+
+    assert moves == 3
+    assert [f.text for f in collapsed[:3]] == [
+        "[commitai] renamed 2 unchanged files from src/ to lib/: a.py, "
+        "b.py -> c.py\n",
+        "diff --git a/app.py b/app.py\n@@ -1 +1 @@\n-a\n+b\n",
+        "[commitai] copied README -> docs/README (unchanged)\n",
+    ]
+    assert collapsed[0].path == "lib/a.py"
+    # A mode change is kept, since it is not visible in a summary.
+    assert collapsed[3].path == "y.sh" and collapsed[3].new_mode == "100755"
+
+
+def test_is_whitespace_only():
+    assert is_whitespace_only(
+        DiffHunk("@@ -1,2 +1,1 @@\n-if x:\n-    go()\n+if x: go()\n")
+    )
+    assert is_whitespace_only(DiffHunk("@@ -1 +1 @@\n-\tx = 1\n+    x = 1\n"))
+    assert not is_whitespace_only(DiffHunk("@@ -1 +1 @@\n-x = 1\n+x = 2\n"))
+    assert not is_whitespace_only(DiffHunk("@@ -1 +1 @@\n a\n"))
+
+
+def test_trim_context_splits_distant_changes():
+    context = "".join(f" line {n}\n" for n in range(3, 9))
+    hunk = DiffHunk(
+        "@@ -1,10 +1,10 @@ def main():\n line 1\n-old 2\n+new 2\n"
+        + context
+        + "-old 9\n+new 9\n line 10\n"
+    )
+
+    trimmed = trim_context(hunk, 1)
+
+    assert [h.text for h in trimmed] == [
+        "@@ -1,3 +1,3 @@ def main():\n line 1\n-old 2\n+new 2\n line 3\n",
+        "@@ -8,3 +8,3 @@\n line 8\n-old 9\n+new 9\n line 10\n",
+    ]
+    # Changes at most twice the context apart stay in one hunk.
+    assert trim_context(hunk, 3) == [hunk]
+
+
+def test_trim_context_without_context_names_the_line_before():
+    hunk = DiffHunk("@@ -4,3 +4,4 @@\n a\n+b\n c\n-d\n\\ No newline at end of file\n")
+    assert [h.text for h in trim_context(hunk, 0)] == [
+        "@@ -4,0 +5 @@\n+b\n",
+        "@@ -6 +6,0 @@\n-d\n\\ No newline at end of file\n",
+    ]
+
+
+def test_compact_files_reports_savings():
+    files = parse_diff(
+        _rename("src/a.py", "lib/a.py")
+        + "diff --git a/app.py b/app.py\n@@ -1,2 +1,2 @@\n-x  =  1\n+x = 1\n"
+        " keep\n"
+    )
+
+    compacted, compaction = compact_files(files)
+
+    assert compacted[1].text == (
+        "diff --git a/app.py b/app.py\n@@ -1,2 +1,2 @@\n"
+        "[commitai] whitespace-only change (+1 -1 lines)\n"
+    )
+    assert (compaction.moves, compaction.whitespace_hunks) == (1, 1)
+    assert compaction.context_lines is None
+    assert compaction.compacted_bytes < compaction.original_bytes
+    assert compaction.ratio == compaction.compacted_bytes / compaction.original_bytes
+
+
+def test_compact_files_trims_context_of_large_diffs():
+    body = "".join(f" context {n}\n" for n in range(20))
+    text = "diff --git a/a.py b/a.py\n@@ -1,21 +1,21 @@\n-a\n+b\n" + body
+    files = parse_diff(text * (CONTEXT_LINES[-1][0] // len(text) + 1))
+
+    compacted, compaction = compact_files(files)
+
+    assert compaction.context_lines == 0
+    assert compacted[0].text == "diff --git a/a.py b/a.py\n@@ -1 +1 @@\n-a\n+b\n"
+    assert compaction.ratio < 0.2
+
+
+def test_repo_context_compacts_renames(tmp_path, monkeypatch):
+    def git(*args):
+        subprocess.run(
+            ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args], check=True
+        )
+
+    monkeypatch.chdir(tmp_path)
+    git("init", "-q")
+    git("config", "diff.renames", "false")
+    (tmp_path / "old").mkdir()
+    for name in ("a.py", "b.py"):
+        (tmp_path / "old" / name).write_text(f"# {name}\n" * 20)
+    git("add", ".")
+    git("commit", "-q", "-m", "init")
+    git("mv", "old", "new")
+
+    repo = RepoContext(compact=True)
+
+    assert repo.staged_diff == (
+        "[commitai] renamed 2 unchanged files from old/ to new/: a.py, b.py\n"
+    )
+    assert repo.compaction is not None and repo.compaction.moves == 2
+    assert [f.path for f in repo.diff_files] == ["new/a.py"]
+    assert RepoContext().compaction is None
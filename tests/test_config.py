@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import patch
+
+import pytest
+
+from commitai.config import (
+    Config,
+    ConfigError,
+    compile_layer,
+    current_config,
+    repo_config_path,
+    resolve_config,
+)
+
+
+@pytest.fixture
+def layers(tmp_path, monkeypatch):
+    """A repository with a subdirectory, and a global configuration file."""
+    global_file = tmp_path / "config.toml"
+    monkeypatch.setenv("COMMITAI_CONFIG", str(global_file))
+    repo = tmp_path / "repo"
+    (repo / ".git").mkdir(parents=True)
+    (repo / "src").mkdir()
+    return global_file, repo
+
+
+def test_defaults_without_files(layers):
+    _, repo = layers
+    assert resolve_config(str(repo)) == Config()
+
+
+def test_layers_by_precedence(layers, monkeypatch):
+    global_file, repo = layers
+    global_file.write_text(
+        'model = "gpt-4o"\nworkers = 8\ntimeout = 30\n'
+        'fallback_models = ["claude-3-5-haiku-latest", "llama3"]\n'
+        '[models.fast]\nmodel = "gpt-4o-mini"\n'
+    )
+    (repo / ".commitai.toml").write_text("workers = 2\ncompact = false\n")
+    monkeypatch.setenv("COMMITAI_MODEL", "claude-3-5-sonnet-latest")
+    monkeypatch.setenv("COMMITAI_DAEMON", "off")
+
+    resolved = resolve_config(str(repo / "src"))
+
+    assert resolved.model == "claude-3-5-sonnet-latest"
+    assert resolved.workers == 2
+    assert resolved.timeout == 30.0
+    assert resolved.fallback_models == "claude-3-5-haiku-latest,llama3"
+    assert resolved.compact is False
+    assert resolved.daemon is False
+    assert resolved.models == {"fast": {"model": "gpt-4o-mini"}}
+    with pytest.raises(TypeError):
+        resolved.models["slow"] = {}  # type: ignore[index]
+
+
+def test_repo_file_search_stops_at_repository_top(layers, tmp_path):
+    _, repo = layers
+    (tmp_path / ".commitai.toml").write_text("workers = 2\n")
+    assert repo_config_path(str(repo / "src")) is None
+
+    (repo / ".commitai.toml").write_text("workers = 2\n")
+    assert repo_config_path(str(repo / "src")) == str(repo / ".commitai.toml")
+
+
+def test_legacy_template_variable(layers, monkeypatch):
+    _, repo = layers
+    monkeypatch.setenv("TEMPLATE_COMMIT", "Start with a verb.")
+    assert resolve_config(str(repo)).template == "Start with a verb."
+
+    monkeypatch.setenv("COMMITAI_TEMPLATE", "Mention the ticket.")
+    assert resolve_config(str(repo)).template == "Mention the ticket."
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ("workers = true", "workers must be an integer, not True"),
+        ('timeout = "soon"', "timeout must be a number"),
+        ("colour = 1", "unknown setting 'colour'"),
+        ('semantic_cache = "drafts"', "must be one of off, hint, draft"),
+        ('[models.fast]\nmodel = "gpt-4o"', "only read from the global"),
+    ],
+)
+def test_invalid_repo_file(layers, text, message):
+    _, repo = layers
+    (repo / ".commitai.toml").write_text(text)
+    with pytest.raises(ConfigError, match=message):
+        resolve_config(str(repo))
+
+
+def test_invalid_environment_variable(layers, monkeypatch):
+    _, repo = layers
+    monkeypatch.setenv("COMMITAI_WORKERS", "many")
+    with pytest.raises(ConfigError, match=r"\$COMMITAI_WORKERS must be an integer"):
+        resolve_config(str(repo))
+
+    monkeypatch.setenv("COMMITAI_WORKERS", "6")
+    monkeypatch.setenv("COMMITAI_STREAM", "maybe")
+    with pytest.raises(ConfigError, match="COMMITAI_STREAM must be a boolean"):
+        resolve_config(str(repo))
+
+    monkeypatch.setenv("COMMITAI_STREAM", "yes")
+    monkeypatch.setenv("COMMITAI_SEMANTIC_CACHE", "always")
+    with pytest.raises(ConfigError, match="semantic_cache must be one of"):
+        resolve_config(str(repo))
+
+
+def test_files_are_compiled_once(layers):
+    global_file, repo = layers
+    global_file.write_text("workers = 8\n")
+    assert resolve_config(str(repo)).workers == 8
+
+    with patch("commitai.config.compile_layer") as mock_compile:
+        assert resolve_config(str(repo)).workers == 8
+    mock_compile.assert_not_called()
+
+    # A different size (and usually mtime) invalidates the compiled layer.
+    global_file.write_text("workers = 16\n")
+    assert resolve_config(str(repo)).workers == 16
+
+
+def test_unreadable_compiled_cache_is_ignored(layers, tmp_path):
+    global_file, repo = layers
+    global_file.write_text("workers = 8\n")
+    cache_file = tmp_path / "cache" / "commitai" / "config.json"
+    cache_file.parent.mkdir(parents=True)
+    cache_file.write_text("{not json")
+
+    assert resolve_config(str(repo)).workers == 8
+    assert '"workers": 8' in cache_file.read_text()
+
+
+def test_compile_layer_keeps_models_of_global_file(tmp_path):
+    path = tmp_path / "config.toml"
+    path.write_text("retries = 1\n[models.fast]\nmodel = 'gpt-4o-mini'\n")
+    assert compile_layer(str(path), allow_models=True) == {
+        "retries": 1,
+        "models": {"fast": {"model": "gpt-4o-mini"}},
+    }
+
+
+def test_current_config_is_resolved_once(monkeypatch):
+    first = current_config()
+    monkeypatch.setenv("COMMITAI_WORKERS", "9")
+    assert current_config() is first
+    assert first.workers == Config().workers
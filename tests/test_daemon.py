@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from commitai import __version__, daemon
+from commitai.daemon import DaemonError, DaemonServer
+from commitai.llm import TokenUsage, UsageMeter, invoke_text, metering, stream_text
+
+
+class _Model:
+    def __init__(self, name):
+        self.name = name
+        # Claude reports reading most of the prompt from its cache.
+        self.usage = (
+            TokenUsage(1200, 1000).as_metadata() if name.startswith("claude") else None
+        )
+
+    def invoke(self, input, **kwargs):
+        if input == "fail":
+            raise RuntimeError("provider is down")
+        return MagicMock(content=f"{self.name}: {input}", usage_metadata=self.usage)
+
+    def stream(self, input, **kwargs):
+        for token in ("feat: ", input):
+            yield MagicMock(content=token, usage_metadata=None)
+        yield MagicMock(content="", usage_metadata=self.usage)
+
+
+@pytest.fixture
+def server(tmp_path):
+    path = str(tmp_path / "d.sock")
+    created = []
+
+    def create(model, fallbacks, timeout, retries):
+        created.append((model, tuple(fallbacks), timeout, retries))
+        return _Model(model)
+
+    server = DaemonServer(path, create, idle_timeout=0)
+    server.created = created
+    thread = threading.Thread(target=server.serve)
+    thread.start()
+    yield server
+    daemon.stop(path)
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert not os.path.exists(path)
+
+
+def test_socket_path(monkeypatch):
+    monkeypatch.setenv("COMMITAI_SOCKET", "/tmp/custom.sock")
+    assert daemon.socket_path() == "/tmp/custom.sock"
+    monkeypatch.delenv("COMMITAI_SOCKET")
+    monkeypatch.setenv("XDG_RUNTIME_DIR", "/run/user/1000")
+    assert daemon.socket_path() == "/run/user/1000/commitai.sock"
+
+
+def test_connect_without_daemon(tmp_path):
+    assert daemon.connect("gpt-4", path=str(tmp_path / "missing.sock")) is None
+    assert daemon.status(str(tmp_path / "missing.sock")) is None
+    assert daemon.stop(str(tmp_path / "missing.sock")) is False
+
+
+def test_daemon_serves_and_reuses_models(server):
+    llm = daemon.connect("gpt-4", ["claude-3"], 5.0, 1, path=server.path)
+    assert llm is not None
+
+    assert llm.invoke(input="diff").content == "gpt-4: diff"
+    assert [c.content for c in llm.stream(input="add x")] == ["feat: ", "add x"]
+    assert server.created == [("gpt-4", ("claude-3",), 5.0, 1)]
+
+    running = daemon.status(server.path)
+    assert running.pid == os.getpid()
+    assert running.version == __version__
+    assert running.requests == 2
+    assert running.models == ["gpt-4"]
+
+
+def test_daemon_relays_token_usage(server):
+    llm = daemon.connect("claude-3", path=server.path)
+    meter = UsageMeter()
+
+    with metering(meter):
+        assert invoke_text(llm, "diff") == "claude-3: diff"
+        assert stream_text(llm, "add x", lambda token: None) == "feat: add x"
+
+    assert meter.total == TokenUsage(2400, 2000, 0)
+
+
+def test_daemon_reports_errors(server):
+    llm = daemon.connect("gpt-4", path=server.path)
+    with pytest.raises(DaemonError, match="provider is down"):
+        llm.invoke(input="fail")
+
+
+def test_connect_ignores_other_versions(server, monkeypatch):
+    running = daemon.status(server.path)
+    monkeypatch.setattr(
+        daemon, "status", lambda path: running._replace(version="0.0.0-other")
+    )
+    assert daemon.connect("gpt-4", path=server.path) is None
+
+
+def test_second_daemon_refuses_to_start(server):
+    with pytest.raises(DaemonError, match="already running"):
+        DaemonServer(server.path, MagicMock())
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    path = str(tmp_path / "stale.sock")
+    with open(path, "w"):
+        pass
+    server = DaemonServer(path, MagicMock(), idle_timeout=0.01)
+    server.serve()  # Exits once idle.
+    assert not os.path.exists(path)
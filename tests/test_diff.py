@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from commitai.diff import chunk_files, parse_diff, render_diff
+
+FILE_A = (
+    "diff --git a/a.py b/a.py\n"
+    "--- a/a.py\n+++ b/a.py\n"
+    "@@ -1,2 +1,2 @@\n-one\n+uno\n"
+    "@@ -10,2 +10,2 @@\n-ten\n+diez\n"
+)
+FILE_B = "diff --git a/b.py b/b.py\n--- a/b.py\n+++ b/b.py\n@@ -1 +1 @@\n-x\n+y\n"
+DIFF = FILE_A + FILE_B
+
+
+def test_chunk_files_groups_small_files():
+    assert chunk_files(parse_diff(DIFF), 10_000) == [DIFF]
+
+
+def test_chunk_files_splits_files_and_hunks():
+    chunks = chunk_files(parse_diff(DIFF), len(FILE_A) - 1)
+    assert len(chunks) == 3
+    header = "diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n"
+    assert chunks[0].startswith(header) and "uno" in chunks[0]
+    assert chunks[1].startswith(header) and "diez" in chunks[1]
+    assert chunks[2] == FILE_B
+    assert all(len(chunk) <= len(FILE_A) - 1 for chunk in chunks)
+
+
+def test_chunk_files_splits_oversized_hunk_by_lines():
+    big = "diff --git a/c b/c\n@@ -1 +1,40 @@\n" + "+line\n" * 40
+    chunks = chunk_files(parse_diff(big), 60)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 60 for chunk in chunks)
+    assert sum(chunk.count("+line\n") for chunk in chunks) == 40
+
+
+METADATA_DIFF = (
+    "diff --git a/old.py b/new.py\n"
+    "similarity index 90%\n"
+    "rename from old.py\n"
+    "rename to new.py\n"
+    "--- a/old.py\n+++ b/new.py\n"
+    "@@ -3 +3,2 @@ def f():\n-    return 1\n+    return 2\n+    # done\n"
+    "diff --git a/run.sh b/run.sh\n"
+    "old mode 100644\nnew mode 100755\n"
+    "diff --git a/logo.png b/logo.png\n"
+    "new file mode 100644\n"
+    "index 0000000..1234567\n"
+    "Binary files /dev/null and b/logo.png differ\n"
+)
+
+
+def test_parse_diff_metadata():
+    renamed, script, image = parse_diff(METADATA_DIFF)
+
+    assert (renamed.path, renamed.old_path) == ("new.py", "old.py")
+    assert (renamed.status, renamed.similarity) == ("renamed", 90)
+    (hunk,) = renamed.hunks
+    assert (hunk.old_start, hunk.old_count) == (3, 1)
+    assert (hunk.new_start, hunk.new_count) == (3, 2)
+    assert (hunk.added, hunk.removed) == (2, 1)
+    assert hunk.header == "@@ -3 +3,2 @@ def f():"
+
+    assert (script.old_mode, script.new_mode, script.hunks) == ("100644", "100755", [])
+    assert (image.status, image.binary, image.new_mode) == ("added", True, "100644")
+
+
+def test_parse_diff_round_trips_text():
+    text = "repo/main\n\n" + DIFF
+    files = parse_diff(text)
+    assert [f.path for f in files] == ["", "a.py", "b.py"]
+    assert render_diff(files) == text
+    assert files[1].size == len(FILE_A)
+    assert (files[1].added, files[1].removed) == (2, 2)
+
+
+def test_diff_objects_have_no_instance_dict():
+    diff_file = parse_diff(FILE_A)[0]
+    assert not hasattr(diff_file, "__dict__")
+    assert not hasattr(diff_file.hunks[0], "__dict__")
+
+
+def test_with_hunks_copies_metadata():
+    (diff_file,) = parse_diff(FILE_A)
+    diff_file.status = "renamed"
+    copy = diff_file.with_hunks(diff_file.hunks[:1])
+    assert (copy.path, copy.status, copy.header) == (
+        "a.py",
+        "renamed",
+        diff_file.header,
+    )
+    assert len(copy.hunks) == 1
+    assert len(diff_file.hunks) == 2
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+import subprocess
+from unittest.mock import patch
+
+from commitai.filters import (
+    IGNORE_FILE,
+    NoiseFilter,
+    is_minifiable,
+    parse_ignore_file,
+    staged_generated_paths,
+)
+
+
+def test_default_rules_match_noisy_paths():
+    noise = NoiseFilter()
+    assert noise.match_path("package-lock.json") == "lockfile"
+    assert noise.match_path("web/yarn.lock") == "lockfile"
+    assert noise.match_path("static/app.min.js") == "minified"
+    assert noise.match_path("src/__snapshots__/App.test.js.snap") == "snapshot"
+    assert noise.match_path("src/__snapshots__/other.txt") == "snapshot"
+    assert noise.match_path("src/app.js") is None
+    assert noise.match_path("docs/lockfile.md") is None
+
+
+def test_ignore_file_patterns_and_negation():
+    patterns = parse_ignore_file(
+        "# generated code\nvendor/\n/api/*.pb.go\n*.csv\n!keep.csv\n!yarn.lock\n"
+    )
+    noise = NoiseFilter(ignore_patterns=patterns)
+    assert noise.match_path("vendor/lib/a.go") == IGNORE_FILE
+    assert noise.match_path("api/user.pb.go") == IGNORE_FILE
+    assert noise.match_path("other/api/user.pb.go") is None
+    assert noise.match_path("data/big.csv") == IGNORE_FILE
+    assert noise.match_path("data/keep.csv") is None
+    # A negated pattern also overrides the built-in rules.
+    assert noise.match_path("yarn.lock") is None
+    assert noise.match_path("Cargo.lock") == "lockfile"
+
+
+def test_generated_paths():
+    noise = NoiseFilter(generated=["src/schema.ts"])
+    assert noise.match_path("src/schema.ts") == "generated file"
+
+
+def test_match_line_detects_generated_content():
+    noise = NoiseFilter()
+    assert noise.match_line(b"Binary files a/x and b/x differ\n", False)
+    assert noise.match_line(b"GIT binary patch\n", False) == "binary file"
+    assert noise.match_line(b"+" + b"QUJD" * 60 + b"\n", True) == "base64 data"
+    assert noise.match_line(b"+" + b"a = 1; " * 200 + b"\n", True) == (
+        "minified or generated content"
+    )
+    assert noise.match_line(b"+normal line of code\n", True) is None
+    assert noise.match_line(b" " + b"x" * 2000 + b"\n", True) is None
+
+
+def test_long_lines_only_mark_minifiable_files():
+    noise = NoiseFilter()
+    long_line = b"+" + b"An unwrapped paragraph of prose. " * 40 + b"\n"
+    assert is_minifiable("static/app.JS")
+    assert not is_minifiable("docs/guide.md")
+    assert not is_minifiable("tests/fixtures/records.json")
+    assert noise.match_line(long_line, True, minifiable=False) is None
+    assert noise.match_line(b"+" + b"QUJD" * 300 + b"\n", True, False) == (
+        "base64 data"
+    )
+
+
+def test_staged_generated_paths(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    subprocess.run(["git", "init", "-q"], check=True)
+    (tmp_path / ".gitattributes").write_text("gen/* linguist-generated\n")
+    (tmp_path / "gen").mkdir()
+    (tmp_path / "gen" / "out.py").write_text("x = 1\n")
+    (tmp_path / "main.py").write_text("y = 2\n")
+    subprocess.run(["git", "add", "."], check=True)
+
+    git_dir = str(tmp_path / ".git")
+    assert staged_generated_paths(str(tmp_path), git_dir) == ["gen/out.py"]
+
+
+def test_staged_generated_paths_skips_git_without_attributes(tmp_path):
+    with patch("subprocess.run") as mock_run:
+        assert staged_generated_paths(str(tmp_path), str(tmp_path / ".git")) == []
+    mock_run.assert_not_called()
@@ -1,12 +1,21 @@
 # -*- coding: utf-8 -*-
-from unittest.mock import mock_open, patch
+import io
+import subprocess
+from unittest.mock import MagicMock, mock_open, patch
 
+import pytest
+
+from commitai.filters import NoiseFilter
 from commitai.git import (
+    BudgetedDiff,
+    RepoContext,
+    StagedPath,
     create_commit,
     get_commit_template,
-    get_current_branch_name,
     get_repository_name,
-    get_staged_changes_diff,
+    get_staged_tree_hash,
+    list_staged_paths,
+    read_staged_diff,
     run_pre_commit_hook,
     save_commit_template,
     stage_all_changes,
@@ -19,27 +28,11 @@ def test_get_repository_name():
         assert get_repository_name() == "/path/to/repo"
 
 
-def test_get_current_branch_name():
-    with patch("subprocess.check_output") as mock_check_output:
-        mock_check_output.return_value = b"main\n"
-        assert get_current_branch_name() == "main"
-
-
-def test_get_staged_changes_diff():
+def test_get_staged_tree_hash():
     with patch("subprocess.check_output") as mock_check_output:
-        mock_check_output.return_value = (
-            b"diff --git a/file1.txt b/file1.txt"
-            b"\nindex 1234567..abcdefg 100644\n"
-            b"--- a/file1.txt\n+++ b/file1.txt"
-            b"\n@@ -1,2 +1,2 @@\n-old content\n+new content"
-        )
-        expected_output = (
-            "diff --git a/file1.txt b/file1.txt"
-            "\nindex 1234567..abcdefg 100644\n"
-            "--- a/file1.txt\n+++ b/file1.txt\n@@ -1,2 +1,2 @@"
-            "\n-old content\n+new content"
-        )
-        assert get_staged_changes_diff() == expected_output
+        mock_check_output.return_value = b"4b825dc642cb6eb9a060e54bf8d69288fbee4904\n"
+        assert get_staged_tree_hash() == "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+        mock_check_output.assert_called_once_with(["git", "write-tree"])
 
 
 def test_stage_all_changes():
@@ -86,7 +79,9 @@ def test_get_commit_template(tmpdir):
             create=True,
         ),
     ):
-        mock_getenv.return_value = "Global template"
+        mock_getenv.side_effect = lambda key, default=None: (
+            "Global template" if key == "TEMPLATE_COMMIT" else default
+        )
         assert get_commit_template() == "Global template"
 
 
@@ -101,6 +96,40 @@ def test_save_commit_template(tmpdir):
         assert template_path.read() == "Test template"
 
 
+def test_commit_template_of_a_linked_worktree(tmp_path, monkeypatch):
+    repo_path = tmp_path / "repo"
+    worktree_path = tmp_path / "worktree"
+    subprocess.run(["git", "init", "-q", str(repo_path)], check=True)
+    subprocess.run(
+        [
+            "git",
+            "-C",
+            str(repo_path),
+            "-c",
+            "user.name=Test",
+            "-c",
+            "user.email=test@example.com",
+            "commit",
+            "-q",
+            "--allow-empty",
+            "-m",
+            "init",
+        ],
+        check=True,
+    )
+    subprocess.run(
+        ["git", "-C", str(repo_path), "worktree", "add", "-q", str(worktree_path)],
+        check=True,
+    )
+    monkeypatch.chdir(worktree_path)
+
+    save_commit_template("Worktree template", RepoContext())
+
+    # .git is a file in a linked worktree; the template lives in its git dir.
+    assert (worktree_path / ".git").is_file()
+    assert get_commit_template(RepoContext()) == "Worktree template"
+
+
 def test_run_pre_commit_hook(tmpdir):
     repo_path = tmpdir.mkdir("repo")
     git_path = repo_path.mkdir(".git")
@@ -117,3 +146,165 @@ def test_run_pre_commit_hook(tmpdir):
     with patch("commitai.git.get_repository_name") as mock_get_repo_name:
         mock_get_repo_name.return_value = str(repo_path)
         assert run_pre_commit_hook() is False
+
+
+def test_repo_context_reads_metadata_in_one_call():
+    with patch("subprocess.check_output") as mock_check_output:
+        mock_check_output.return_value = (
+            b"/path/to/repo\n/path/to/repo/.git\nabc123\nmain\n"
+        )
+        repo = RepoContext()
+        assert repo.toplevel == "/path/to/repo"
+        assert repo.git_dir == "/path/to/repo/.git"
+        assert repo.head_sha == "abc123"
+        assert repo.branch == "main"
+        mock_check_output.assert_called_once()
+
+
+def test_repo_context_unborn_branch():
+    def check_output_side_effect(args, **kwargs):
+        if "HEAD" in args and args[1] == "rev-parse":
+            raise subprocess.CalledProcessError(128, args)
+        if args[1] == "rev-parse":
+            return b"/path/to/repo\n/path/to/repo/.git\n"
+        return b"main\n"
+
+    with patch("subprocess.check_output", side_effect=check_output_side_effect):
+        repo = RepoContext()
+        assert repo.toplevel == "/path/to/repo"
+        assert repo.branch == "main"
+        assert repo.head_sha is None
+
+
+def test_repo_context_memoizes_staged_diff():
+    with patch("commitai.git.read_staged_diff") as mock_read:
+        mock_read.return_value = BudgetedDiff("diff --git a/x b/x\n", 19, [])
+        repo = RepoContext(max_diff_bytes=100)
+        assert repo.staged_diff == "diff --git a/x b/x\n"
+        assert repo.truncated_files == []
+        mock_read.assert_called_once_with(100, None, find_moves=False)
+
+        repo.invalidate_staged_diff()
+        mock_read.return_value = BudgetedDiff("", 0, [])
+        assert repo.staged_diff == ""
+        assert mock_read.call_count == 2
+
+
+def _fake_diff_process(output: bytes, returncode: int = 0) -> MagicMock:
+    process = MagicMock()
+    process.stdout = io.BytesIO(output)
+    process.wait.return_value = returncode
+    process.args = ["git", "diff", "--staged"]
+    return process
+
+
+STREAMED_DIFF = (
+    b"diff --git a/small.txt b/small.txt\n"
+    b"@@ -1 +1 @@\n-old\n+new\n"
+    b"diff --git a/big.lock b/big.lock\n"
+    b"@@ -1 +1 @@\n" + b"+" + b"x" * 200 + b"\n"
+    b"diff --git a/after.txt b/after.txt\n"
+    b"@@ -0,0 +1 @@\n+tail\n"
+)
+
+
+def test_read_staged_diff_without_budget():
+    with patch("subprocess.Popen", return_value=_fake_diff_process(STREAMED_DIFF)):
+        result = read_staged_diff(None)
+    assert result.text == STREAMED_DIFF.decode()
+    assert result.total_bytes == len(STREAMED_DIFF)
+    assert result.truncated == []
+
+
+def test_read_staged_diff_records_truncated_files():
+    with patch("subprocess.Popen", return_value=_fake_diff_process(STREAMED_DIFF)):
+        result = read_staged_diff(120)
+    assert result.text.startswith("diff --git a/small.txt b/small.txt\n")
+    assert "x" * 200 not in result.text
+    assert "tail" not in result.text
+    assert len(result.text.encode()) <= 120
+    assert result.total_bytes == len(STREAMED_DIFF)
+    assert [t.path for t in result.truncated] == ["big.lock", "after.txt"]
+    omitted = sum(t.omitted_bytes for t in result.truncated)
+    assert omitted == len(STREAMED_DIFF) - len(result.text.encode())
+
+
+NOISY_DIFF = (
+    b"diff --git a/package-lock.json b/package-lock.json\n"
+    b"@@ -1,2 +1,2 @@\n"
+    + b"-old\n" * 50
+    + b"+new\n" * 60
+    + b"diff --git a/app.js b/app.js\n"
+    b"@@ -1 +1 @@\n-a\n+b\n"
+    b"diff --git a/logo.png b/logo.png\n"
+    b"Binary files a/logo.png and b/logo.png differ\n"
+    b"diff --git a/bundle.js b/bundle.js\n"
+    b"@@ -1 +1 @@\n+" + b"x;" * 600 + b"\n"
+)
+
+
+def test_read_staged_diff_filters_noise():
+    with patch("subprocess.Popen", return_value=_fake_diff_process(NOISY_DIFF)):
+        result = read_staged_diff(200, NoiseFilter())
+
+    assert [(f.path, f.reason) for f in result.filtered] == [
+        ("package-lock.json", "lockfile"),
+        ("logo.png", "binary file"),
+        ("bundle.js", "minified or generated content"),
+    ]
+    lockfile = result.filtered[0]
+    assert (lockfile.added, lockfile.removed) == (60, 50)
+    # Filtered files do not use up the budget, so app.js is kept whole.
+    assert "diff --git a/app.js b/app.js\n@@ -1 +1 @@\n-a\n+b\n" in result.text
+    assert "[commitai] package-lock.json: lockfile omitted (+60 -50 lines" in (
+        result.text
+    )
+    assert "x;x;" not in result.text
+    assert result.truncated == []
+    assert result.total_bytes == len(NOISY_DIFF)
+
+
+def test_read_staged_diff_keeps_prose_with_a_long_line():
+    prose = (
+        b"diff --git a/README.md b/README.md\n"
+        b"@@ -1,2 +1,2 @@\n-Old title\n+New title\n"
+        b"+" + b"An unwrapped paragraph of prose. " * 40 + b"\n"
+    )
+    with patch("subprocess.Popen", return_value=_fake_diff_process(prose)):
+        result = read_staged_diff(None, NoiseFilter())
+
+    assert result.filtered == []
+    assert result.text == prose.decode()
+
+
+def test_read_staged_diff_raises_on_git_error():
+    with patch("subprocess.Popen", return_value=_fake_diff_process(b"", 128)):
+        with pytest.raises(subprocess.CalledProcessError):
+            read_staged_diff()
+
+
+def test_run_pre_commit_hook_with_repo_context(tmpdir):
+    git_path = tmpdir.mkdir("repo").mkdir(".git")
+    pre_commit_path = git_path.mkdir("hooks").join("pre-commit")
+    pre_commit_path.write("#!/bin/sh\nexit 1")
+    pre_commit_path.chmod(0o755)
+
+    with patch("commitai.git._read_repo_metadata") as mock_metadata:
+        mock_metadata.return_value.git_dir = str(git_path)
+        repo = RepoContext()
+        assert run_pre_commit_hook(repo) is False
+
+    git_path.join("commit_template.txt").write("Repo template")
+    with patch("commitai.git._read_repo_metadata") as mock_metadata:
+        mock_metadata.return_value.git_dir = str(git_path)
+        assert get_commit_template(RepoContext()) == "Repo template"
+
+
+def test_list_staged_paths_parses_renames():
+    output = b"M\0src/a.py\0R087\0old name.py\0new name.py\0A\0b.py\0"
+    with patch("subprocess.check_output", return_value=output):
+        assert list_staged_paths() == [
+            StagedPath("src/a.py", "src/a.py"),
+            StagedPath("new name.py", "old name.py"),
+            StagedPath("b.py", "b.py"),
+        ]
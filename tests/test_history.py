@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import threading
+
+import pytest
+
+from commitai.git import CommitInfo
+from commitai.history import (
+    format_filter_repo_callback,
+    format_json,
+    format_rebase_todo,
+    load_progress,
+    progress_path,
+    reword_commits,
+    write_message_files,
+)
+from commitai.llm import RateLimiter
+
+COMMITS = [CommitInfo(f"{i:040d}", f"wip {i}\n\nbody") for i in range(5)]
+
+
+def test_progress_path_depends_on_range_and_model(tmp_path):
+    path = progress_path(str(tmp_path), "main..HEAD", "gpt-4")
+    assert path.startswith(str(tmp_path / "commitai" / "history"))
+    assert path == progress_path(str(tmp_path), "main..HEAD", "gpt-4")
+    assert path != progress_path(str(tmp_path), "main..HEAD", "claude-3")
+    assert path != progress_path(str(tmp_path), "HEAD~3..HEAD", "gpt-4")
+
+
+def test_reword_commits_generates_all_and_records_progress(tmp_path):
+    progress = str(tmp_path / "history" / "run.jsonl")
+    done = []
+    messages = reword_commits(
+        COMMITS,
+        lambda commit: f"feat: {commit.message.split()[1]}",
+        progress,
+        concurrency=3,
+        on_done=lambda commit, message: done.append(commit.sha),
+    )
+    assert list(messages) == [commit.sha for commit in COMMITS]
+    assert messages[COMMITS[2].sha] == "feat: 2"
+    assert sorted(done) == sorted(messages)
+    assert load_progress(progress) == messages
+
+
+def test_reword_commits_resumes_after_interruption(tmp_path):
+    progress = str(tmp_path / "run.jsonl")
+    calls = []
+    lock = threading.Lock()
+
+    def flaky(commit):
+        with lock:
+            calls.append(commit.sha)
+        if commit.sha == COMMITS[3].sha:
+            raise RuntimeError("rate limited")
+        return f"msg {commit.sha[-1]}"
+
+    with pytest.raises(RuntimeError):
+        reword_commits(COMMITS, flaky, progress, concurrency=1)
+    saved = load_progress(progress)
+    assert set(saved) == {commit.sha for commit in COMMITS[:3]}
+
+    calls.clear()
+    messages = reword_commits(COMMITS, lambda c: f"msg {c.sha[-1]}", progress)
+    assert len(messages) == 5
+    assert load_progress(progress) == messages
+    assert calls == []
+
+
+def test_load_progress_skips_partial_lines(tmp_path):
+    progress = tmp_path / "run.jsonl"
+    progress.write_text('{"sha": "a", "message": "one"}\n{"sha": "b", "mes')
+    assert load_progress(str(progress)) == {"a": "one"}
+    assert load_progress(str(tmp_path / "missing.jsonl")) == {}
+
+
+def test_reword_commits_uses_rate_limiter(tmp_path):
+    class CountingLimiter(RateLimiter):
+        acquired = 0
+
+        def acquire(self):
+            CountingLimiter.acquired += 1
+
+    reword_commits(
+        COMMITS[:2],
+        lambda commit: "msg",
+        str(tmp_path / "run.jsonl"),
+        rate_limiter=CountingLimiter(60),
+    )
+    assert CountingLimiter.acquired == 2
+
+
+def test_formatters(tmp_path):
+    messages = {COMMITS[0].sha: "feat: one", COMMITS[1].sha: "fix: two"}
+    assert json.loads(format_json(messages)) == messages
+
+    paths = write_message_files(messages, str(tmp_path / "messages"))
+    with open(paths[COMMITS[1].sha]) as f:
+        assert f.read() == "fix: two"
+
+    todo = format_rebase_todo(COMMITS[:2], paths).splitlines()
+    assert todo[0] == f"pick {COMMITS[0].sha} wip 0"
+    assert todo[1].startswith("exec git commit --amend --only")
+    assert todo[1].endswith(paths[COMMITS[0].sha])
+
+    mapping = tmp_path / "mapping.json"
+    mapping.write_text(format_json(messages))
+    callback = format_filter_repo_callback(str(mapping))
+
+    class FakeCommit:
+        original_id = COMMITS[1].sha.encode()
+        message = b"old"
+
+    namespace = {"commit": FakeCommit()}
+    exec(callback, namespace)
+    assert namespace["commit"].message == b"fix: two\n"
+    assert os.path.exists(mapping)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import sys
+
+import pytest
+
+from commitai import hooks
+
+
+def test_render_hooks():
+    prepare = hooks.render_hook(hooks.PREPARE_COMMIT_MSG, ["--model", "gpt-4o"])
+    assert prepare.startswith("#!/bin/sh\n" + hooks.HOOK_MARKER)
+    assert prepare.rstrip().endswith(
+        f"{sys.executable} -m commitai.cli hook prepare-commit-msg "
+        '--model gpt-4o "$@"'
+    )
+    prewarm = hooks.render_hook(hooks.POST_INDEX_CHANGE)
+    assert " hook prewarm </dev/null >/dev/null 2>&1 &\n" in prewarm
+
+
+def test_install_and_uninstall_hooks(tmp_path):
+    directory = str(tmp_path / "hooks")
+    path = hooks.install_hook(directory, hooks.PREPARE_COMMIT_MSG)
+    assert os.access(path, os.X_OK)
+    assert hooks.is_commitai_hook(path)
+    # Reinstalling our own hook is fine.
+    hooks.install_hook(directory, hooks.PREPARE_COMMIT_MSG, ["-m", "gpt-4"])
+
+    foreign = os.path.join(directory, hooks.POST_INDEX_CHANGE)
+    with open(foreign, "w") as f:
+        f.write("#!/bin/sh\necho mine\n")
+    with pytest.raises(FileExistsError):
+        hooks.install_hook(directory, hooks.POST_INDEX_CHANGE)
+
+    assert hooks.uninstall_hooks(directory) == [path]
+    assert os.path.exists(foreign)
+    hooks.install_hook(directory, hooks.POST_INDEX_CHANGE, force=True)
+    assert hooks.is_commitai_hook(foreign)
+
+
+def test_hooks_dir(tmp_path, monkeypatch):
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    monkeypatch.chdir(tmp_path)
+    assert hooks.hooks_dir() == os.path.realpath(tmp_path / ".git" / "hooks")
+
+
+def test_insert_message(tmp_path):
+    path = tmp_path / "COMMIT_EDITMSG"
+    path.write_text("\n# Please enter the commit message for your changes.\n")
+    hooks.insert_message(str(path), "feat: add hooks\n\n")
+    assert path.read_text() == (
+        "feat: add hooks\n\n# Please enter the commit message for your changes.\n"
+    )
+
+
+def test_prewarm_lock(tmp_path):
+    lock = hooks.prewarm_lock_path(str(tmp_path))
+    assert hooks.lock_holder(lock) is None
+    assert hooks.try_lock(lock)
+    assert hooks.lock_holder(lock) == os.getpid()
+    assert not hooks.try_lock(lock)
+    assert not hooks.wait_for_unlock(lock, timeout=0)
+
+    hooks.unlock(lock)
+    assert hooks.wait_for_unlock(lock, timeout=0)
+
+
+def test_stale_prewarm_lock_is_replaced(tmp_path):
+    lock = hooks.prewarm_lock_path(str(tmp_path))
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    os.makedirs(os.path.dirname(lock))
+    with open(lock, "w") as f:
+        f.write(str(process.pid))
+    assert hooks.lock_holder(lock) is None
+    assert hooks.try_lock(lock)
+
+
+def test_prewarmed_tree(tmp_path):
+    assert hooks.read_prewarmed_tree(str(tmp_path)) is None
+    hooks.write_prewarmed_tree(str(tmp_path), "abc123")
+    assert hooks.read_prewarmed_tree(str(tmp_path)) == "abc123"
+
+
+def test_old_prewarm_lock_is_stale(tmp_path):
+    lock = hooks.prewarm_lock_path(str(tmp_path))
+    assert hooks.try_lock(lock)
+    old = os.path.getmtime(lock) - hooks.STALE_LOCK_AGE - 1
+    os.utime(lock, (old, old))
+    assert hooks.lock_holder(lock) is None
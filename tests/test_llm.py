@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from commitai.llm import (
+    CacheBreakpointChatModel,
+    ConcurrencyLimitedChatModel,
+    Prompt,
+    RateLimiter,
+    ResilientChatModel,
+    RetryPolicy,
+    TokenUsage,
+    UsageMeter,
+    backoff_delay,
+    generate_text,
+    invoke_text,
+    is_transient_error,
+    metering,
+    rate_limiter_for,
+    response_text,
+    stream_text,
+    token_usage,
+)
+
+
+def _chunk(content, usage=None):
+    chunk = MagicMock()
+    chunk.content = content
+    chunk.usage_metadata = usage
+    return chunk
+
+
+def _usage(input_tokens, cache_read=0, cache_creation=0):
+    return TokenUsage(input_tokens, cache_read, cache_creation).as_metadata()
+
+
+def test_response_text_stringifies_content():
+    assert response_text(_chunk("text")) == "text"
+    assert response_text(_chunk(["a", "b"])) == "['a', 'b']"
+
+
+def test_invoke_text():
+    llm = MagicMock()
+    llm.invoke.return_value = _chunk("feat: x")
+    assert invoke_text(llm, "prompt") == "feat: x"
+    llm.invoke.assert_called_once_with(input="prompt")
+
+
+def test_stream_text_forwards_tokens():
+    llm = MagicMock()
+    llm.stream.return_value = iter([_chunk("feat"), _chunk(""), _chunk(": x")])
+    tokens = []
+    assert stream_text(llm, "prompt", tokens.append) == "feat: x"
+    assert tokens == ["feat", ": x"]
+    llm.stream.assert_called_once_with(input="prompt")
+
+
+def test_prompt_is_sent_as_system_and_user_messages():
+    llm = MagicMock()
+    llm.invoke.return_value = _chunk("feat: x")
+    prompt = Prompt("Write a commit message.", "diff --git a/x b/x")
+
+    assert invoke_text(llm, prompt) == "feat: x"
+
+    llm.invoke.assert_called_once_with(
+        input=[
+            {"role": "system", "content": "Write a commit message."},
+            {"role": "user", "content": "diff --git a/x b/x"},
+        ]
+    )
+    assert prompt.text == "Write a commit message.\n\ndiff --git a/x b/x"
+
+
+def test_token_usage():
+    assert token_usage(_chunk("x")) is None
+    assert token_usage(_chunk("x", {"input_tokens": 7})) == TokenUsage(7, 0, 0)
+    assert token_usage(_chunk("x", _usage(9, 6, 3))) == TokenUsage(9, 6, 3)
+
+
+def test_metering_adds_up_usage_of_every_response():
+    llm = MagicMock()
+    llm.invoke.return_value = _chunk("feat: x", _usage(2000, 1500))
+    llm.stream.return_value = iter(
+        [_chunk("feat", _usage(1000, 0, 900)), _chunk(": y", {"input_tokens": 0})]
+    )
+    meter = UsageMeter()
+
+    with metering(meter):
+        invoke_text(llm, "prompt")
+        stream_text(llm, "prompt", lambda token: None)
+    invoke_text(llm, "prompt")
+
+    assert meter.total == TokenUsage(3000, 1500, 900)
+
+    own_meter = UsageMeter()
+    invoke_text(llm, "prompt", own_meter)
+    assert own_meter.total == TokenUsage(2000, 1500, 0)
+
+
+def test_cache_breakpoint_marks_system_messages():
+    llm = MagicMock()
+    cached = CacheBreakpointChatModel(llm)
+
+    cached.invoke(input=Prompt("rules", "diff").messages())
+    cached.invoke(input="plain prompt")
+    list(cached.stream(input=Prompt("rules", "diff").messages()))
+
+    block = {"type": "text", "text": "rules", "cache_control": {"type": "ephemeral"}}
+    marked = [
+        {"role": "system", "content": [block]},
+        {"role": "user", "content": "diff"},
+    ]
+    assert llm.invoke.call_args_list[0].kwargs == {"input": marked}
+    assert llm.invoke.call_args_list[1].kwargs == {"input": "plain prompt"}
+    llm.stream.assert_called_once_with(input=marked)
+
+
+def test_cache_breakpoint_skips_short_prefixes():
+    llm = MagicMock()
+    cached = CacheBreakpointChatModel(llm, min_tokens=1024)
+    short = Prompt("rules", "diff").messages()
+    long = Prompt("rules " * 1024, "diff").messages()
+
+    cached.invoke(input=short)
+    cached.invoke(input=long)
+
+    assert llm.invoke.call_args_list[0].kwargs == {"input": short}
+    [block] = llm.invoke.call_args_list[1].kwargs["input"][0]["content"]
+    assert block["cache_control"] == {"type": "ephemeral"}
+
+
+def test_generate_text_picks_mode():
+    llm = MagicMock()
+    llm.invoke.return_value = _chunk("invoked")
+    llm.stream.return_value = iter([_chunk("streamed")])
+    assert generate_text(llm, "prompt") == "invoked"
+    assert generate_text(llm, "prompt", lambda token: None) == "streamed"
+
+
+def test_rate_limiter_spaces_requests():
+    limiter = RateLimiter(per_minute=60)
+    with patch("time.sleep") as mock_sleep, patch("time.monotonic", return_value=100.0):
+        limiter.acquire()
+        limiter.acquire()
+        limiter.acquire()
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [1.0, 2.0]
+
+
+def test_rate_limiter_for_shares_per_provider():
+    assert rate_limiter_for("gpt-", 30) is rate_limiter_for("gpt-", 30)
+    assert rate_limiter_for("gpt-", 30) is not rate_limiter_for("claude-", 30)
+    assert rate_limiter_for("gpt-", 60).interval == 1.0
+
+
+def test_concurrency_limited_model_caps_requests_in_flight():
+    lock = threading.Lock()
+    in_flight = []
+    peak = []
+
+    def invoke(input, **kwargs):
+        with lock:
+            in_flight.append(input)
+            peak.append(len(in_flight))
+        time.sleep(0.02)
+        with lock:
+            in_flight.remove(input)
+        return _chunk(input)
+
+    inner = MagicMock()
+    inner.invoke.side_effect = invoke
+    inner.stream.return_value = iter([_chunk("a"), _chunk("b")])
+    llm = ConcurrencyLimitedChatModel(inner, 2)
+
+    threads = [
+        threading.Thread(target=llm.invoke, args=(str(n),), kwargs={"stop": None})
+        for n in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(peak) == 2
+    inner.invoke.assert_any_call("0", stop=None)
+    assert [chunk.content for chunk in llm.stream("x")] == ["a", "b"]
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class RateLimitError(Exception):
+    pass
+
+
+def test_is_transient_error():
+    assert is_transient_error(_StatusError(429))
+    assert is_transient_error(_StatusError(503))
+    assert not is_transient_error(_StatusError(401))
+    assert is_transient_error(TimeoutError())
+    assert is_transient_error(RateLimitError())
+    assert not is_transient_error(ValueError("bad request"))
+
+
+def test_backoff_delay_is_capped():
+    policy = RetryPolicy(attempts=5, base_delay=1.0, max_delay=4.0)
+    with patch("commitai.llm.random.uniform", side_effect=lambda a, b: b):
+        assert [backoff_delay(n, policy) for n in range(4)] == [1.0, 2.0, 4.0, 4.0]
+
+
+@patch("commitai.llm.time.sleep")
+def test_resilient_model_retries_transient_errors(mock_sleep):
+    llm = MagicMock()
+    llm.invoke.side_effect = [_StatusError(429), _StatusError(502), "ok"]
+    model = ResilientChatModel("gpt-4", llm, policy=RetryPolicy(attempts=3))
+
+    assert model.invoke("prompt") == "ok"
+    assert llm.invoke.call_count == 3
+    assert mock_sleep.call_count == 2
+
+
+@patch("commitai.llm.time.sleep")
+def test_resilient_model_does_not_retry_permanent_errors(mock_sleep):
+    llm = MagicMock()
+    llm.invoke.side_effect = ValueError("invalid api key")
+    model = ResilientChatModel("gpt-4", llm)
+
+    with pytest.raises(ValueError):
+        model.invoke("prompt")
+    assert llm.invoke.call_count == 1
+    mock_sleep.assert_not_called()
+
+
+@patch("commitai.llm.time.sleep")
+def test_resilient_model_falls_back_lazily(mock_sleep):
+    primary = MagicMock()
+    primary.invoke.side_effect = _StatusError(503)
+    fallback = MagicMock()
+    fallback.invoke.return_value = "from fallback"
+    create = MagicMock(return_value=fallback)
+    model = ResilientChatModel(
+        "gpt-4", primary, ["claude-3"], create, RetryPolicy(attempts=2)
+    )
+
+    assert model.invoke("prompt") == "from fallback"
+    assert primary.invoke.call_count == 2
+    create.assert_called_once_with("claude-3")
+    # The fallback is created once and reused.
+    model.invoke("prompt")
+    create.assert_called_once_with("claude-3")
+
+
+def test_resilient_model_skips_fallbacks_when_primary_works():
+    primary = MagicMock()
+    primary.invoke.return_value = "ok"
+    create = MagicMock()
+    model = ResilientChatModel("gpt-4", primary, ["claude-3"], create)
+
+    assert model.invoke("prompt") == "ok"
+    create.assert_not_called()
+
+
+@patch("commitai.llm.time.sleep")
+def test_resilient_model_stream_retries_before_first_chunk(mock_sleep):
+    llm = MagicMock()
+    llm.stream.side_effect = [_StatusError(429), iter([_chunk("a"), _chunk("b")])]
+    model = ResilientChatModel("gpt-4", llm)
+
+    assert [c.content for c in model.stream("prompt")] == ["a", "b"]
+    assert mock_sleep.call_count == 1
+
+
+def test_resilient_model_stream_does_not_retry_after_output():
+    def broken_stream(**kwargs):
+        yield _chunk("a")
+        raise _StatusError(502)
+
+    llm = MagicMock()
+    llm.stream.side_effect = broken_stream
+    model = ResilientChatModel("gpt-4", llm)
+
+    tokens = []
+    with pytest.raises(_StatusError):
+        for chunk in model.stream("prompt"):
+            tokens.append(chunk.content)
+    assert tokens == ["a"]
+    assert llm.stream.call_count == 1
+
+
+def test_resilient_model_ainvoke_retries():
+    async def no_sleep(delay):
+        return None
+
+    llm = MagicMock()
+    calls = []
+
+    async def ainvoke(input, **kwargs):
+        calls.append(input)
+        if len(calls) == 1:
+            raise TimeoutError()
+        return "ok"
+
+    llm.ainvoke = ainvoke
+    model = ResilientChatModel("gpt-4", llm)
+
+    with patch("asyncio.sleep", no_sleep):
+        assert asyncio.run(model.ainvoke("prompt")) == "ok"
+    assert calls == ["prompt", "prompt"]
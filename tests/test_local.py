@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from commitai import local
+from commitai.config import ConfigError
+from commitai.providers import create_chat_model
+
+
+class _StubOllama(BaseHTTPRequestHandler):
+    """Answers the Ollama API calls commitai makes and records them."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append((self.path, body))
+        if body["model"] == "missing":
+            self._reply(404, {"error": "model 'missing' not found"})
+        elif self.path == "/api/generate":
+            self._reply(
+                200, {"model": body["model"], "done": True, "load_duration": 2e9}
+            )
+        else:
+            self._reply(
+                200,
+                {
+                    "model": body["model"],
+                    "created_at": "2024-01-01T00:00:00Z",
+                    "message": {"role": "assistant", "content": "feat: stub"},
+                    "done": True,
+                    "done_reason": "stop",
+                },
+            )
+
+    def _reply(self, status, payload):
+        data = (json.dumps(payload) + "\n").encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def ollama_server(monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubOllama)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setenv("OLLAMA_HOST", f"127.0.0.1:{server.server_address[1]}")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_warm_up_loads_the_model(ollama_server):
+    assert local.warm_up("ollama/qwen2.5-coder:7b", "2h") == 2.0
+    assert ollama_server.requests == [
+        (
+            "/api/generate",
+            {
+                "model": "qwen2.5-coder:7b",
+                "keep_alive": "2h",
+                "options": {"num_ctx": local.DEFAULT_NUM_CTX},
+                "stream": False,
+            },
+        )
+    ]
+
+
+def test_warm_up_uses_the_given_server(ollama_server, monkeypatch):
+    monkeypatch.setenv("OLLAMA_HOST", "127.0.0.1:1")
+    url = f"http://127.0.0.1:{ollama_server.server_address[1]}/"
+    assert local.warm_up("llama3", base_url=url) == 2.0
+    assert ollama_server.requests[-1][1]["model"] == "llama3"
+
+
+def test_warm_up_reports_ollama_errors(ollama_server):
+    with pytest.raises(local.OllamaError, match="model 'missing' not found"):
+        local.warm_up("missing")
+
+
+def test_warm_up_reports_unreachable_server(monkeypatch):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    monkeypatch.setenv("OLLAMA_HOST", f"http://127.0.0.1:{port}")
+    with pytest.raises(local.OllamaError, match="Could not reach Ollama"):
+        local.warm_up("llama3")
+
+
+def test_requests_keep_the_model_loaded_and_fit_the_prompt(ollama_server):
+    llm = create_chat_model("ollama/qwen2.5-coder:7b")
+
+    assert llm.invoke(input="x" * 60_000).content == "feat: stub"
+    path, body = ollama_server.requests[-1]
+    assert path == "/api/chat"
+    assert body["model"] == "qwen2.5-coder:7b"
+    assert body["keep_alive"] == "30m"
+    # 20000 prompt tokens and a 1024 token answer need the 32k context.
+    assert body["options"]["num_ctx"] == 32_768
+    assert body["options"]["num_predict"] == 1024
+    assert body["options"]["temperature"] == 0.7
+
+
+def test_configuration_overrides_the_request_size(ollama_server, monkeypatch):
+    monkeypatch.setenv("COMMITAI_OLLAMA_KEEP_ALIVE", "-1")
+    monkeypatch.setenv("COMMITAI_OLLAMA_NUM_CTX", "4096")
+    monkeypatch.setenv("COMMITAI_OLLAMA_NUM_PREDICT", "128")
+    llm = local.create_model("llama3")
+
+    llm.invoke(input="small diff")
+    body = ollama_server.requests[-1][1]
+    assert body["keep_alive"] == -1
+    assert body["options"]["num_ctx"] == 4096
+    assert body["options"]["num_predict"] == 128
+
+
+def test_warm_up_uses_the_configured_context(ollama_server, tmp_path, monkeypatch):
+    config = tmp_path / "config.toml"
+    config.write_text('ollama_num_ctx = 16384\nollama_keep_alive = "1h"\n')
+    monkeypatch.setenv("COMMITAI_CONFIG", str(config))
+
+    local.warm_up("llama3")
+    body = ollama_server.requests[-1][1]
+    assert body["keep_alive"] == "1h"
+    assert body["options"]["num_ctx"] == 16_384
+
+
+def test_invalid_configuration_is_reported(monkeypatch):
+    monkeypatch.setenv("COMMITAI_OLLAMA_NUM_CTX", "lots")
+    with pytest.raises(ConfigError, match="COMMITAI_OLLAMA_NUM_CTX"):
+        local.create_model("llama3")
+
+
+def test_request_size_derivation():
+    assert local.num_predict_for(100) == local.MIN_NUM_PREDICT
+    assert local.num_predict_for(4000) == 500
+    assert local.num_predict_for(100_000) == local.MAX_NUM_PREDICT
+    assert local.num_ctx_for(1000, 256) == local.DEFAULT_NUM_CTX
+    assert local.num_ctx_for(8000, 1000) == 16_384
+
+
+def test_host_and_keep_alive_parsing(monkeypatch):
+    monkeypatch.delenv("OLLAMA_HOST", raising=False)
+    assert local.host() == local.DEFAULT_HOST
+    monkeypatch.setenv("OLLAMA_HOST", "https://ollama.internal/")
+    assert local.host() == "https://ollama.internal"
+    assert local.keep_alive("300") == 300
+    assert local.keep_alive("1h") == "1h"
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import json
+import threading
+
+from commitai.profiling import Profiler, activate, event, span
+
+
+def test_span_is_a_noop_without_profiler():
+    with span("ignored"):
+        pass
+
+
+def test_spans_record_nesting_and_attrs():
+    profiler = Profiler({"model": "gpt-4"})
+    with activate(profiler):
+        with span("outer"):
+            with span("inner", index=1):
+                pass
+
+    inner, outer = profiler.spans
+    assert (outer.name, outer.depth) == ("outer", 0)
+    assert (inner.name, inner.depth, inner.attrs) == ("inner", 1, {"index": 1})
+    assert outer.duration >= inner.duration
+
+
+def test_events_are_recorded_as_instants():
+    event("ignored", tokens=1)
+    profiler = Profiler()
+    with activate(profiler), span("llm"):
+        event("prompt_cache", cache_read_tokens=1536)
+
+    instant = profiler.spans[0]
+    assert (instant.name, instant.duration, instant.depth) == ("prompt_cache", 0, 1)
+    assert instant.attrs == {"cache_read_tokens": 1536}
+
+
+def test_activate_restores_previous_profiler():
+    outer, inner = Profiler(), Profiler()
+    with activate(outer):
+        with activate(inner):
+            with span("a"):
+                pass
+        with span("b"):
+            pass
+    assert [s.name for s in inner.spans] == ["a"]
+    assert [s.name for s in outer.spans] == ["b"]
+
+
+def test_spans_from_worker_threads():
+    def work():
+        with span("worker"):
+            pass
+
+    profiler = Profiler()
+    with activate(profiler):
+        with span("main"):
+            worker = threading.Thread(target=work)
+            worker.start()
+            worker.join()
+
+    worker_span = next(s for s in profiler.spans if s.name == "worker")
+    # Depth is tracked per thread, so the worker's span is a root span.
+    assert worker_span.depth == 0
+    assert "worker [thread]" in profiler.format_breakdown()
+
+
+def test_json_lines_output(tmp_path):
+    profiler = Profiler({"run_id": "abc"})
+    profiler.record("startup", profiler.origin, profiler.origin + 0.5)
+    path = tmp_path / "profile.jsonl"
+    profiler.write(str(path))
+    profiler.write(str(path))
+
+    entries = [json.loads(line) for line in path.read_text().splitlines()]
+    assert len(entries) == 2
+    assert entries[0] == {
+        "run_id": "abc",
+        "name": "startup",
+        "start_ms": 0.0,
+        "duration_ms": 500.0,
+        "thread": threading.get_ident(),
+        "depth": 0,
+    }
+
+
+def test_chrome_trace_output(tmp_path):
+    profiler = Profiler({"run_id": "abc"})
+    profiler.record("llm", profiler.origin + 1, profiler.origin + 3, model="x")
+    path = tmp_path / "trace.json"
+    profiler.write(str(path), "chrome")
+
+    trace = json.loads(path.read_text())
+    (event,) = trace["traceEvents"]
+    assert event["ph"] == "X"
+    assert (event["ts"], event["dur"]) == (1_000_000, 2_000_000)
+    assert event["args"] == {"model": "x"}
+    assert trace["otherData"] == {"run_id": "abc"}
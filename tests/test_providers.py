@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+import re
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+
+import click
+import pytest
+
+from commitai.config import ConfigError, load_config
+from commitai.llm import ConcurrencyLimitedChatModel
+from commitai.providers import (
+    _PROVIDERS,
+    UNUSED_API_KEY,
+    ModelAlias,
+    create_chat_model,
+    get_google_api_key,
+    load_entry_points,
+    parse_model_aliases,
+    provider_key,
+    register_provider,
+    resolve_provider,
+)
+
+# Cumulative cold-start import budget for ``commitai.cli`` (microseconds).
+IMPORT_BUDGET_US = 100_000
+
+
+def _import_profile(module: str) -> str:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+
+def _cumulative_us(profile: str, module: str) -> int:
+    pattern = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|\s*" + re.escape(module))
+    for line in profile.splitlines():
+        match = pattern.search(line)
+        if match and line.rstrip().endswith(module):
+            return int(match.group(1))
+    raise AssertionError(f"{module} not found in import profile")
+
+
+def test_cli_import_does_not_load_providers():
+    profile = _import_profile("commitai.cli")
+    assert "langchain" not in profile
+    assert "openai" not in profile
+    assert "anthropic" not in profile
+
+
+def test_cli_import_time_within_budget():
+    # Take the best of a few runs to smooth out noisy CI machines.
+    best = min(
+        _cumulative_us(_import_profile("commitai.cli"), "commitai.cli")
+        for _ in range(3)
+    )
+    assert best < IMPORT_BUDGET_US, f"commitai.cli import took {best}us"
+
+
+def test_resolve_provider_by_prefix():
+    assert resolve_provider("gpt-4") is not None
+    assert resolve_provider("claude-3-opus") is not None
+    assert resolve_provider("gemini-pro") is not None
+    assert resolve_provider("llama3") is not None
+    assert resolve_provider("mistral") is None
+
+
+def test_register_provider_takes_precedence():
+    factory = MagicMock()
+    register_provider("gpt-", factory)
+    try:
+        assert resolve_provider("gpt-4") is factory
+    finally:
+        _PROVIDERS.remove(("gpt-", factory))
+    assert resolve_provider("gpt-4") is not factory
+
+
+def test_create_chat_model_reuses_clients():
+    factory = MagicMock(side_effect=lambda model, timeout: MagicMock())
+    register_provider("fake-", factory)
+    try:
+        first = create_chat_model("fake-model", 10.0)
+        assert create_chat_model("fake-model", 10.0) is first
+        assert create_chat_model("fake-model", 20.0) is not first
+        assert factory.call_count == 2
+        factory.assert_any_call("fake-model", 10.0)
+    finally:
+        _PROVIDERS.remove(("fake-", factory))
+
+
+def test_create_chat_model_rejects_unknown_models():
+    with pytest.raises(click.ClickException, match="Unsupported model"):
+        create_chat_model("mistral")
+
+
+@patch("langchain_openai.ChatOpenAI")
+def test_openai_factory_passes_timeout(mock_openai, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "key")
+    factory = resolve_provider("gpt-4")
+    assert factory is not None
+    factory("gpt-4", 12.5)
+    mock_openai.assert_called_once_with(
+        model="gpt-4", api_key="key", temperature=0.7, max_retries=0, timeout=12.5
+    )
+
+
+def test_google_factory_reports_missing_module():
+    factory = resolve_provider("gemini-pro")
+    assert factory is not None
+    with patch.dict(sys.modules, {"langchain_google_genai": None}):
+        with pytest.raises(click.ClickException, match="is not installed"):
+            factory("gemini-pro")
+
+
+def test_get_google_api_key_priority(monkeypatch):
+    for key in ("GOOGLE_API_KEY", "GEMINI_API_KEY", "GOOGLE_GENERATIVE_AI_API_KEY"):
+        monkeypatch.delenv(key, raising=False)
+    assert get_google_api_key() is None
+    monkeypatch.setenv("GOOGLE_GENERATIVE_AI_API_KEY", "generative")
+    assert get_google_api_key() == "generative"
+    monkeypatch.setenv("GEMINI_API_KEY", "gemini")
+    assert get_google_api_key() == "gemini"
+    monkeypatch.setenv("GOOGLE_API_KEY", "google")
+    assert get_google_api_key() == "google"
+
+
+ALIASES_CONFIG = """
+[models.fast]
+provider = "openai"
+model = "Qwen/Qwen2.5-Coder-7B-Instruct"
+base_url = "http://gpu-box:8000/v1"
+timeout = 10
+max_concurrency = 2
+
+[models.cheap]
+model = "gpt-4o-mini"
+"""
+
+
+@pytest.fixture
+def aliases_config(tmp_path, monkeypatch):
+    path = tmp_path / "config.toml"
+    path.write_text(ALIASES_CONFIG)
+    monkeypatch.setenv("COMMITAI_CONFIG", str(path))
+    return path
+
+
+def test_parse_model_aliases(aliases_config):
+    aliases = parse_model_aliases(load_config())
+    assert aliases == {
+        "fast": ModelAlias(
+            "fast",
+            "Qwen/Qwen2.5-Coder-7B-Instruct",
+            "openai",
+            "http://gpu-box:8000/v1",
+            None,
+            10,
+            2,
+        ),
+        "cheap": ModelAlias("cheap", "gpt-4o-mini"),
+    }
+
+
+@pytest.mark.parametrize(
+    "models, error",
+    [
+        ({"x": {"provider": "vllm"}}, "provider must be one of openai"),
+        ({"x": {"base_url": "http://h"}}, "needs a provider"),
+        ({"x": {"timeout": "10"}}, "timeout has the wrong type"),
+        ({"x": {"max_concurrency": 0}}, "max_concurrency must be positive"),
+        ({"x": {"baseurl": "http://h"}}, "unknown keys: baseurl"),
+        ({"x": "gpt-4"}, r"\[models.x\] must be a table"),
+    ],
+)
+def test_parse_model_aliases_rejects_invalid_entries(models, error):
+    with pytest.raises(ConfigError, match=error):
+        parse_model_aliases({"models": models})
+
+
+def test_load_config_reports_invalid_toml(tmp_path):
+    path = tmp_path / "config.toml"
+    path.write_text("[models\n")
+    with pytest.raises(ConfigError, match="Invalid configuration"):
+        load_config(str(path))
+    assert load_config(str(tmp_path / "missing.toml")) == {}
+
+
+@patch("langchain_openai.ChatOpenAI")
+def test_create_chat_model_from_alias(mock_openai, aliases_config, monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+    llm = create_chat_model("fast")
+
+    assert isinstance(llm, ConcurrencyLimitedChatModel)
+    assert llm.llm is mock_openai.return_value
+    mock_openai.assert_called_once_with(
+        model="Qwen/Qwen2.5-Coder-7B-Instruct",
+        api_key=UNUSED_API_KEY,
+        temperature=0.7,
+        max_retries=0,
+        timeout=10,
+        base_url="http://gpu-box:8000/v1",
+    )
+    assert create_chat_model("fast") is llm
+    assert provider_key("fast") == "fast"
+
+
+def test_alias_without_provider_resolves_its_model(aliases_config):
+    factory = MagicMock()
+    register_provider("gpt-4o-mini", factory)
+    try:
+        assert create_chat_model("cheap", 5.0) is factory.return_value
+        factory.assert_called_once_with("gpt-4o-mini", 5.0)
+    finally:
+        _PROVIDERS.remove(("gpt-4o-mini", factory))
+
+
+def test_entry_points_register_lazy_providers():
+    factory = MagicMock()
+    entry_point = MagicMock()
+    entry_point.name = "vllm/"
+    entry_point.load.return_value = factory
+    found = MagicMock()
+    found.select.return_value = [entry_point]
+
+    with (
+        patch("commitai.providers._ENTRY_POINTS_LOADED", False),
+        patch("importlib.metadata.entry_points", return_value=found),
+    ):
+        load_entry_points()
+        load_entry_points()
+    try:
+        found.select.assert_called_once_with(group="commitai.providers")
+        entry_point.load.assert_not_called()
+        assert create_chat_model("vllm/qwen", 3.0) is factory.return_value
+        factory.assert_called_once_with("vllm/qwen", 3.0)
+        assert provider_key("vllm/qwen") == "vllm/"
+    finally:
+        del _PROVIDERS[0]
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from unittest.mock import MagicMock
+
+from commitai.diff import parse_diff
+from commitai.git import StagedPath
+from commitai.scopes import (
+    multi_scope_message,
+    parse_scope_patterns,
+    partition,
+    partition_paths,
+    scope_root,
+)
+
+
+def _diff(*paths):
+    return parse_diff(
+        "".join(
+            f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n"
+            "@@ -1 +1 @@\n-old\n+new\n"
+            for path in paths
+        )
+    )
+
+
+def test_parse_scope_patterns():
+    assert parse_scope_patterns(" packages/*, services/*/ ,,") == (
+        "packages/*",
+        "services/*",
+    )
+    assert parse_scope_patterns(None) == ()
+
+
+def test_scope_root():
+    patterns = ("packages/*", "libs")
+    assert scope_root("packages/api/src/views.py", patterns) == "packages/api"
+    assert scope_root("libs/util.py", patterns) == "libs"
+    # A file matching the pattern is not a directory under it.
+    assert scope_root("packages/README.md", patterns) == ""
+    assert scope_root("docs/index.md", patterns) == ""
+
+
+def test_partition_keeps_first_appearance_order():
+    files = _diff("packages/web/app.js", "README.md", "packages/api/views.py")
+    scopes = partition(files, ("packages/*",))
+    assert [scope.name for scope in scopes] == ["web", "root", "api"]
+    assert [f.path for f in scopes[2].files] == ["packages/api/views.py"]
+
+
+def test_partition_paths_includes_rename_sources():
+    staged = [
+        StagedPath("packages/api/views.py", "packages/api/views.py"),
+        StagedPath("packages/web/moved.py", "packages/api/old.py"),
+    ]
+    assert partition_paths(staged, ("packages/*",)) == {
+        "packages/api": ["packages/api/views.py"],
+        "packages/web": ["packages/web/moved.py", "packages/api/old.py"],
+    }
+
+
+def test_multi_scope_message_summarizes_each_scope():
+    llm = MagicMock()
+    llm.invoke.side_effect = lambda input: MagicMock(
+        content=(
+            "feat(api,web): merged"
+            if input.startswith("REDUCE")
+            else "summary " + input.split("Scope: ")[1].split("\n")[0]
+        )
+    )
+    scopes = partition(
+        _diff("packages/api/views.py", "packages/web/app.js"), ("packages/*",)
+    )
+
+    message = multi_scope_message(llm, scopes, lambda merged: "REDUCE\n" + merged, 1000)
+
+    assert message == "feat(api,web): merged"
+    reduce_prompt = llm.invoke.call_args_list[-1].kwargs["input"]
+    assert "Scope api:\nsummary api" in reduce_prompt
+    assert "Scope web:\nsummary web" in reduce_prompt
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from commitai.semantic import DIMENSIONS, SemanticCache, embed
+
+DIFF = (
+    "diff --git a/app/auth.py b/app/auth.py\n"
+    "--- a/app/auth.py\n+++ b/app/auth.py\n"
+    "@@ -10,3 +10,6 @@ def login(user):\n"
+    "-    token = create_token(user)\n"
+    "+    token = create_token(user, expires_in=3600)\n"
+    "+    audit_log.record('login', user.id)\n"
+    "+    return token\n"
+)
+AMENDED = DIFF + "+    # Tokens expire after an hour.\n"
+UNRELATED = (
+    "diff --git a/docs/install.md b/docs/install.md\n"
+    "--- a/docs/install.md\n+++ b/docs/install.md\n"
+    "@@ -1 +1,2 @@\n"
+    "-Run pip install commitai.\n"
+    "+Install CommitAi with pipx to keep it isolated from your projects.\n"
+)
+
+
+def test_embed_is_a_deterministic_unit_vector():
+    vector = embed(DIFF)
+    assert vector.shape == (DIMENSIONS,)
+    assert np.isclose(np.linalg.norm(vector), 1.0)
+    assert np.array_equal(vector, embed(DIFF))
+    assert not embed("").any()
+
+
+def test_embed_similarity():
+    assert embed(DIFF) @ embed(AMENDED) > 0.9
+    assert embed(DIFF) @ embed(UNRELATED) < 0.3
+
+
+def test_semantic_cache_finds_similar_diffs(tmp_path):
+    cache = SemanticCache.for_repo(str(tmp_path))
+    assert cache.find(DIFF) is None
+
+    cache.add(DIFF, "feat(auth): expire login tokens after an hour")
+    cache.add(UNRELATED, "docs: recommend pipx")
+
+    match = SemanticCache.for_repo(str(tmp_path)).find(AMENDED)
+    assert match is not None
+    assert match.message == "feat(auth): expire login tokens after an hour"
+    assert 0.9 < match.similarity <= 1.0
+    assert SemanticCache.for_repo(str(tmp_path), threshold=0.999).find(AMENDED) is None
+
+
+def test_semantic_cache_replaces_duplicates_and_evicts(tmp_path):
+    path = str(tmp_path / "semantic.npz")
+    cache = SemanticCache(path, max_entries=2)
+    cache.add(DIFF, "first")
+    cache.add(DIFF, "second")
+    assert cache.find(DIFF).message == "second"
+
+    cache.add(UNRELATED, "docs")
+    cache.add(AMENDED + "+    pass\n", "amended")
+    assert cache.clear() == 2
+    assert cache.find(UNRELATED) is None
+
+
+def test_semantic_cache_ignores_corrupt_index(tmp_path):
+    path = tmp_path / "semantic.npz"
+    path.write_bytes(b"not an npz file")
+    cache = SemanticCache(str(path))
+    assert cache.find(DIFF) is None
+    cache.add(DIFF, "message")
+    assert cache.find(DIFF).message == "message"
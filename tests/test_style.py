@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import subprocess
+
+import pytest
+
+from commitai.style import IndexedCommit, StyleIndex
+
+
+def _git(repo, *args):
+    return subprocess.check_output(
+        ["git", "-C", str(repo), "-c", "user.name=t", "-c", "user.email=t@t", *args]
+    ).decode()
+
+
+def _commit(repo, path, message):
+    target = repo / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(message)
+    _git(repo, "add", path)
+    _git(repo, "commit", "-q", "-m", message)
+    return _git(repo, "rev-parse", "HEAD").strip()
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_update_reads_only_new_commits(repo):
+    _commit(repo, "src/api/views.py", "feat(api): add views")
+    head = _commit(repo, "docs/index.md", "docs: describe setup")
+    index = StyleIndex.for_repo(str(repo / ".git"))
+
+    assert index.update(head) == 2
+    assert [c.paths for c in index.commits()] == [
+        ["src/api/views.py"],
+        ["docs/index.md"],
+    ]
+    assert index.update(head) == 0
+
+    head = _commit(repo, "src/api/urls.py", "feat(api): route views")
+    reopened = StyleIndex.for_repo(str(repo / ".git"))
+    assert reopened.update(head) == 1
+    assert reopened.indexed_head() == head
+    assert [c.message for c in StyleIndex.for_repo(str(repo / ".git")).commits()] == [
+        "feat(api): add views",
+        "docs: describe setup",
+        "feat(api): route views",
+    ]
+
+
+def test_update_recovers_from_unknown_indexed_head(repo):
+    head = _commit(repo, "a.py", "feat: a")
+    index = StyleIndex.for_repo(str(repo / ".git"))
+    (repo / ".git" / "commitai" / "style").mkdir(parents=True)
+    (repo / ".git" / "commitai" / "style" / "head").write_text("0" * 40)
+
+    assert index.update(head) == 1
+
+
+def test_examples_rank_by_path_overlap(tmp_path):
+    index = StyleIndex(str(tmp_path))
+    index._commits = [
+        IndexedCommit("1", "feat(api): old api change", ["src/api/views.py"]),
+        IndexedCommit("2", "fix(ui): button", ["src/ui/button.js"]),
+        IndexedCommit("3", "feat(api): views", ["src/api/views.py"]),
+        IndexedCommit("4", "chore: bump", ["package.json"]),
+    ]
+
+    assert index.examples(["src/api/views.py"], 2) == [
+        "feat(api): views",
+        "feat(api): old api change",
+    ]
+    # Sharing only the src/ directory still beats no overlap at all.
+    assert index.examples(["src/db/models.py"], 4) == [
+        "feat(api): views",
+        "fix(ui): button",
+        "feat(api): old api change",
+        "chore: bump",
+    ]
+    assert index.examples(["README.md"], 1) == ["chore: bump"]
+    assert index.examples(["README.md"], 0) == []
+
+
+def test_clear(repo):
+    head = _commit(repo, "a.py", "feat: a")
+    index = StyleIndex.for_repo(str(repo / ".git"))
+    index.update(head)
+
+    assert index.clear() == 1
+    assert index.commits() == []
+    assert index.indexed_head() is None
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import threading
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from commitai.diff import parse_diff
+from commitai.summarize import map_reduce_message, summarize_chunks
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model that records every prompt it receives."""
+
+    prompts: List[str] = []
+    lock: Any = None
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.prompts = []
+        self.lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        prompt = str(messages[-1].content)
+        with self.lock:
+            self.prompts.append(prompt)
+        if "Here are summaries" in prompt:
+            reply = "feat: combine summaries"
+        else:
+            reply = "summary of " + prompt.split("Part ", 1)[1].split(":", 1)[0]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(reply))])
+
+
+DIFF = "".join(
+    f"diff --git a/f{i}.py b/f{i}.py\n@@ -1 +1 @@\n-old{i}\n+new{i}\n" for i in range(6)
+)
+
+
+def test_summarize_chunks_preserves_order():
+    llm = FakeChatModel()
+    summaries = summarize_chunks(llm, ["a", "b", "c"], workers=3)
+    assert summaries == ["summary of 1 of 3", "summary of 2 of 3", "summary of 3 of 3"]
+    assert len(llm.prompts) == 3
+
+
+def test_map_reduce_message():
+    llm = FakeChatModel()
+    message = map_reduce_message(
+        llm,
+        parse_diff(DIFF),
+        lambda summaries: f"SYSTEM\n\n{summaries}",
+        chunk_size=80,
+        workers=2,
+    )
+    assert message == "feat: combine summaries"
+    chunk_prompts = [p for p in llm.prompts if "Here are summaries" not in p]
+    assert len(chunk_prompts) == 6
+    reduce_prompt = llm.prompts[-1]
+    assert reduce_prompt.startswith("SYSTEM\n\n")
+    assert "Part 6:\nsummary of 6 of 6" in reduce_prompt
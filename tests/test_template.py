@@ -3,6 +3,11 @@
 
 from commitai.template import (
     adding_template,
+    build_scope_message,
+    build_scope_summaries_message,
+    build_similar_message_hint,
+    build_style_examples,
+    build_truncation_notice,
     build_user_message,
     default_system_message,
 )
@@ -43,3 +48,29 @@ def test_adding_template_content():
     assert isinstance(adding_template, str)
     assert len(adding_template) > 0
     assert "follow this template" in adding_template
+
+
+def test_build_truncation_notice_lists_files():
+    """Test the truncation notice names every omitted file and its size."""
+    notice = build_truncation_notice([("a.lock", 10), ("b.min.js", 20)])
+    assert "a.lock (10 bytes)" in notice
+    assert "b.min.js (20 bytes)" in notice
+
+
+def test_build_similar_message_hint():
+    hint = build_similar_message_hint("fix: handle empty input")
+    assert hint.startswith("A very similar change was previously committed")
+    assert hint.endswith("\n\nfix: handle empty input")
+
+
+def test_build_style_examples():
+    examples = build_style_examples(["feat(api): add paging", "fix: typo"])
+    assert examples.startswith("Earlier commits of this repository")
+    assert examples.endswith("---\nfeat(api): add paging\n\n---\nfix: typo\n---")
+
+
+def test_build_scope_messages():
+    assert build_scope_message("api", "diff").endswith("Scope: api\n\ndiff")
+    merged = build_scope_summaries_message([("api", "- paging"), ("web", "- list")])
+    assert "Scope api:\n- paging\n\nScope web:\n- list" in merged
+    assert "<type>(api,web): <subject>" in merged